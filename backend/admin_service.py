@@ -0,0 +1,379 @@
+"""
+SUPABASE ADMIN OPERATIONS
+=========================
+
+Bulk maintenance jobs against Supabase Auth and PostgREST that are too large
+to run as a sequence of per-user calls.
+
+- Orphan cleanup: auth.users rows without a matching profiles row are deleted
+  together with their user_wallets rows (profiles is the single source of truth)
+- Complete user deletion: user_wallets, profiles and auth.users for one user,
+  or for many users at once (bulk offboarding / GDPR batches)
+
+HOW IT SCALES:
+- auth.users is streamed page by page from /auth/v1/admin/users (never loaded
+  in full, never truncated to the first page)
+- Profile membership and user_wallets deletes are batched with
+  ``user_id=in.(...)`` filters instead of one request per user
+- Auth-admin deletes (one endpoint per user) and chunked table deletes fan
+  out under a bounded semaphore. Callers' concurrency is capped at
+  ADMIN_MAX_CONCURRENCY, below the Supabase bulkhead (resilience.py), so an
+  admin job leaves slots for user traffic
+- A call refused by the full bulkhead is retried with backoff; a user whose
+  auth delete is still refused (or hits an open circuit) is reported as
+  retryable, not as a failed delete
+- Progress is reported after every page and the job returns a ``next_page``
+  checkpoint, so an interrupted run can be resumed where it stopped
+"""
+
+import os
+import asyncio
+import logging
+import httpx
+from typing import Optional, Dict, Any, List, Set, Callable, Iterable, Awaitable
+
+from resilience import UpstreamUnavailableError, REASON_BULKHEAD_FULL
+
+logger = logging.getLogger(__name__)
+
+# Supabase Configuration
+SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
+SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
+
+# Tuning
+ADMIN_USERS_PAGE_SIZE = 200      # auth users fetched per admin list call
+IN_FILTER_CHUNK_SIZE = 100       # ids per PostgREST in.(...) filter (keeps URLs short)
+ADMIN_DELETE_CONCURRENCY = 16    # default in-flight deletes
+ADMIN_MAX_CONCURRENCY = 32       # cap on caller-requested concurrency (Supabase bulkhead: 50)
+ADMIN_BULKHEAD_RETRIES = 3       # retries of a call refused by the full bulkhead
+
+
+def service_headers() -> Dict[str, str]:
+    """Headers for service-role calls to Supabase."""
+    return {
+        "apikey": SUPABASE_SERVICE_KEY,
+        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
+    }
+
+
+def chunked(items: List[str], size: int) -> Iterable[List[str]]:
+    """Yield successive chunks of at most ``size`` items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def in_filter(ids: Iterable[str]) -> str:
+    """Build a PostgREST ``in.(...)`` filter value."""
+    return f"in.({','.join(ids)})"
+
+
+def clamp_concurrency(concurrency: int) -> int:
+    """Caller-requested concurrency bounded to 1..ADMIN_MAX_CONCURRENCY."""
+    return max(1, min(concurrency, ADMIN_MAX_CONCURRENCY))
+
+
+async def send_with_retry(send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    """
+    Run ``send``, retrying with backoff while the Supabase bulkhead is full.
+    Raises UpstreamUnavailableError if the circuit is open or the bulkhead
+    stays full.
+    """
+    for attempt in range(ADMIN_BULKHEAD_RETRIES + 1):
+        try:
+            return await send()
+        except UpstreamUnavailableError as e:
+            if e.reason != REASON_BULKHEAD_FULL or attempt == ADMIN_BULKHEAD_RETRIES:
+                raise
+            await asyncio.sleep(0.25 * 2 ** attempt)
+
+
+async def list_auth_users_page(
+    client: httpx.AsyncClient,
+    page: int,
+    per_page: int = ADMIN_USERS_PAGE_SIZE
+) -> List[Dict[str, Any]]:
+    """Fetch one page of auth users. Raises on a non-200 response."""
+    response = await client.get(
+        f"{SUPABASE_URL}/auth/v1/admin/users",
+        params={"page": page, "per_page": per_page},
+        headers=service_headers()
+    )
+    if response.status_code != 200:
+        raise Exception(f"Auth admin list failed: {response.status_code} - {response.text}")
+    return response.json().get('users', [])
+
+
+async def fetch_existing_profile_ids(client: httpx.AsyncClient, user_ids: List[str]) -> Set[str]:
+    """Return the subset of ``user_ids`` that have a profiles row. Raises on failure."""
+    found: Set[str] = set()
+    for chunk in chunked(user_ids, IN_FILTER_CHUNK_SIZE):
+        response = await client.get(
+            f"{SUPABASE_URL}/rest/v1/profiles",
+            params={"select": "user_id", "user_id": in_filter(chunk)},
+            headers=service_headers()
+        )
+        if response.status_code != 200:
+            raise Exception(f"Profiles lookup failed: {response.status_code} - {response.text}")
+        found.update(p.get('user_id') for p in response.json())
+    return found
+
+
+async def delete_rows_for_users(
+    client: httpx.AsyncClient,
+    table: str,
+    user_ids: List[str],
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Set[str]:
+    """
+    Delete ``table`` rows for many users with chunked in.(...) filters.
+    Chunks are sent concurrently, at most ``semaphore`` at a time (default
+    ADMIN_DELETE_CONCURRENCY).
+
+    Returns: user ids whose chunk delete succeeded
+    """
+    semaphore = semaphore or asyncio.Semaphore(ADMIN_DELETE_CONCURRENCY)
+
+    async def delete_chunk(chunk: List[str]) -> List[str]:
+        try:
+            async with semaphore:
+                response = await send_with_retry(lambda: client.delete(
+                    f"{SUPABASE_URL}/rest/v1/{table}",
+                    params={"user_id": in_filter(chunk)},
+                    headers=service_headers()
+                ))
+        except (httpx.HTTPError, UpstreamUnavailableError) as e:
+            logger.warning(f"[ADMIN] Failed to delete {table} chunk: {e}")
+            return []
+        if response.status_code in [200, 204]:
+            return chunk
+        logger.warning(f"[ADMIN] Failed to delete {table} chunk: {response.status_code} - {response.text}")
+        return []
+
+    results = await asyncio.gather(*(delete_chunk(chunk) for chunk in chunked(user_ids, IN_FILTER_CHUNK_SIZE)))
+    return {user_id for chunk in results for user_id in chunk}
+
+
+async def delete_wallets_for_users(client: httpx.AsyncClient, user_ids: List[str]) -> bool:
+    """Delete user_wallets rows for many users with chunked in.(...) filters."""
+    deleted = await delete_rows_for_users(client, "user_wallets", user_ids)
+    return len(deleted) == len(set(user_ids))
+
+
+async def delete_auth_users(
+    client: httpx.AsyncClient,
+    user_ids: List[str],
+    concurrency: int = ADMIN_DELETE_CONCURRENCY
+) -> Dict[str, Optional[bool]]:
+    """
+    Delete many auth users concurrently (bounded by ``concurrency``).
+
+    Returns: { user_id: deleted }, deleted None if Supabase refused the call
+    (bulkhead full / circuit open) - retry those later
+    """
+    semaphore = asyncio.Semaphore(clamp_concurrency(concurrency))
+
+    async def delete_one(user_id: str) -> Optional[bool]:
+        async with semaphore:
+            try:
+                response = await send_with_retry(lambda: client.delete(
+                    f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}",
+                    headers=service_headers()
+                ))
+            except UpstreamUnavailableError as e:
+                logger.warning(f"[ADMIN] Auth user {user_id} not deleted, retry later: {e}")
+                return None
+            except httpx.HTTPError as e:
+                logger.warning(f"[ADMIN] Failed to delete auth user {user_id}: {e}")
+                return False
+            if response.status_code in [200, 204]:
+                return True
+            logger.warning(f"[ADMIN] Failed to delete auth user {user_id}: {response.status_code} - {response.text}")
+            return False
+
+    results = await asyncio.gather(*(delete_one(user_id) for user_id in user_ids))
+    return dict(zip(user_ids, results))
+
+
+async def delete_user_everywhere(client: httpx.AsyncClient, user_id: str) -> List[str]:
+    """
+    Delete a user from user_wallets, profiles and auth.users.
+
+    Returns: names of the stores the user was deleted from
+    Raises: UpstreamUnavailableError if Supabase keeps refusing calls
+    (circuit open / bulkhead full) - every step is safe to run again
+    """
+    deleted_from = []
+    
+    # 1. Delete from user_wallets
+    response = await send_with_retry(lambda: client.delete(
+        f"{SUPABASE_URL}/rest/v1/user_wallets",
+        params={"user_id": f"eq.{user_id}"},
+        headers=service_headers()
+    ))
+    if response.status_code in [200, 204]:
+        deleted_from.append("user_wallets")
+    
+    # 2. Delete from profiles
+    response = await send_with_retry(lambda: client.delete(
+        f"{SUPABASE_URL}/rest/v1/profiles",
+        params={"user_id": f"eq.{user_id}"},
+        headers=service_headers()
+    ))
+    if response.status_code in [200, 204]:
+        deleted_from.append("profiles")
+    
+    # 3. Delete from auth.users (this is the critical one!)
+    response = await send_with_retry(lambda: client.delete(
+        f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}",
+        headers=service_headers()
+    ))
+    if response.status_code in [200, 204]:
+        deleted_from.append("auth.users")
+    else:
+        logger.warning(f"Failed to delete from auth.users: {response.status_code} - {response.text}")
+    
+    logger.info(f"Deleted user {user_id} from: {deleted_from}")
+    return deleted_from
+
+
+async def bulk_delete_users(
+    client: httpx.AsyncClient,
+    user_ids: List[str],
+    concurrency: int = ADMIN_DELETE_CONCURRENCY
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Delete many users from user_wallets, profiles and auth.users.
+
+    Table rows go first (both tables in parallel, chunked in.(...) filters,
+    sharing one ``concurrency`` limit), then auth.users deletes fan out under
+    the same limit.
+
+    Returns: { user_id: {"deleted_from": [stores], "retryable": bool} } in
+    input order; retryable users were refused by Supabase (bulkhead full /
+    circuit open) rather than failing
+    """
+    concurrency = clamp_concurrency(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    wallets_deleted, profiles_deleted = await asyncio.gather(
+        delete_rows_for_users(client, "user_wallets", user_ids, semaphore),
+        delete_rows_for_users(client, "profiles", user_ids, semaphore)
+    )
+    auth_deleted = await delete_auth_users(client, user_ids, concurrency)
+    
+    results: Dict[str, Dict[str, Any]] = {}
+    for user_id in user_ids:
+        deleted_from = []
+        if user_id in wallets_deleted:
+            deleted_from.append("user_wallets")
+        if user_id in profiles_deleted:
+            deleted_from.append("profiles")
+        if auth_deleted.get(user_id):
+            deleted_from.append("auth.users")
+        results[user_id] = {"deleted_from": deleted_from, "retryable": auth_deleted.get(user_id) is None}
+    
+    logger.info(
+        f"[ADMIN] Bulk deleted {sum(1 for ok in auth_deleted.values() if ok)}/{len(user_ids)} auth users"
+    )
+    return results
+
+
+async def sync_cleanup_orphans(
+    client: httpx.AsyncClient,
+    start_page: int = 1,
+    per_page: int = ADMIN_USERS_PAGE_SIZE,
+    concurrency: int = ADMIN_DELETE_CONCURRENCY,
+    max_pages: Optional[int] = None,
+    dry_run: bool = False,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Stream auth users and delete the ones without a profile (and their wallets).
+
+    Deleting users shifts later users onto the current page, so a page on which
+    anything was deleted is fetched again before moving on. Users whose delete
+    failed are remembered and skipped, which guarantees forward progress.
+
+    Args:
+        start_page: First auth-admin page to scan (use ``next_page`` to resume)
+        per_page: Auth users per page
+        concurrency: Max in-flight auth-admin deletes (capped at ADMIN_MAX_CONCURRENCY)
+        max_pages: Stop after this many page fetches (returns a checkpoint)
+        dry_run: Only count orphans, delete nothing
+        on_progress: Called with a snapshot of the progress dict after every page
+
+    Returns:
+        Progress dict; ``complete`` is True once the last page was scanned,
+        otherwise ``next_page`` is where to resume.
+    """
+    progress: Dict[str, Any] = {
+        "start_page": start_page,
+        "next_page": start_page,
+        "pages_fetched": 0,
+        "scanned": 0,
+        "with_profile": 0,
+        "orphans_found": 0,
+        "deleted_auth_users": 0,
+        "failed": 0,
+        "complete": False,
+        "error": None
+    }
+    failed_ids: Set[str] = set()
+    seen_ids: Set[str] = set()
+    page = start_page
+
+    while max_pages is None or progress["pages_fetched"] < max_pages:
+        try:
+            users = await list_auth_users_page(client, page, per_page)
+            user_ids = [u.get('id') for u in users if u.get('id')]
+            with_profile = await fetch_existing_profile_ids(client, user_ids) if user_ids else set()
+        except Exception as e:
+            logger.error(f"[ADMIN] Sync cleanup stopped at page {page}: {e}")
+            progress["error"] = str(e)
+            break
+
+        progress["pages_fetched"] += 1
+        new_ids = {uid for uid in user_ids if uid not in seen_ids}
+        seen_ids.update(new_ids)
+        progress["scanned"] += len(new_ids)
+        progress["with_profile"] += sum(1 for uid in new_ids if uid in with_profile)
+
+        orphans = [uid for uid in user_ids if uid not in with_profile and uid not in failed_ids]
+        progress["orphans_found"] += sum(1 for uid in orphans if uid in new_ids)
+
+        deleted = 0
+        if orphans and not dry_run:
+            await delete_wallets_for_users(client, orphans)
+            results = await delete_auth_users(client, orphans, concurrency)
+            deleted = sum(1 for ok in results.values() if ok)
+            failed_ids.update(uid for uid, ok in results.items() if ok is False)
+            progress["deleted_auth_users"] += deleted
+            progress["failed"] = len(failed_ids)
+            refused = sum(1 for ok in results.values() if ok is None)
+            if refused:
+                # Not failures: stop here, resuming re-reads this page
+                progress["error"] = f"Supabase refused {refused} deletes (bulkhead full / circuit open)"
+                if on_progress:
+                    on_progress(dict(progress))
+                break
+
+        # Re-read the same page if deletions pulled later users forward
+        if deleted == 0:
+            if len(users) < per_page:
+                progress["complete"] = True
+                progress["next_page"] = None
+            else:
+                page += 1
+                progress["next_page"] = page
+
+        logger.info(
+            f"[ADMIN] Sync cleanup page {progress['pages_fetched']}: scanned={progress['scanned']} "
+            f"orphans={progress['orphans_found']} deleted={progress['deleted_auth_users']} "
+            f"failed={progress['failed']}"
+        )
+        if on_progress:
+            on_progress(dict(progress))
+
+        if progress["complete"]:
+            break
+
+    return progress
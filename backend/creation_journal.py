@@ -0,0 +1,112 @@
+"""
+CREATION JOURNAL
+================
+
+Per-user record of Turnkey creations (sub-org, wallet) from the moment the
+activity is submitted until its result is stored in user_wallets.
+
+Creation activities are not idempotent. Without a record, a retry after
+ACTIVITY_PENDING, a request deadline or a crash submits a second
+CREATE_SUB_ORGANIZATION / CREATE_WALLET, and the user ends up with two.
+
+- record_submitted(): the activity id, written from the worker thread as soon
+  as Turnkey accepts the activity - also when the request waiting for it has
+  been cancelled meanwhile
+- record_result(): the created sub-org / wallet, kept until user_wallets has
+  it (the sub-org write there is deferred to a background task)
+- clear(): once user_wallets has the result, or the activity failed for good
+- The next attempt for the user resumes the recorded activity (or reuses the
+  recorded result) instead of submitting a new one. Pending entries older
+  than CREATION_JOURNAL_PENDING_TTL are ignored, so an activity id Turnkey
+  no longer knows cannot block a user forever
+- SQLite in WAL mode, like the sub-org pool: every worker on the host sees
+  the same journal and it survives restarts. Read and written under the
+  user's keyed lock (keyed_locks.py)
+"""
+
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+CREATION_JOURNAL_PENDING_TTL = float(os.environ.get('CREATION_JOURNAL_PENDING_TTL', '3600'))  # seconds
+
+KIND_SUB_ORG = "sub_org"
+KIND_WALLET = "wallet"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS creation_journal (
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    activity_id TEXT,
+    result TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, kind)
+)
+"""
+
+
+class CreationJournal:
+    """SQLite-backed journal of in-flight and unpersisted creations."""
+
+    def __init__(self, db_path: str, pending_ttl: float = CREATION_JOURNAL_PENDING_TTL):
+        self.db_path = db_path
+        self.pending_ttl = pending_ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def get(self, user_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """``{"activity_id", "result"}`` for the user's creation, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT activity_id, result, updated_at FROM creation_journal WHERE user_id = ? AND kind = ?",
+                (user_id, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        activity_id, result, updated_at = row
+        if result is None and time.time() - updated_at > self.pending_ttl:
+            logger.warning(f"[JOURNAL] Ignoring stale pending {kind} activity {activity_id} for user {user_id}")
+            return None
+        return {"activity_id": activity_id, "result": json.loads(result) if result else None}
+
+    def record_submitted(self, user_id: str, kind: str, activity_id: str) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO creation_journal (user_id, kind, activity_id, result, updated_at) "
+                "VALUES (?, ?, ?, NULL, ?)",
+                (user_id, kind, activity_id, time.time())
+            )
+
+    def record_result(self, user_id: str, kind: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO creation_journal (user_id, kind, activity_id, result, updated_at) "
+                "VALUES (?, ?, NULL, ?, ?) "
+                "ON CONFLICT (user_id, kind) DO UPDATE SET result = excluded.result, updated_at = excluded.updated_at",
+                (user_id, kind, json.dumps(result), time.time())
+            )
+
+    def clear(self, user_id: str, kind: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM creation_journal WHERE user_id = ? AND kind = ?", (user_id, kind))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending, unpersisted = self.conn.execute(
+                "SELECT COALESCE(SUM(result IS NULL), 0), COALESCE(SUM(result IS NOT NULL), 0) FROM creation_journal"
+            ).fetchone()
+        return {"pending": pending, "unpersisted": unpersisted}
@@ -0,0 +1,195 @@
+"""
+REQUEST DEADLINES
+=================
+
+Every HTTP request gets one time budget that all of its upstream calls draw
+from, instead of each call having its own 10-30s timeout (a handler chaining
+five calls could otherwise run for minutes).
+
+- The budget is the route's default (ROUTE_DEADLINES, else
+  REQUEST_DEADLINE_DEFAULT); a client may ask for less with
+  ``X-Request-Timeout: <seconds>`` but never for more
+- The deadline lives in a contextvar, so it follows the request through
+  awaits and asyncio.to_thread workers (the synchronous Turnkey client)
+- Upstream calls shrink their connect/read timeouts to the remaining budget
+  (budget_timeout) and refuse to start once it is spent (check_deadline),
+  raising DeadlineExceeded - an HTTPException, 504
+- DeadlineMiddleware cancels the handler when the budget runs out and answers
+  504 if nothing was sent yet; the deadline is cleared once the response is
+  complete, so BackgroundTasks run unbounded as before
+- Creation routes (ROUTE_CANCEL_GRACE) are not cancelled at the deadline:
+  cancelling cannot stop a Turnkey submit already in its worker thread, and
+  the created sub-org / wallet would outlive a 504 with no activity id. New
+  calls are still refused at the deadline, but a Turnkey submit already
+  started may finish within the grace (submit_timeout), so the handler
+  answers with the result or ACTIVITY_PENDING:<id> to resume. Only a handler
+  still running after budget + grace is cancelled
+
+Code outside a request (warm-up, background jobs) has no deadline.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DEADLINE_DEFAULT = float(os.environ.get('REQUEST_DEADLINE_DEFAULT', '30'))  # seconds
+REQUEST_TIMEOUT_HEADER = b"x-request-timeout"
+
+# Per-route budgets (seconds). Keys ending in "/" match as prefixes.
+ROUTE_DEADLINES = {
+    "/api/health": 5.0,
+    "/api/ready": 5.0,
+    "/api/metrics": 5.0,
+    "/api/crypto-indices": 10.0,
+    "/api/user/ensure-profile": 15.0,
+    "/api/user/profile": 15.0,
+    "/api/turnkey/sign-message": 20.0,
+    "/api/turnkey/sign-transaction": 25.0,
+    "/api/turnkey/sign-batch": 45.0,
+    "/api/turnkey/init-email-auth": 30.0,
+    "/api/turnkey/verify-email-otp": 30.0,
+    "/api/turnkey/create-wallet": 60.0,
+    "/api/user/delete/": 60.0,
+    "/api/admin/users/bulk-delete": 120.0,
+    "/api/admin/sync-cleanup": 120.0,
+}
+
+# Extra seconds before a creation route is cancelled: one Turnkey submit
+# (connect + read timeout) that started just before the deadline
+CREATION_CANCEL_GRACE = float(os.environ.get('CREATION_CANCEL_GRACE', '35'))
+ROUTE_CANCEL_GRACE = {
+    "/api/turnkey/init-email-auth": CREATION_CANCEL_GRACE,
+    "/api/turnkey/create-wallet": CREATION_CANCEL_GRACE,
+}
+
+
+class DeadlineExceeded(HTTPException):
+    """The request's time budget ran out before (or during) an upstream call."""
+
+    def __init__(self, operation: str = ""):
+        super().__init__(status_code=504, detail="DEADLINE_EXCEEDED")
+        self.operation = operation
+
+    def __str__(self) -> str:
+        return f"request deadline exceeded{f' before {self.operation}' if self.operation else ''}"
+
+
+class _Deadline:
+    """Mutable so the middleware can lift it for work after the response."""
+    __slots__ = ("expires_at", "grace")
+
+    def __init__(self, expires_at: Optional[float], grace: float = 0.0):
+        self.expires_at = expires_at
+        self.grace = grace
+
+
+_current_deadline: ContextVar[Optional[_Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def route_budget(path: str) -> float:
+    budget = ROUTE_DEADLINES.get(path)
+    if budget is not None:
+        return budget
+    for prefix, seconds in ROUTE_DEADLINES.items():
+        if prefix.endswith("/") and path.startswith(prefix):
+            return seconds
+    return REQUEST_DEADLINE_DEFAULT
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget; None without a deadline."""
+    deadline = _current_deadline.get()
+    if deadline is None or deadline.expires_at is None:
+        return None
+    return deadline.expires_at - time.monotonic()
+
+
+def deadline_exhausted() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check_deadline(operation: str = "") -> None:
+    """Raise DeadlineExceeded if the budget is already spent."""
+    if deadline_exhausted():
+        raise DeadlineExceeded(operation)
+
+
+def budget_timeout(timeout: Optional[float]) -> Optional[float]:
+    """``timeout`` (None = unbounded) shrunk to the remaining budget, never below 1ms."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(0.001, left if timeout is None else min(timeout, left))
+
+
+def submit_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    Like budget_timeout, plus the route's cancel grace: for upstream calls that
+    must not be abandoned half-way once sent (Turnkey activity submits).
+    """
+    deadline = _current_deadline.get()
+    left = remaining()
+    if left is None:
+        return timeout
+    left += deadline.grace
+    return max(0.001, left if timeout is None else min(timeout, left))
+
+
+class DeadlineMiddleware:
+    """ASGI middleware: per-request deadline, cancellation and 504 on expiry."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = route_budget(scope["path"])
+        for key, value in scope.get("headers", ()):
+            if key == REQUEST_TIMEOUT_HEADER:
+                try:
+                    requested = float(value.decode("latin-1"))
+                    if requested > 0:
+                        budget = min(budget, requested)
+                except ValueError:
+                    pass
+                break
+
+        grace = ROUTE_CANCEL_GRACE.get(scope["path"], 0.0)
+        deadline = _Deadline(time.monotonic() + budget, grace)
+        response_started = False
+
+        async def send_tracking(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Response is out - BackgroundTasks run without a deadline
+                deadline.expires_at = None
+                timeout.reschedule(None)
+            await send(message)
+
+        token = _current_deadline.set(deadline)
+        try:
+            async with asyncio.timeout(budget + grace) as timeout:
+                await self.app(scope, receive, send_tracking)
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            logger.warning(f"[DEADLINE] {scope['method']} {scope['path']} cancelled after {budget + grace:.1f}s")
+            if not response_started:
+                response = JSONResponse(status_code=504, content={"detail": "DEADLINE_EXCEEDED"})
+                await response(scope, receive, send)
+        finally:
+            _current_deadline.reset(token)
@@ -0,0 +1,179 @@
+"""
+SHARED HTTP CLIENTS
+===================
+
+One pooled httpx.AsyncClient per upstream, reused across requests so calls
+don't pay connection setup and a TLS handshake every time.
+
+Clients are created lazily on first use (inside the running event loop) and
+closed on application shutdown via close_http_clients().
+
+Every shared client sends through an InstrumentedTransport, which records
+``upstream_request_seconds{upstream,operation,method,status}`` and
+``upstream_requests_in_flight{upstream}`` (see metrics.py) - call sites need no
+instrumentation of their own. The transport also goes through the upstream's
+bulkhead and circuit breaker (see resilience.py): a refused call raises
+UpstreamUnavailableError (503 + Retry-After) before anything is sent.
+
+Timeouts are explicit per phase: a short connect timeout so an unreachable
+host fails fast, and a read timeout sized to the upstream's slowest call.
+Inside a request each phase is further capped by the request's remaining
+budget (deadlines.py); a call that would start past it, or times out because
+of it, raises DeadlineExceeded (504).
+"""
+
+import re
+import time
+import logging
+import httpx
+from contextlib import asynccontextmanager
+from typing import Dict, Callable, AsyncIterator
+
+from metrics import upstream_request_seconds, upstream_requests_in_flight
+from tracing import span, SPAN_KIND_CLIENT
+from resilience import get_guard, is_failure_status
+from deadlines import DeadlineExceeded, check_deadline, budget_timeout, deadline_exhausted
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+SUPABASE_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+COINGECKO_TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+COINGECKO_POOL_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=2)
+RPC_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+RPC_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=5)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+_REST_TABLE = re.compile(r"^/rest/v1/([^/?]+)")
+_AUTH_ADMIN = re.compile(r"^/auth/v1/admin/users(/[^/]+)?")
+
+
+# ============================================================================
+# Operation labels (bounded cardinality - never raw ids)
+# ============================================================================
+
+def supabase_operation(request: httpx.Request) -> str:
+    path = request.url.path
+    match = _REST_TABLE.match(path)
+    if match:
+        return f"rest:{match.group(1)}"
+    match = _AUTH_ADMIN.match(path)
+    if match:
+        return "auth:admin_user" if match.group(1) else "auth:admin_users"
+    if path.startswith("/auth/v1/"):
+        return "auth:" + path[len("/auth/v1/"):].split("/")[0]
+    return "other"
+
+
+def coingecko_operation(request: httpx.Request) -> str:
+    path = request.url.path
+    if path.startswith("/api/v3/"):
+        path = path[len("/api/v3/"):]
+    return path.strip("/") or "root"
+
+
+def rpc_operation(request: httpx.Request) -> str:
+    return "jsonrpc"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Times every request (until response headers) as a metric and a client
+    span, tracks in-flight calls, and runs it under the upstream's guard.
+    """
+
+    def __init__(self, upstream: str, operation: Callable[[httpx.Request], str], limits: httpx.Limits):
+        self.upstream = upstream
+        self.operation = operation
+        self.guard = get_guard(upstream)
+        self._transport = httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        check_deadline(self.upstream)
+        timeouts = request.extensions.get("timeout")
+        if timeouts:
+            request.extensions["timeout"] = {
+                phase: budget_timeout(value) for phase, value in timeouts.items()
+            }
+        try:
+            async with self.guard.acall() as call:
+                response = await self._send(request)
+                call.failed = is_failure_status(response.status_code)
+        except httpx.TimeoutException as e:
+            if deadline_exhausted():
+                raise DeadlineExceeded(self.upstream) from e
+            raise
+        return response
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        status = "error"
+        operation = self.operation(request)
+        started = time.perf_counter()
+        upstream_requests_in_flight.inc(upstream=self.upstream)
+        try:
+            with span(f"{self.upstream}.{operation}", SPAN_KIND_CLIENT, **{"http.method": request.method}) as current:
+                response = await self._transport.handle_async_request(request)
+                status = str(response.status_code)
+                current.set_attribute("http.status_code", response.status_code)
+            return response
+        finally:
+            upstream_requests_in_flight.dec(upstream=self.upstream)
+            upstream_request_seconds.observe(
+                time.perf_counter() - started,
+                upstream=self.upstream,
+                operation=operation,
+                method=request.method,
+                status=status
+            )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _get_client(
+    name: str,
+    timeout: httpx.Timeout,
+    limits: httpx.Limits,
+    operation: Callable[[httpx.Request], str]
+) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=timeout,
+            transport=InstrumentedTransport(name, operation, limits)
+        )
+        _clients[name] = client
+    return client
+
+
+def get_supabase_client() -> httpx.AsyncClient:
+    """Shared client for Supabase Auth + PostgREST calls."""
+    return _get_client("supabase", SUPABASE_TIMEOUT, SUPABASE_POOL_LIMITS, supabase_operation)
+
+
+@asynccontextmanager
+async def shared_supabase_client() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    ``async with`` drop-in for ``httpx.AsyncClient()`` blocks that yields the
+    shared client and leaves it open on exit.
+    """
+    yield get_supabase_client()
+
+
+def get_coingecko_client() -> httpx.AsyncClient:
+    """Shared client for CoinGecko market data."""
+    return _get_client("coingecko", COINGECKO_TIMEOUT, COINGECKO_POOL_LIMITS, coingecko_operation)
+
+
+def get_rpc_client() -> httpx.AsyncClient:
+    """Shared client for EVM JSON-RPC calls (fee estimates, nonces)."""
+    return _get_client("rpc", RPC_TIMEOUT, RPC_POOL_LIMITS, rpc_operation)
+
+
+async def close_http_clients() -> None:
+    """Close every shared client (application shutdown)."""
+    for name, client in list(_clients.items()):
+        await client.aclose()
+        logger.info(f"[HTTP] Closed shared {name} client")
+    _clients.clear()
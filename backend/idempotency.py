@@ -0,0 +1,254 @@
+"""
+IDEMPOTENCY KEYS
+================
+
+Mobile clients retry create-wallet / sign-message / sign-transaction on flaky
+networks. With an ``Idempotency-Key`` header, a retry of the same request gets
+the first execution's response instead of running it (and its Supabase and
+Turnkey calls) again:
+
+- First request with a key: runs normally, the response is recorded
+- Concurrent duplicate (first still running): waits for it, then gets its
+  response
+- Later duplicate within IDEMPOTENCY_TTL: the recorded response is replayed,
+  marked ``Idempotent-Replayed: true``, without touching any upstream
+- Same key, different body: 422 IDEMPOTENCY_KEY_REUSED
+
+Only final answers are kept: 2xx, and the deterministic 400/422 (the same
+body is refused the same way again). Anything else - a 5xx including the
+resumable ACTIVITY_PENDING 503, or a temporary 4xx such as 409
+OPERATION_IN_PROGRESS, 403 NOT_VERIFIED, 404 before the wallet exists or 429 -
+is handed to concurrent duplicates but not stored, so a later retry runs again. Keys are scoped to the authenticated user and the
+route, so one user can never replay another's response. The user id comes
+from ``resolve_user`` (the bearer token checked with Supabase, cached for
+IDEMPOTENCY_USER_CACHE_TTL per token), so a retry after a JWT refresh still
+matches; a request whose token does not resolve runs without idempotency
+and gets the handler's own 401.
+
+The store is in memory, per process: behind several workers a retry that
+lands on another worker runs again (as without a key).
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+from fastapi.responses import JSONResponse
+
+from metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', '86400'))  # seconds
+IDEMPOTENCY_MAX_ENTRIES = 10000
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_USER_CACHE_TTL = 60.0  # seconds a token's resolved user id is reused
+# Client errors that the same request always gets again (worth replaying)
+IDEMPOTENCY_STORED_CLIENT_ERRORS = frozenset({400, 422})
+
+IDEMPOTENT_PATHS = frozenset({
+    "/api/turnkey/create-wallet",
+    "/api/turnkey/sign-message",
+    "/api/turnkey/sign-transaction",
+})
+
+
+class _StoredResponse:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "response", "done", "expires_at")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.response: Optional[_StoredResponse] = None
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.expires_at: Optional[float] = None  # set once completed
+
+
+def _is_final(status: int) -> bool:
+    return 200 <= status < 300 or status in IDEMPOTENCY_STORED_CLIENT_ERRORS
+
+
+class IdempotencyStore:
+    """In-flight and completed responses by scoped key, with a TTL."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, _Entry] = {}
+
+    def get(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def begin(self, key: str, fingerprint: str) -> _Entry:
+        if len(self._entries) >= self.max_entries:
+            self._evict()
+        entry = _Entry(fingerprint)
+        self._entries[key] = entry
+        return entry
+
+    def finish(self, key: str, entry: _Entry, response: Optional[_StoredResponse]) -> None:
+        """Resolve waiters; keep ``response`` if it is a final answer, else forget the key."""
+        entry.response = response
+        if response is not None and _is_final(response.status):
+            entry.expires_at = time.monotonic() + self.ttl
+        elif self._entries.get(key) is entry:
+            del self._entries[key]
+        if not entry.done.done():
+            entry.done.set_result(None)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e.expires_at is not None and e.expires_at < now]:
+            del self._entries[key]
+        # Still full: drop the oldest completed entries (in-flight ones have waiters)
+        completed = [k for k, e in self._entries.items() if e.expires_at is not None]
+        for key in completed[:max(0, len(self._entries) - self.max_entries + 1)]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        in_flight = sum(1 for e in self._entries.values() if e.expires_at is None)
+        return {"entries": len(self._entries), "in_flight": in_flight}
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _error(status: int, detail: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"detail": detail}, headers=headers)
+
+
+async def _replay(response: _StoredResponse, send) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": response.status,
+        "headers": response.headers + [(b"idempotent-replayed", b"true")]
+    })
+    await send({"type": "http.response.body", "body": response.body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying Idempotency-Key semantics to IDEMPOTENT_PATHS."""
+
+    def __init__(
+        self,
+        app,
+        store: IdempotencyStore = idempotency_store,
+        resolve_user: Optional[Callable[[str], Awaitable[Optional[str]]]] = None
+    ):
+        self.app = app
+        self.store = store
+        self.resolve_user = resolve_user
+        self._user_ids: Dict[bytes, Tuple[Optional[str], float]] = {}
+
+    async def _scope(self, authorization: bytes) -> Optional[bytes]:
+        """Who the key belongs to: the authenticated user id, else the raw header."""
+        if self.resolve_user is None:
+            return authorization
+        now = time.monotonic()
+        cached = self._user_ids.get(authorization)
+        if cached is not None and cached[1] > now:
+            user_id = cached[0]
+        else:
+            user_id = await self.resolve_user(authorization.decode("latin-1"))
+            if len(self._user_ids) >= IDEMPOTENCY_MAX_ENTRIES:
+                self._user_ids.clear()
+            self._user_ids[authorization] = (user_id, now + IDEMPOTENCY_USER_CACHE_TTL)
+        return user_id.encode() if user_id else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", ()))
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            await _error(400, "INVALID_IDEMPOTENCY_KEY")(scope, receive, send)
+            return
+
+        scope_id = await self._scope(headers.get(b"authorization", b""))
+        if scope_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the body: it is fingerprinted, then replayed to the handler
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        key = hashlib.sha256(
+            b"\n".join([scope_id, scope["path"].encode(), idempotency_key])
+        ).hexdigest()
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        entry = self.store.get(key)
+        if entry is not None:
+            record_cache("idempotency", hit=True)
+            if entry.fingerprint != fingerprint:
+                logger.warning(f"[IDEMPOTENCY] Key reused with a different body on {scope['path']}")
+                await _error(422, "IDEMPOTENCY_KEY_REUSED")(scope, receive, send)
+                return
+            await asyncio.shield(entry.done)
+            if entry.response is None:
+                # The first execution died without answering - let the client retry
+                await _error(409, "IDEMPOTENT_REQUEST_ABORTED", {"Retry-After": "1"})(scope, receive, send)
+            else:
+                await _replay(entry.response, send)
+            return
+
+        record_cache("idempotency", hit=False)
+        entry = self.store.begin(key, fingerprint)
+        body_sent = False
+
+        async def receive_buffered():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start: Dict[str, Any] = {}
+        response_chunks: List[bytes] = []
+        recorded = None
+
+        async def send_recording(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    recorded = _StoredResponse(
+                        start["status"], list(start.get("headers", [])), b"".join(response_chunks)
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive_buffered, send_recording)
+        finally:
+            self.store.finish(key, entry, recorded)
@@ -0,0 +1,302 @@
+"""
+INDEX HISTORY
+=============
+
+Append-only time series of the computed index values (Anchor5, Vibe20,
+Wave100), so charts show what the indices actually did instead of a GBM path
+regenerated from the current value on every request.
+
+- Every market refresh appends one sample per index: value and the summed 24h
+  USD volume of its constituents (``INSERT OR IGNORE`` - rows are never
+  updated or deleted)
+- Stored in SQLite (WAL), one row per (index, timestamp); persists across
+  restarts like the sub-org pool
+- Candles are OHLC buckets aligned to the interval: open = previous close,
+  high/low = extremes, close = last sample. A bucket with no samples after
+  recording began repeats the previous close (no data, no movement); buckets
+  before the first sample come back as None for the caller to backfill
+- volumeUsd of a bucket is the mean 24h volume scaled to the bucket length
+
+ROLLING CANDLES
+- For the chart timeframes (``timeframes``: interval -> candles shown) the
+  candles are kept incrementally in one fixed-size ring buffer per index and
+  interval (RollingCandles), seeded from the database on first use and fed by
+  append(): O(1) per sample, and serving a timeframe is a slice of stored
+  candle dicts - nothing is rescanned or rebuilt per request
+- Other intervals are downsampled from the database on demand
+"""
+
+import time
+import math
+import logging
+import sqlite3
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_samples (
+    index_name TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    volume_24h REAL NOT NULL,
+    PRIMARY KEY (index_name, ts)
+)
+"""
+
+# (timestamp, value, 24h volume)
+Sample = Tuple[float, float, float]
+
+
+def bucket_starts(periods: int, interval: int, now: float) -> List[int]:
+    """Start times of the last ``periods`` buckets, the newest containing ``now``."""
+    current = int(now // interval) * interval
+    return [current - (periods - 1 - i) * interval for i in range(periods)]
+
+
+def _candle(start: int, open_: float, high: float, low: float, close: float,
+            mean_volume: float, interval: int) -> Dict[str, Any]:
+    return {
+        "time": start,
+        "open": round(open_, 2),
+        "high": round(high, 2),
+        "low": round(low, 2),
+        "close": round(close, 2),
+        "volumeUsd": round(mean_volume * interval / SECONDS_PER_DAY, 0)
+    }
+
+
+def downsample(samples: List[Sample], starts: List[int], interval: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    OHLC candle per bucket from time-ordered samples. None for buckets before
+    the first sample; flat candles at the previous close for later gaps.
+    """
+    candles: List[Optional[Dict[str, Any]]] = []
+    i = 0
+    previous_close: Optional[float] = None
+    # Samples older than the window only provide the opening level
+    while i < len(samples) and samples[i][0] < starts[0]:
+        previous_close = samples[i][1]
+        i += 1
+
+    for start in starts:
+        end = start + interval
+        open_ = high = low = close = None
+        volumes = []
+        while i < len(samples) and samples[i][0] < end:
+            _, value, volume = samples[i]
+            if open_ is None:
+                open_ = high = low = value
+            high = max(high, value)
+            low = min(low, value)
+            close = value
+            volumes.append(volume)
+            i += 1
+
+        if open_ is None:
+            if previous_close is None:
+                candles.append(None)
+                continue
+            open_ = high = low = close = previous_close
+        elif previous_close is not None:
+            # Continuous chart: a bucket opens where the previous one closed
+            open_ = previous_close
+            high = max(high, open_)
+            low = min(low, open_)
+
+        mean_volume = sum(volumes) / len(volumes) if volumes else 0.0
+        candles.append(_candle(start, open_, high, low, close, mean_volume, interval))
+        previous_close = close
+    return candles
+
+
+class RollingCandles:
+    """
+    The last ``capacity`` candles of one index at one interval, in a ring
+    buffer. Same candles as downsample() over the same samples.
+
+    Only the newest bucket changes; each sample replaces its candle dict
+    instead of mutating it, so a window already handed out stays valid.
+    Reads never move the buffer forward.
+    Samples must arrive in time order (older ones are ignored).
+    """
+
+    def __init__(self, interval: int, capacity: int):
+        self.interval = interval
+        self.capacity = capacity
+        self._candles: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._head = capacity - 1  # slot of the newest bucket
+        self._head_start: Optional[int] = None
+        self._last_ts: Optional[float] = None
+        # Newest bucket, unrounded
+        self._open = self._high = self._low = self._close = None
+        self._volume_sum = 0.0
+        self._volume_count = 0
+
+    def _advance(self, start: int) -> None:
+        """Open buckets up to ``start``; skipped ones are flat at the last close."""
+        if self._head_start is None:
+            self._head_start = start
+            return
+        steps = (start - self._head_start) // self.interval
+        if steps <= 0:
+            return
+        if steps > self.capacity:
+            self._head_start = start - self.capacity * self.interval
+            steps = self.capacity
+        for _ in range(steps):
+            self._head = (self._head + 1) % self.capacity
+            self._head_start += self.interval
+            self._open = self._high = self._low = self._close
+            self._volume_sum = 0.0
+            self._volume_count = 0
+            self._candles[self._head] = self._head_candle()
+
+    def _head_candle(self) -> Optional[Dict[str, Any]]:
+        if self._close is None:
+            return None
+        mean_volume = self._volume_sum / self._volume_count if self._volume_count else 0.0
+        return _candle(self._head_start, self._open, self._high, self._low, self._close, mean_volume, self.interval)
+
+    def add(self, ts: float, value: float, volume: float) -> bool:
+        """Fold one sample into the newest bucket; returns False if it was out of order."""
+        if self._last_ts is not None and ts <= self._last_ts:
+            return False
+        self._last_ts = ts
+        self._advance(int(ts // self.interval) * self.interval)
+        if self._close is None:
+            self._open = self._high = self._low = value
+        else:
+            # Continuous chart: a bucket opens where the previous one closed
+            self._high = max(self._high, value)
+            self._low = min(self._low, value)
+        self._close = value
+        self._volume_sum += volume
+        self._volume_count += 1
+        self._candles[self._head] = self._head_candle()
+        return True
+
+    def window(self, periods: int, now: float) -> List[Optional[Dict[str, Any]]]:
+        """The last ``periods`` candles, the newest bucket containing ``now`` (None = before recording began)."""
+        if self._head_start is None:
+            return [None] * periods
+        newest = self._head + 1
+        ordered = self._candles[newest:] + self._candles[:newest]
+        # No samples since the newest bucket: flat candles up to now (not stored,
+        # so a sample that is older than ``now`` still lands in its own bucket)
+        current = int(now // self.interval) * self.interval
+        steps = min((current - self._head_start) // self.interval, periods)
+        if steps > 0:
+            close = self._close
+            ordered += [
+                _candle(start, close, close, close, close, 0.0, self.interval)
+                for start in bucket_starts(steps, self.interval, now)
+            ]
+        if periods > len(ordered):
+            return [None] * (periods - len(ordered)) + ordered
+        return ordered[-periods:]
+
+
+class IndexHistory:
+    """SQLite-backed append-only index samples."""
+
+    def __init__(self, db_path: str, timeframes: Iterable[Tuple[int, int]] = ()):
+        self.db_path = db_path
+        # interval -> candles kept (the longest timeframe using that interval)
+        self.timeframes: Dict[int, int] = {}
+        for interval, periods in timeframes:
+            self.timeframes[interval] = max(periods, self.timeframes.get(interval, 0))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rolling: Optional[Dict[Tuple[str, int], RollingCandles]] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def append(self, ts: float, values: Dict[str, Tuple[float, float]]) -> int:
+        """Record ``{index: (value, volume_24h)}`` at ``ts``; returns rows added."""
+        rows = [
+            (name, ts, value, volume)
+            for name, (value, volume) in values.items()
+            if value is not None and math.isfinite(value)
+        ]
+        with self._lock:
+            with self.conn:
+                cursor = self.conn.executemany(
+                    "INSERT OR IGNORE INTO index_samples (index_name, ts, value, volume_24h) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+            if self._rolling is not None:
+                for name, _, value, volume in rows:
+                    self._add_rolling(name, ts, value, volume)
+        return cursor.rowcount
+
+    def samples(self, index_name: str, since: float, until: Optional[float] = None) -> List[Sample]:
+        """Samples in [since, until), plus the last one before ``since`` (the opening level)."""
+        with self._lock:
+            return self._samples(index_name, since, until)
+
+    def _samples(self, index_name: str, since: float, until: Optional[float] = None) -> List[Sample]:
+        until = until if until is not None else time.time() + 1
+        before = self.conn.execute(
+            "SELECT ts, value, volume_24h FROM index_samples WHERE index_name = ? AND ts < ? "
+            "ORDER BY ts DESC LIMIT 1",
+            (index_name, since)
+        ).fetchall()
+        rows = self.conn.execute(
+            "SELECT ts, value, volume_24h FROM index_samples WHERE index_name = ? AND ts >= ? AND ts < ? "
+            "ORDER BY ts",
+            (index_name, since, until)
+        ).fetchall()
+        return before + rows
+
+    def _add_rolling(self, index_name: str, ts: float, value: float, volume: float) -> None:
+        for interval, capacity in self.timeframes.items():
+            rolling = self._rolling.get((index_name, interval))
+            if rolling is None:
+                rolling = self._rolling[(index_name, interval)] = RollingCandles(interval, capacity)
+            rolling.add(ts, value, volume)
+
+    def _seed_rolling(self) -> None:
+        """Replay the samples the rolling windows cover (once, on first use)."""
+        self._rolling = {}
+        if not self.timeframes:
+            return
+        now = time.time()
+        since = min(
+            bucket_starts(capacity, interval, now)[0] for interval, capacity in self.timeframes.items()
+        )
+        names = [row[0] for row in self.conn.execute("SELECT DISTINCT index_name FROM index_samples")]
+        for name in names:
+            for ts, value, volume in self._samples(name, since):
+                self._add_rolling(name, ts, value, volume)
+        logger.info(f"[INDEX-HISTORY] Seeded rolling candles for {len(names)} indices")
+
+    def candles(self, index_name: str, periods: int, interval: int, now: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+        """The last ``periods`` OHLC candles of ``interval`` seconds (None = before recording began)."""
+        now = now if now is not None else time.time()
+        if periods <= self.timeframes.get(interval, 0):
+            with self._lock:
+                if self._rolling is None:
+                    self._seed_rolling()
+                rolling = self._rolling.get((index_name, interval))
+                return rolling.window(periods, now) if rolling is not None else [None] * periods
+        starts = bucket_starts(periods, interval, now)
+        return downsample(self.samples(index_name, starts[0], starts[-1] + interval), starts, interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, first, last = self.conn.execute(
+                "SELECT COUNT(*), MIN(ts), MAX(ts) FROM index_samples"
+            ).fetchone()
+            rolling = len(self._rolling) if self._rolling is not None else 0
+        return {"samples": count, "first_ts": first, "last_ts": last, "rolling_series": rolling}
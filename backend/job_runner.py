@@ -0,0 +1,227 @@
+"""
+BACKGROUND JOB RUNNER
+=====================
+
+In-process async job queue for long admin operations (orphan cleanup, user
+deletion) that must not run inside the HTTP request.
+
+- Jobs are enqueued with a kind + params and get a job id immediately
+- A fixed number of worker tasks drain the queue (bounded concurrency)
+- Handlers report progress counters while they run
+- Job state lives in a local SQLite file, so a restart doesn't lose it:
+  jobs that were queued or running when the process stopped are re-queued on
+  start, and handlers receive their last reported progress to resume from
+- Store reads and writes run in worker threads, off the event loop.
+  Progress reports are coalesced: one write in flight per job, always of the
+  latest progress
+
+Handler signature:
+    async def handler(params, progress, report) -> result
+        params:   dict given at enqueue time
+        progress: last persisted progress dict ({} on first run)
+        report:   callable(progress_dict) to publish progress
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any], Callable[[Dict[str, Any]], None]], Awaitable[Dict[str, Any]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+_JSON_COLUMNS = ("params", "progress", "result")
+
+
+class JobStore:
+    """SQLite-backed job state (one row per job)."""
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for column in _JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    def insert(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, progress, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_STATUS_QUEUED, json.dumps(params), "{}", time.time())
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobRunner:
+    """Async job queue with a fixed pool of worker tasks."""
+
+    def __init__(self, db_path: str, max_workers: int = 2):
+        self.db_path = db_path
+        self.max_workers = max(1, max_workers)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._store: Optional[JobStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self.db_path)
+        return self._store
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Register the coroutine that runs jobs of ``kind``."""
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        """Start workers and re-queue jobs left unfinished by a previous process."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        for job in self.store.unfinished():
+            logger.info(f"[JOBS] Re-queueing {job['status']} job {job['id']} ({job['kind']})")
+            self.store.update(job["id"], status=JOB_STATUS_QUEUED)
+            self._queue.put_nowait(job["id"])
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"job-worker-{i}")
+            for i in range(self.max_workers)
+        ]
+        logger.info(f"[JOBS] Started {self.max_workers} workers (db: {self.db_path})")
+
+    async def stop(self) -> None:
+        """Cancel workers. Running jobs stay 'running' and resume on next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a new job and queue it. Returns the job record."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job runner not started")
+        job = await asyncio.to_thread(self.store.insert, kind, params)
+        self._queue.put_nowait(job["id"])
+        logger.info(f"[JOBS] Enqueued job {job['id']} ({kind})")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"[JOBS] Worker {index} failed to run job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if not job or job["status"] != JOB_STATUS_QUEUED:
+            return
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(self.store.update, job_id, status=JOB_STATUS_FAILED,
+                                    error=f"Unknown job kind: {job['kind']}", finished_at=time.time())
+            return
+
+        await asyncio.to_thread(self.store.update, job_id, status=JOB_STATUS_RUNNING,
+                                attempts=job["attempts"] + 1, started_at=time.time())
+
+        latest: List[Optional[Dict[str, Any]]] = [None]
+        writer: Optional[asyncio.Task] = None
+
+        async def write_progress() -> None:
+            while latest[0] is not None:
+                progress, latest[0] = latest[0], None
+                await asyncio.to_thread(self.store.update, job_id, progress=progress)
+
+        def report(progress: Dict[str, Any]) -> None:
+            nonlocal writer
+            latest[0] = progress
+            if writer is None or writer.done():
+                writer = asyncio.create_task(write_progress())
+
+        try:
+            result = await handler(job["params"], job["progress"] or {}, report)
+            if writer is not None:
+                await writer
+        except asyncio.CancelledError:
+            # Shutdown: leave as running so start() re-queues it, from the latest progress
+            if writer is not None and not writer.done():
+                await asyncio.shield(writer)
+            raise
+        except Exception as e:
+            logger.error(f"[JOBS] Job {job_id} ({job['kind']}) failed: {e}")
+            if writer is not None:
+                await asyncio.gather(writer, return_exceptions=True)
+            await asyncio.to_thread(self.store.update, job_id, status=JOB_STATUS_FAILED,
+                                    error=str(e), finished_at=time.time())
+            return
+
+        await asyncio.to_thread(self.store.update, job_id, status=JOB_STATUS_SUCCEEDED,
+                                result=result, finished_at=time.time())
+        logger.info(f"[JOBS] Job {job_id} ({job['kind']}) succeeded")
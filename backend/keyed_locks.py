@@ -0,0 +1,217 @@
+"""
+KEYED ASYNC LOCKS
+=================
+
+Serialises conflicting operations on the same key (e.g. one user's sub-org /
+wallet creation) while unrelated keys run in parallel. Without it, a
+double-click or two tabs both pass the ``user_wallets`` check before either
+writes, and two sub-orgs or wallets get created.
+
+- One asyncio.Lock per key, kept in a WeakValueDictionary: a key's lock
+  lives only while someone holds or waits for it, so idle keys cost nothing
+- Optional shared lease store for several workers on one host
+  (KEYED_LOCK_DB_PATH, SQLite in WAL mode, like the sub-org pool): after the
+  local lock, a lease row is taken; it expires after KEYED_LOCK_LEASE_SECONDS
+  so a crashed worker cannot block a key forever. A lease attempt abandoned
+  on timeout or cancellation runs on in its thread; if it still takes the
+  lease, it is released right away rather than blocking the key
+- A lock only serialises: the holder must re-check durable state that every
+  worker sees (user_wallets, creation_journal.py), not per-process dicts or
+  writes still deferred to a background task
+- Waiting is bounded by KEYED_LOCK_WAIT_TIMEOUT and the request deadline;
+  giving up raises LockTimeout (409 OPERATION_IN_PROGRESS + Retry-After)
+- Contention metrics: ``keyed_lock_wait_seconds{lock}`` and
+  ``keyed_lock_acquisitions_total{lock,result}`` (metrics.py), plus stats()
+
+Usage:
+    async with user_locks.hold(user_id):
+        ...check, then create...
+"""
+
+import os
+import time
+import uuid
+import weakref
+import sqlite3
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator
+
+from fastapi import HTTPException
+
+from metrics import keyed_lock_wait_seconds, keyed_lock_acquisitions_total
+from deadlines import budget_timeout
+
+logger = logging.getLogger(__name__)
+
+KEYED_LOCK_DB_PATH = os.environ.get('KEYED_LOCK_DB_PATH', '')
+KEYED_LOCK_WAIT_TIMEOUT = float(os.environ.get('KEYED_LOCK_WAIT_TIMEOUT', '30'))  # seconds
+KEYED_LOCK_LEASE_SECONDS = 120.0  # longer than any request holding a lock
+LEASE_POLL_INITIAL_DELAY = 0.05
+LEASE_POLL_MAX_DELAY = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS key_leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class LockTimeout(HTTPException):
+    """Another operation on the same key is still running."""
+
+    def __init__(self, lock: str):
+        super().__init__(
+            status_code=409,
+            detail="OPERATION_IN_PROGRESS",
+            headers={"Retry-After": "1"}
+        )
+        self.lock = lock
+
+    def __str__(self) -> str:
+        return f"timed out waiting for {self.lock} lock"
+
+
+class SqliteLeaseStore:
+    """Cross-process leases in one SQLite file (workers on the same host)."""
+
+    def __init__(self, db_path: str, lease_seconds: float = KEYED_LOCK_LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def try_acquire(self, key: str, owner: str) -> bool:
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM key_leases WHERE key = ? AND expires_at < ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO key_leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, owner, now + self.lease_seconds)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount == 1
+
+    def release(self, key: str, owner: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM key_leases WHERE key = ? AND owner = ?", (key, owner))
+
+
+class KeyedLock:
+    """Per-key async mutex with optional cross-process leases."""
+
+    def __init__(
+        self,
+        name: str,
+        store: Optional[SqliteLeaseStore] = None,
+        wait_timeout: float = KEYED_LOCK_WAIT_TIMEOUT
+    ):
+        self.name = name
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._owner_prefix = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._waiting = 0
+        self._held = 0
+        self._counters = {"acquired": 0, "contended": 0, "timeouts": 0}
+
+    def _lock_for(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    async def _acquire_lease(self, key: str, owner: str) -> bool:
+        """Take the shared lease; returns True if we had to wait for it."""
+        delay = LEASE_POLL_INITIAL_DELAY
+        waited = False
+        while True:
+            attempt = asyncio.ensure_future(asyncio.to_thread(self.store.try_acquire, key, owner))
+            try:
+                acquired = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                # The thread cannot be stopped: hand back a lease it still takes
+                attempt.add_done_callback(lambda done: self._release_abandoned(done, key, owner))
+                raise
+            if acquired:
+                return waited
+            waited = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LEASE_POLL_MAX_DELAY)
+
+    def _release_abandoned(self, attempt: "asyncio.Future[bool]", key: str, owner: str) -> None:
+        if attempt.cancelled() or attempt.exception() is not None or not attempt.result():
+            return
+        logger.info(f"[LOCK] Releasing {self.name} lease taken after its waiter gave up")
+        asyncio.get_running_loop().run_in_executor(None, self.store.release, key, owner)
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        lock = self._lock_for(key)  # strong reference while waiting / holding
+        owner = f"{self._owner_prefix}:{id(asyncio.current_task())}"
+        contended = lock.locked()
+        started = time.perf_counter()
+        locked = False
+        self._waiting += 1
+        try:
+            async with asyncio.timeout(budget_timeout(self.wait_timeout)):
+                await lock.acquire()
+                locked = True
+                if self.store is not None:
+                    contended = await self._acquire_lease(key, owner) or contended
+        except TimeoutError:
+            if locked:
+                lock.release()
+            self._counters["timeouts"] += 1
+            keyed_lock_acquisitions_total.inc(lock=self.name, result="timeout")
+            logger.warning(f"[LOCK] Gave up waiting for {self.name} lock after {time.perf_counter() - started:.1f}s")
+            raise LockTimeout(self.name)
+        except BaseException:
+            if locked:
+                lock.release()
+            raise
+        finally:
+            self._waiting -= 1
+
+        keyed_lock_wait_seconds.observe(time.perf_counter() - started, lock=self.name)
+        keyed_lock_acquisitions_total.inc(lock=self.name, result="contended" if contended else "uncontended")
+        self._counters["acquired"] += 1
+        self._counters["contended"] += contended
+        self._held += 1
+        try:
+            yield
+        finally:
+            self._held -= 1
+            try:
+                if self.store is not None:
+                    await asyncio.to_thread(self.store.release, key, owner)
+            finally:
+                lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._locks),
+            "held": self._held,
+            "waiting": self._waiting,
+            "shared": self.store is not None,
+            **self._counters
+        }
@@ -0,0 +1,167 @@
+"""
+NON-BLOCKING LOG PIPELINE
+=========================
+
+Request handlers only put log records on a bounded in-memory queue; a
+QueueListener thread formats them and writes them out. Log I/O (and JSON
+encoding of structured events) never runs on the event loop.
+
+- DroppingQueueHandler: enqueues without blocking; when the queue is full the
+  record is dropped and counted instead of back-pressuring the handler
+- Formatting is deferred to the listener thread: records keep their msg/args
+  and JsonMessage payloads are encoded only when written
+- Fast JSON: orjson when installed, otherwise a pre-built compact
+  json.JSONEncoder
+- Per-event sampling for high-volume structured events
+  (LOG_SAMPLE_RATES="event=rate,..."); error/failure events are never sampled
+
+Usage:
+    setup_logging(level=logging.INFO, fmt=...)   # once, at startup
+    (queued records are flushed at interpreter exit)
+"""
+
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Dict, Any
+
+try:
+    import orjson
+except ImportError:  # optional - the stdlib encoder is the fallback
+    orjson = None
+
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+# Structured events emitted on every Turnkey call - keep a sample only
+DEFAULT_SAMPLE_RATES = {
+    "turnkey_client_created": 0.05,
+}
+NEVER_SAMPLED_SUFFIXES = ("_error", "_failed", "_assertion_failed")
+
+_json_encoder = json.JSONEncoder(separators=(",", ":"), default=str, ensure_ascii=False)
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+_sample_rates: Dict[str, float] = {}
+_stats_lock = threading.Lock()
+_stats = {"dropped": 0, "sampled_out": 0}
+
+
+def fast_json(obj: Any) -> str:
+    """Compact JSON; non-serialisable values fall back to str()."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode()
+    return _json_encoder.encode(obj)
+
+
+class JsonMessage:
+    """Log argument encoded to JSON only when the record is formatted."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return fast_json(self.payload)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and defers formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same process - no pickling, so msg/args/exc_info can travel as-is
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _stats_lock:
+                _stats["dropped"] += 1
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """'a=0.1,b=0.5' -> {'a': 0.1, 'b': 0.5} (invalid entries are ignored)."""
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def configure_sampling(rates: Dict[str, float]) -> None:
+    _sample_rates.clear()
+    _sample_rates.update(rates)
+
+
+def should_log(event: str) -> bool:
+    """Sampling decision for a structured event."""
+    rate = _sample_rates.get(event)
+    if rate is None or rate >= 1.0 or event.endswith(NEVER_SAMPLED_SUFFIXES):
+        return True
+    if random.random() < rate:
+        return True
+    with _stats_lock:
+        _stats["sampled_out"] += 1
+    return False
+
+
+def setup_logging(level: int = logging.INFO, fmt: Optional[str] = None) -> None:
+    """
+    Route all root-logger output through the queue. The handlers that do the
+    actual writing (the root's existing handlers, else stderr) run on the
+    listener thread.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    configure_sampling({
+        **DEFAULT_SAMPLE_RATES,
+        **parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+    })
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    # Handlers someone already configured keep writing - just off-thread
+    handlers = list(root.handlers)
+    if not handlers:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(fmt))
+        handlers = [stream_handler]
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root.addHandler(_queue_handler)
+
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_pipeline_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["queue_depth"] = _queue_handler.queue.qsize() if _queue_handler else 0
+    stats["queue_size"] = LOG_QUEUE_SIZE
+    return stats
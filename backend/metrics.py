@@ -0,0 +1,324 @@
+"""
+PROMETHEUS METRICS
+==================
+
+Minimal in-process metrics registry rendered in the Prometheus text
+exposition format (served at /api/metrics). No client library needed.
+
+- Counter / Gauge / Histogram with label support
+- Thread-safe: Turnkey calls record from worker threads
+- Metrics are declared here, in one place, so names stay consistent;
+  modules import the metric objects and record into them
+
+Naming follows Prometheus conventions: ``_seconds`` for durations,
+``_total`` for counters.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Tuple, List, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Seconds - upstream calls and Turnkey activities
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds - in-process CPU stages
+CPU_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+EVENT_LOOP_LAG_INTERVAL = 0.5  # seconds between loop-lag probes
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # { label values: [per-bucket counts..., count, sum] }
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    entry[i] += 1
+            entry[-2] += 1
+            entry[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return {"count": entry[-2], "sum": entry[-1]} if entry else None
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        for key, entry in items:
+            for upper, count in zip(self.buckets + (float("inf"),), entry[:len(self.buckets)] + [entry[-2]]):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(upper)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {entry[-2]}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(entry[-1], 6))}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ============================================================================
+# Metric definitions
+# ============================================================================
+
+upstream_request_seconds = REGISTRY.register(Histogram(
+    "upstream_request_seconds",
+    "Upstream HTTP call latency (until response headers)",
+    ("upstream", "operation", "method", "status")
+))
+upstream_requests_in_flight = REGISTRY.register(Gauge(
+    "upstream_requests_in_flight",
+    "Upstream HTTP calls currently waiting for a response",
+    ("upstream",)
+))
+upstream_rejected_total = REGISTRY.register(Counter(
+    "upstream_rejected_total",
+    "Upstream calls refused locally (circuit open / bulkhead full)",
+    ("upstream", "reason")
+))
+circuit_breaker_state = REGISTRY.register(Gauge(
+    "circuit_breaker_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ("upstream",)
+))
+keyed_lock_wait_seconds = REGISTRY.register(Histogram(
+    "keyed_lock_wait_seconds",
+    "Time spent waiting for a per-key lock",
+    ("lock",)
+))
+keyed_lock_acquisitions_total = REGISTRY.register(Counter(
+    "keyed_lock_acquisitions_total",
+    "Per-key lock acquisitions by result (uncontended / contended / timeout)",
+    ("lock", "result")
+))
+turnkey_activity_seconds = REGISTRY.register(Histogram(
+    "turnkey_activity_seconds",
+    "Turnkey activity latency from submit to completion (including polling)",
+    ("type",)
+))
+stage_seconds = REGISTRY.register(Histogram(
+    "stage_seconds",
+    "In-process CPU stage latency",
+    ("stage",),
+    buckets=CPU_BUCKETS
+))
+cache_requests_total = REGISTRY.register(Counter(
+    "cache_requests_total",
+    "Cache lookups by result",
+    ("cache", "result")
+))
+http_request_seconds = REGISTRY.register(Histogram(
+    "http_request_seconds",
+    "Server-side request latency by route",
+    ("method", "route", "status")
+))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled"
+))
+event_loop_lag_seconds = REGISTRY.register(Gauge(
+    "event_loop_lag_seconds",
+    "Delay of the most recent event-loop probe beyond its scheduled time"
+))
+event_loop_lag_histogram = REGISTRY.register(Histogram(
+    "event_loop_lag_distribution_seconds",
+    "Event-loop probe delays",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+))
+component_stat = REGISTRY.register(Gauge(
+    "component_stat",
+    "Point-in-time counters reported by background components (sampled at scrape)",
+    ("component", "stat")
+))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_component_stats(component: str, stats: Dict[str, object]) -> None:
+    """Copy a component's numeric ``metrics()``/stats dict into component_stat."""
+    for stat, value in stats.items():
+        if isinstance(value, (int, float)):
+            component_stat.set(float(value), component=component, stat=stat)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording http_requests_in_flight and
+    http_request_seconds{method,route,status}. ``route`` is the matched path
+    template (e.g. /api/jobs/{job_id}), never the raw path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status[0]
+            )
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL) -> None:
+    """Sleep ``interval`` repeatedly and record how late each wake-up was."""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - scheduled)
+        event_loop_lag_seconds.set(lag)
+        event_loop_lag_histogram.observe(lag)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
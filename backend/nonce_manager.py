@@ -0,0 +1,173 @@
+"""
+PER-ADDRESS NONCE MANAGER
+=========================
+
+Allocates transaction nonces per wallet address on the server, so that
+concurrent or batched signing for one wallet never hands out the same nonce
+twice and clients don't need a round-trip per transaction.
+
+- One asyncio.Lock + in-memory counter per address, seeded from the chain's
+  pending transaction count (``eth_getTransactionCount(address, "pending")``)
+- reserve() hands out one or more nonces atomically (one lock per address)
+- release() returns a nonce that will never be broadcast (signing failed,
+  broadcast failed); released nonces are handed out again first, lowest
+  first, so the gap is filled instead of blocking every later transaction
+- Resync: an address idle for ``resync_after`` seconds is re-read from the
+  chain before its next reservation. The counter only moves forward -
+  transactions sent from elsewhere are skipped past, but nonces handed out
+  here and not yet broadcast are never handed out again (gaps are closed by
+  release(), not by the chain)
+
+Nonces are tracked for the chain behind the configured RPC node.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+NONCE_RESYNC_AFTER_SECONDS = 120.0
+
+
+class _AddressState:
+    __slots__ = ("next_nonce", "released", "last_used")
+
+    def __init__(self, next_nonce: int):
+        self.next_nonce = next_nonce
+        self.released: List[int] = []  # min-heap of nonces to hand out again
+        self.last_used = time.monotonic()
+
+
+class NonceManager:
+    """Server-side nonce allocator keyed by wallet address."""
+
+    def __init__(self, rpc: Optional[Any], resync_after: float = NONCE_RESYNC_AFTER_SECONDS):
+        """
+        Args:
+            rpc: JSON-RPC client with ``async call(method, params)``; None
+                disables allocation (callers fall back to the request nonce)
+            resync_after: Idle seconds after which an address is re-read
+                from the chain before its next reservation
+        """
+        self.rpc = rpc
+        self.resync_after = resync_after
+        self._states: Dict[str, _AddressState] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._counters = {"reserved": 0, "released": 0, "reused": 0, "resyncs": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpc is not None
+
+    def _lock(self, address: str) -> asyncio.Lock:
+        lock = self._locks.get(address)
+        if lock is None:
+            lock = self._locks[address] = asyncio.Lock()
+        return lock
+
+    async def _chain_nonce(self, address: str) -> int:
+        count = await self.rpc.call("eth_getTransactionCount", [address, "pending"])
+        return int(count, 16) if isinstance(count, str) else int(count or 0)
+
+    async def _sync(self, address: str, state: Optional[_AddressState]) -> _AddressState:
+        chain_nonce = await self._chain_nonce(address)
+        if state is None:
+            state = self._states[address] = _AddressState(chain_nonce)
+            return state
+
+        self._counters["resyncs"] += 1
+        if chain_nonce > state.next_nonce:
+            logger.info(f"[NONCE] Resynced {address}: local {state.next_nonce} -> chain {chain_nonce}")
+            state.next_nonce = chain_nonce
+        # Released nonces the chain has already seen were used elsewhere
+        state.released = [nonce for nonce in state.released if nonce >= chain_nonce]
+        heapq.heapify(state.released)
+        return state
+
+    async def reserve(self, address: str, count: int = 1) -> List[int]:
+        """
+        Atomically reserve ``count`` nonces for ``address``.
+
+        Released nonces are reused first, then the counter advances. A batch
+        that needs strictly consecutive nonces gets them whenever nothing has
+        been released.
+        """
+        if count < 1:
+            return []
+        address = address.lower()
+        async with self._lock(address):
+            state = self._states.get(address)
+            if state is None or time.monotonic() - state.last_used > self.resync_after:
+                state = await self._sync(address, state)
+
+            nonces = []
+            while state.released and len(nonces) < count:
+                nonces.append(heapq.heappop(state.released))
+                self._counters["reused"] += 1
+            while len(nonces) < count:
+                nonces.append(state.next_nonce)
+                state.next_nonce += 1
+            state.last_used = time.monotonic()
+            self._counters["reserved"] += count
+            return sorted(nonces)
+
+    async def release(self, address: str, nonces: List[int]) -> List[int]:
+        """
+        Return reserved nonces that will never be broadcast.
+
+        Returns: the nonces that were accepted (unknown or not-yet-reserved
+        nonces are ignored).
+        """
+        address = address.lower()
+        async with self._lock(address):
+            state = self._states.get(address)
+            if state is None:
+                return []
+            accepted = []
+            for nonce in sorted(set(nonces), reverse=True):
+                if nonce >= state.next_nonce or nonce in state.released:
+                    continue
+                if nonce == state.next_nonce - 1:
+                    state.next_nonce -= 1
+                else:
+                    heapq.heappush(state.released, nonce)
+                accepted.append(nonce)
+            # Released nonces directly below the counter just lower it
+            while state.released and max(state.released) == state.next_nonce - 1:
+                state.released.remove(state.next_nonce - 1)
+                heapq.heapify(state.released)
+                state.next_nonce -= 1
+            self._counters["released"] += len(accepted)
+            return sorted(accepted)
+
+    async def observe(self, address: str, nonce: int) -> None:
+        """Account for a nonce the client chose itself."""
+        address = address.lower()
+        async with self._lock(address):
+            state = self._states.get(address)
+            if state is None:
+                return
+            if nonce >= state.next_nonce:
+                state.next_nonce = nonce + 1
+            elif nonce in state.released:
+                state.released.remove(nonce)
+                heapq.heapify(state.released)
+
+    async def resync(self, address: str) -> int:
+        """Re-read ``address`` from the chain now. Returns the next nonce."""
+        address = address.lower()
+        async with self._lock(address):
+            state = await self._sync(address, self._states.get(address))
+            return state.next_nonce
+
+    def snapshot(self, address: str) -> Optional[Dict[str, Any]]:
+        state = self._states.get(address.lower())
+        if state is None:
+            return None
+        return {"next_nonce": state.next_nonce, "released": sorted(state.released)}
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "addresses": len(self._states), **self._counters}
@@ -0,0 +1,341 @@
+"""
+UPSTREAM RESILIENCE
+===================
+
+Keeps one slow or failing dependency (Supabase, Turnkey, CoinGecko, the EVM
+RPC) from taking unrelated endpoints down with it.
+
+Per upstream there is one UpstreamGuard, made of:
+
+BULKHEAD
+- At most ``max_concurrent`` calls in flight. Callers wait up to
+  BULKHEAD_MAX_WAIT seconds for a slot, then get a 503 instead of queueing
+  behind a hung dependency. For Turnkey this also keeps the synchronous client
+  from occupying every asyncio.to_thread worker.
+
+CIRCUIT BREAKER
+- Counts outcomes over the last BREAKER_WINDOW_SIZE calls. A call fails on a
+  transport error / timeout or a 5xx response; 4xx answers are the caller's
+  problem and count as successes, and calls cut short by the request's own
+  deadline (deadlines.py) count as neither.
+- CLOSED -> OPEN once at least BREAKER_MIN_CALLS were seen and the failure
+  rate reaches BREAKER_FAILURE_THRESHOLD. While OPEN, calls fail immediately.
+- OPEN -> HALF_OPEN after BREAKER_OPEN_SECONDS; one probe call is let through.
+  Success closes the breaker, failure re-opens it for another period.
+
+Refused calls raise UpstreamUnavailableError, an HTTPException (503 with
+``Retry-After``), so the existing ``except HTTPException: raise`` clauses in
+the handlers pass it straight to the client.
+
+Guards are used by http_clients.InstrumentedTransport (async) and
+TurnkeyClient._make_request (sync, worker threads); breaker_states() feeds
+/api/health.
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, Any, Iterator, AsyncIterator
+
+from fastapi import HTTPException
+
+from metrics import circuit_breaker_state, upstream_rejected_total
+from deadlines import budget_timeout, deadline_exhausted
+
+logger = logging.getLogger(__name__)
+
+BREAKER_WINDOW_SIZE = int(os.environ.get('BREAKER_WINDOW_SIZE', '20'))
+BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', '10'))
+BREAKER_FAILURE_THRESHOLD = float(os.environ.get('BREAKER_FAILURE_THRESHOLD', '0.5'))
+BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', '30'))
+BULKHEAD_MAX_WAIT = float(os.environ.get('BULKHEAD_MAX_WAIT', '0.5'))  # seconds
+
+# Max concurrent calls per upstream; override with e.g. TURNKEY_MAX_CONCURRENCY=24
+UPSTREAM_MAX_CONCURRENCY = {
+    "supabase": 50,
+    "turnkey": 16,
+    "coingecko": 4,
+    "rpc": 10,
+}
+DEFAULT_MAX_CONCURRENCY = 10
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+# UpstreamUnavailableError.reason
+REASON_CIRCUIT_OPEN = "circuit open"
+REASON_BULKHEAD_FULL = "too many concurrent calls"
+
+
+class UpstreamUnavailableError(HTTPException):
+    """An upstream call was refused locally (circuit open or bulkhead full)."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail=f"UPSTREAM_UNAVAILABLE:{upstream}",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"{self.upstream} unavailable ({self.reason}), retry after {self.retry_after}s"
+
+
+def is_failure_status(status_code: int) -> bool:
+    """Responses that count against the breaker (the upstream itself failed)."""
+    return status_code >= 500
+
+
+# ============================================================================
+# Circuit breaker
+# ============================================================================
+
+class CircuitBreaker:
+    """Count-based sliding-window breaker. Thread-safe."""
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = BREAKER_WINDOW_SIZE,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_threshold: float = BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = BREAKER_OPEN_SECONDS
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._outcomes: deque = deque(maxlen=window_size)  # True = failure
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+        self._lock = threading.Lock()
+        circuit_breaker_state.set(0, upstream=name)
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        circuit_breaker_state.set(_STATE_VALUES[state], upstream=self.name)
+
+    def _retry_after(self) -> int:
+        remaining = self._opened_at + self.open_seconds - time.monotonic()
+        return max(1, math.ceil(remaining))
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._set_state(STATE_HALF_OPEN)
+            return self._state
+
+    def before_call(self) -> bool:
+        """
+        Raise UpstreamUnavailableError if the call may not go out.
+        Returns True when the call is the half-open probe.
+        """
+        state = self.state
+        with self._lock:
+            if state == STATE_CLOSED:
+                return False
+            if state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            retry_after = self._retry_after()
+        upstream_rejected_total.inc(upstream=self.name, reason="circuit_open")
+        raise UpstreamUnavailableError(self.name, REASON_CIRCUIT_OPEN, retry_after)
+
+    def record(self, failed: Optional[bool], probe: bool = False) -> None:
+        """Record a call outcome; ``failed=None`` means no verdict (cancelled)."""
+        with self._lock:
+            if probe:
+                self._probe_in_flight = False
+                if failed is None:
+                    return
+                if failed:
+                    self._trip("probe failed")
+                else:
+                    self._outcomes.clear()
+                    self._set_state(STATE_CLOSED)
+                    logger.info(f"[BREAKER] {self.name} closed (probe succeeded)")
+                return
+
+            if failed is None or self._state != STATE_CLOSED:
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls:
+                failure_rate = sum(self._outcomes) / len(self._outcomes)
+                if failure_rate >= self.failure_threshold:
+                    self._trip(f"failure rate {failure_rate:.0%} over last {len(self._outcomes)} calls")
+
+    def _trip(self, reason: str) -> None:
+        self._opened_at = time.monotonic()
+        self._times_opened += 1
+        self._set_state(STATE_OPEN)
+        logger.warning(f"[BREAKER] {self.name} opened for {self.open_seconds:.0f}s: {reason}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            outcomes = list(self._outcomes)
+            return {
+                "state": state,
+                "failure_rate": round(sum(outcomes) / len(outcomes), 3) if outcomes else 0.0,
+                "window_calls": len(outcomes),
+                "times_opened": self._times_opened,
+                "retry_after": self._retry_after() if state == STATE_OPEN else None
+            }
+
+
+# ============================================================================
+# Bulkhead
+# ============================================================================
+
+class Bulkhead:
+    """
+    Concurrency limit shared by worker threads and the event loop (one
+    threading semaphore; async callers poll it instead of blocking the loop).
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_wait: float = BULKHEAD_MAX_WAIT):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def _acquired(self) -> None:
+        with self._lock:
+            self._in_use += 1
+
+    def acquire(self) -> bool:
+        if not self._semaphore.acquire(timeout=budget_timeout(self.max_wait)):
+            return False
+        self._acquired()
+        return True
+
+    async def acquire_async(self) -> bool:
+        deadline = time.monotonic() + budget_timeout(self.max_wait)
+        delay = 0.005
+        while not self._semaphore.acquire(blocking=False):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.05)
+        self._acquired()
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_use -= 1
+        self._semaphore.release()
+
+
+# ============================================================================
+# Guard = bulkhead + breaker
+# ============================================================================
+
+class UpstreamCall:
+    """Handed to the guarded block; set ``failed`` for a failed response."""
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+
+class UpstreamGuard:
+    def __init__(self, name: str, max_concurrent: int):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.bulkhead = Bulkhead(name, max_concurrent)
+
+    def _rejected_full(self, probe: bool) -> UpstreamUnavailableError:
+        self.breaker.record(None, probe)
+        upstream_rejected_total.inc(upstream=self.name, reason="bulkhead_full")
+        return UpstreamUnavailableError(self.name, REASON_BULKHEAD_FULL, 1)
+
+    def _finish(self, call: UpstreamCall, error: Optional[BaseException], probe: bool) -> None:
+        if error is None:
+            failed: Optional[bool] = call.failed
+        elif isinstance(error, Exception) and not deadline_exhausted():
+            failed = True
+        else:
+            failed = None  # cancelled / out of request budget - no verdict on the upstream
+        self.breaker.record(failed, probe)
+        self.bulkhead.release()
+
+    @contextmanager
+    def call(self) -> Iterator[UpstreamCall]:
+        """Guard a blocking call (worker threads)."""
+        probe = self.breaker.before_call()
+        if not self.bulkhead.acquire():
+            raise self._rejected_full(probe)
+        call = UpstreamCall()
+        try:
+            yield call
+        except BaseException as e:
+            self._finish(call, e, probe)
+            raise
+        self._finish(call, None, probe)
+
+    @asynccontextmanager
+    async def acall(self) -> AsyncIterator[UpstreamCall]:
+        """Guard an awaited call (event loop)."""
+        probe = self.breaker.before_call()
+        if not await self.bulkhead.acquire_async():
+            raise self._rejected_full(probe)
+        call = UpstreamCall()
+        try:
+            yield call
+        except BaseException as e:
+            self._finish(call, e, probe)
+            raise
+        self._finish(call, None, probe)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.breaker.snapshot(),
+            "in_flight": self.bulkhead.in_use,
+            "max_concurrent": self.bulkhead.max_concurrent
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(upstream: str) -> UpstreamGuard:
+    """The process-wide guard for ``upstream`` (created on first use)."""
+    guard = _guards.get(upstream)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(upstream)
+            if guard is None:
+                max_concurrent = int(os.environ.get(
+                    f"{upstream.upper()}_MAX_CONCURRENCY",
+                    UPSTREAM_MAX_CONCURRENCY.get(upstream, DEFAULT_MAX_CONCURRENCY)
+                ))
+                guard = _guards[upstream] = UpstreamGuard(upstream, max_concurrent)
+    return guard
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Breaker + bulkhead state per upstream, for /api/health."""
+    for upstream in UPSTREAM_MAX_CONCURRENCY:
+        get_guard(upstream)
+    return {name: guard.snapshot() for name, guard in sorted(_guards.items())}
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Header, BackgroundTasks
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -11,15 +11,91 @@ import random
 import math
 import secrets
 import hashlib
+import hmac
+import traceback
 from pathlib import Path
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Set
 from datetime import datetime, timedelta
+from uuid import UUID
 import asyncio
 
+SERVER_IMPORT_STARTED = time.perf_counter()
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+from admin_service import (
+    bulk_delete_users,
+    delete_user_everywhere,
+    sync_cleanup_orphans,
+    clamp_concurrency,
+    ADMIN_USERS_PAGE_SIZE,
+    ADMIN_DELETE_CONCURRENCY,
+)
+from job_runner import JobRunner
+from log_pipeline import setup_logging, log_pipeline_stats
+from http_clients import get_supabase_client, get_coingecko_client, shared_supabase_client, close_http_clients
+from turnkey_activity import TurnkeyActivityError, TurnkeyActivityPendingError
+from tx_builder import build_transaction, fee_oracle, nonce_manager
+from turnkey_client import TurnkeyClient, ApiKeyStamper, ApiKeyStamperConfig
+from turnkey_service import (
+    TURNKEY_API_BASE_URL,
+    sub_org_pool,
+    verify_turnkey_config,
+    create_wallet_in_sub_org,
+    ensure_user_sub_org_for_otp,
+    sign_raw_payload,
+    sign_raw_payloads,
+    sign_transaction,
+)
+from Crypto.Hash import keccak
+from startup_report import STARTUP_IMPORT_REPORT, write_startup_report
+from metrics import (
+    MetricsMiddleware,
+    record_cache,
+    record_component_stats,
+    monitor_event_loop_lag,
+    render_metrics,
+)
+from tracing import TracingMiddleware, stage, traced, start_file_exporter, stop_file_exporter, tracing_stats
+from resilience import UpstreamUnavailableError, breaker_states
+from deadlines import DeadlineMiddleware, DeadlineExceeded
+from idempotency import IdempotencyMiddleware, idempotency_store
+from keyed_locks import KeyedLock, SqliteLeaseStore, KEYED_LOCK_DB_PATH
+from creation_journal import CreationJournal, KIND_SUB_ORG, KIND_WALLET
+from sub_org_pool import SubOrgAttachPending
+from index_history import IndexHistory, bucket_starts, downsample
+from sparkline_series import index_series, INDEX_PRICE_MULTIPLIERS
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start background services, then warm up in the background (see warm_up):
+    /api/health answers immediately, /api/ready only once warm-up finished.
+    """
+    await report_startup()
+    start_file_exporter()
+    await start_job_runner()
+    await start_sub_org_pool()
+    await start_fee_oracle()
+    loop_lag_task = asyncio.create_task(monitor_event_loop_lag(), name="event-loop-lag")
+    warm_up_task = asyncio.create_task(warm_up(), name="warm-up")
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        loop_lag_task.cancel()
+        await asyncio.gather(warm_up_task, loop_lag_task, return_exceptions=True)
+        await stop_fee_oracle()
+        await stop_sub_org_pool()
+        await stop_job_runner()
+        await close_shared_http_clients()
+        stop_file_exporter()
+
+
 # FastAPI app with docs accessible at /api/docs
 app = FastAPI(
     title="Sequence Theory API",
@@ -27,17 +103,19 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan
 )
 api_router = APIRouter(prefix="/api")
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+setup_logging(level=logging.INFO, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Configuration
 SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
 SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
 COINGECKO_API_KEY = os.environ.get('COINGECKO_API_KEY', '')
+COINGECKO_API_URL = os.environ.get('COINGECKO_API_URL', 'https://api.coingecko.com/api/v3')
 
 # Production mode check - OTP never returned in production
 IS_PRODUCTION = os.environ.get('ENV', '').lower() == 'production' or os.environ.get('DEBUG', 'true').lower() == 'false'
@@ -81,6 +159,19 @@ verified_users: Dict[str, bool] = {}
 # This persists the sub_org_id for wallet creation since we can't store in DB yet
 verified_sub_orgs: Dict[str, str] = {}
 
+# Serialises per-user sub-org / wallet creation (check user_wallets and the
+# creation journal, then create). Set KEYED_LOCK_DB_PATH to share the locks
+# between workers on one host - the journal is shared the same way.
+user_locks = KeyedLock(
+    "user",
+    store=SqliteLeaseStore(KEYED_LOCK_DB_PATH) if KEYED_LOCK_DB_PATH else None
+)
+
+# Submitted / unpersisted sub-org and wallet creations per user, so a retry
+# resumes the same Turnkey activity instead of creating a second one
+CREATION_JOURNAL_DB_PATH = os.environ.get('CREATION_JOURNAL_DB_PATH', str(ROOT_DIR / 'creation_journal.db'))
+creation_journal = CreationJournal(CREATION_JOURNAL_DB_PATH)
+
 # ============================================================================
 # SECURITY NOTE: TURNKEY EMBEDDED WALLETS
 # ============================================================================
@@ -108,9 +199,24 @@ class IndicesRequest(BaseModel):
 index_scores_cache: Dict[str, Any] = {}
 INDEX_SCORE_CACHE_TTL = 300  # 5 minutes - scores refresh with market data, not timeframe
 
+# Chart candles per timeframe
+PERIOD_CONFIG = {
+    'daily': {'periods': 24, 'interval': 3600},      # 24 hourly candles
+    'month': {'periods': 30, 'interval': 86400},     # 30 daily candles
+    'year': {'periods': 52, 'interval': 604800},     # 52 weekly candles
+    'all': {'periods': 104, 'interval': 604800},     # ~2 years weekly candles
+}
+
+# Recorded index values - real chart history, kept as rolling candles per timeframe (see index_history.py)
+INDEX_HISTORY_DB_PATH = os.environ.get('INDEX_HISTORY_DB_PATH', str(ROOT_DIR / 'index_history.db'))
+index_history = IndexHistory(
+    INDEX_HISTORY_DB_PATH,
+    timeframes=[(config['interval'], config['periods']) for config in PERIOD_CONFIG.values()]
+)
+
 async def fetch_coingecko_markets(api_key: str) -> List[Dict]:
     """Fetch top coins from CoinGecko - fetch 250 to ensure we can get 100+ non-stablecoins"""
-    url = "https://api.coingecko.com/api/v3/coins/markets"
+    url = f"{COINGECKO_API_URL}/coins/markets"
     params = {
         "vs_currency": "usd",
         "order": "market_cap_desc", 
@@ -122,17 +228,21 @@ async def fetch_coingecko_markets(api_key: str) -> List[Dict]:
     
     for attempt in range(3):
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                response = await client.get(url, params=params, headers=headers)
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code == 429:
-                    await asyncio.sleep(2 ** attempt)
+            response = await get_coingecko_client().get(url, params=params, headers=headers)
+            if response.status_code == 200:
+                return response.json()
+            elif response.status_code == 429:
+                await asyncio.sleep(2 ** attempt)
+        except (UpstreamUnavailableError, DeadlineExceeded) as e:
+            # Breaker open / request out of time - don't retry, callers fall back to cached data
+            logger.warning(f"CoinGecko fetch skipped: {e}")
+            return []
         except Exception as e:
             logger.error(f"CoinGecko fetch error: {e}")
             await asyncio.sleep(1)
     return []
 
+@stage("generate_gbm_candles")
 def generate_gbm_candles(
     current_value: float,
     change_24h: float,
@@ -245,6 +355,7 @@ def generate_gbm_candles(
     
     return candles
 
+@stage("calculate_index_scores")
 def calculate_index_scores(market_data: List[Dict]) -> Dict:
     """
     Calculate INDEX SCORES - these are CONSTANT regardless of timeframe.
@@ -314,7 +425,7 @@ def calculate_index_scores(market_data: List[Dict]) -> Dict:
     
     # Scale by number of constituents to differentiate from Anchor5
     # 20 constituents vs 5 should give roughly 4x, plus some additional scaling
-    vibe_value = vibe_value * 2  # Gives us ~200k range
+    vibe_value = vibe_value * INDEX_PRICE_MULTIPLIERS['vibe20']  # x2 - gives us ~200k range
     
     # 24h change: Volume-weighted average
     total_volume = sum(c.get('total_volume', 0) or 0 for c in vibe_coins)
@@ -366,7 +477,7 @@ def calculate_index_scores(market_data: List[Dict]) -> Dict:
     
     # Index value: Sum of all prices scaled to millions
     raw_sum = sum(c.get('current_price', 0) for c in wave_coins)
-    wave_value = raw_sum * 100  # Scale to millions (multiply by 100)
+    wave_value = raw_sum * INDEX_PRICE_MULTIPLIERS['wave100']  # Scale to millions (multiply by 100)
     
     # 24h change: Simple average of the 100 top movers
     wave_change = sum(c.get('price_change_percentage_24h') or 0 for c in wave_coins) / num_wave_coins
@@ -412,14 +523,91 @@ def get_cached_scores(market_data: List[Dict]) -> Dict:
     if cache_key in index_scores_cache:
         cached = index_scores_cache[cache_key]
         if time.time() - cached['timestamp'] < INDEX_SCORE_CACHE_TTL:
+            record_cache("index_scores_cache", hit=True)
             return cached['data']
     
+    record_cache("index_scores_cache", hit=False)
     scores = calculate_index_scores(market_data)
     if scores:
-        index_scores_cache[cache_key] = {'data': scores, 'timestamp': time.time()}
+        now = time.time()
+        index_scores_cache[cache_key] = {'data': scores, 'series': sparkline_series(scores, now), 'timestamp': now}
     
     return scores
 
+@stage("sparkline_series")
+def sparkline_series(scores: Dict, end_ts: float) -> Dict[str, List]:
+    """Real 7-day index paths from the constituents' sparklines (see sparkline_series.py)."""
+    try:
+        return index_series(scores, end_ts)
+    except Exception as e:
+        logger.warning(f"[INDEX-HISTORY] Sparkline series unavailable: {e}")
+        return {}
+
+async def record_index_samples(market_data: List[Dict]) -> None:
+    """Append the current index values to the history (once per score refresh)."""
+    scores = get_cached_scores(market_data)
+    cached = index_scores_cache.get('scores')
+    if not scores or not cached:
+        return
+    values = {
+        name: (score['value'], sum(c.get('total_volume') or 0 for c in score['coins']))
+        for name, score in scores.items()
+    }
+    try:
+        # Keyed by the scores' computation time: a cached refresh adds nothing
+        await asyncio.to_thread(index_history.append, cached['timestamp'], values)
+    except Exception as e:
+        logger.warning(f"[INDEX-HISTORY] Could not record samples: {e}")
+
+
+def index_candles(
+    name: str, score: Dict, periods: int, interval: int, seed: int, series: Optional[List] = None
+) -> List[Dict]:
+    """
+    Chart candles from recorded history. Buckets before recording began come
+    from the 7-day sparkline series where it reaches; GBM only fills what is
+    left, ending at the first real level.
+    """
+    try:
+        candles = index_history.candles(name, periods, interval)
+    except Exception as e:
+        logger.warning(f"[INDEX-HISTORY] Falling back to GBM for {name}: {e}")
+        candles = [None] * periods
+    
+    missing = next((i for i, candle in enumerate(candles) if candle is not None), periods)
+    if missing and series:
+        starts = bucket_starts(periods, interval, time.time())[:missing]
+        candles = downsample(series, starts, interval) + candles[missing:]
+        missing = next((i for i, candle in enumerate(candles) if candle is not None), periods)
+    
+    if missing == periods:
+        return generate_gbm_candles(
+            score['value'], score['change_24h'], score['volatility_class'], periods, interval, seed=seed
+        )
+    if not missing:
+        return candles
+    
+    backfill = generate_gbm_candles(
+        candles[missing]['open'], score['change_24h'], score['volatility_class'], missing, interval, seed=seed
+    )
+    for candle, start in zip(backfill, bucket_starts(periods, interval, time.time())):
+        candle['time'] = start
+    return backfill + candles[missing:]
+
+
+def fmt_constituents(coins_list: List[Dict], weight_per_token: float) -> List[Dict]:
+    """Constituent rows for an index payload (equal weight per token)"""
+    return [{
+        "id": c.get('id', ''), 
+        "symbol": c.get('symbol', '').upper(), 
+        "weight": weight_per_token,
+        "price": c.get('current_price', 0), 
+        "market_cap": c.get('market_cap', 0),
+        "total_volume": c.get('total_volume', 0),
+        "price_change_percentage_24h": c.get('price_change_percentage_24h')
+    } for c in coins_list]
+
+@stage("calculate_sophisticated_indices")
 def calculate_sophisticated_indices(market_data: List[Dict], time_period: str) -> Dict:
     """
     Calculate indices with CONSTANT scores and timeframe-appropriate charts.
@@ -430,33 +618,17 @@ def calculate_sophisticated_indices(market_data: List[Dict], time_period: str) -
     
     # Get cached/calculated scores (constant across timeframes)
     scores = get_cached_scores(market_data)
+    series = index_scores_cache.get('scores', {}).get('series') or {}
     
     if not scores:
         return {"anchor5": None, "vibe20": None, "wave100": None, "lastUpdated": datetime.utcnow().isoformat()}
     
     # Period config for chart generation only
-    period_config = {
-        'daily': {'periods': 24, 'interval': 3600},      # 24 hourly candles
-        'month': {'periods': 30, 'interval': 86400},     # 30 daily candles
-        'year': {'periods': 52, 'interval': 604800},     # 52 weekly candles
-        'all': {'periods': 104, 'interval': 604800},     # ~2 years weekly candles
-    }
-    config = period_config.get(time_period, period_config['daily'])
+    config = PERIOD_CONFIG.get(time_period, PERIOD_CONFIG['daily'])
     
     # Create seed from current hour for consistent charts within same hour
     chart_seed = int(time.time() // 3600)
     
-    def fmt_constituents(coins_list, weight_per_token):
-        return [{
-            "id": c.get('id', ''), 
-            "symbol": c.get('symbol', '').upper(), 
-            "weight": weight_per_token,
-            "price": c.get('current_price', 0), 
-            "market_cap": c.get('market_cap', 0),
-            "total_volume": c.get('total_volume', 0),
-            "price_change_percentage_24h": c.get('price_change_percentage_24h')
-        } for c in coins_list]
-    
     anchor = scores['anchor5']
     vibe = scores['vibe20']
     wave = scores['wave100']
@@ -468,13 +640,8 @@ def calculate_sophisticated_indices(market_data: List[Dict], time_period: str) -
             "methodology": "price-weighted",
             "baseValue": 1000, 
             "timeframe": time_period,
-            "candles": generate_gbm_candles(
-                anchor['value'], 
-                anchor['change_24h'], 
-                anchor['volatility_class'],
-                config['periods'], 
-                config['interval'],
-                seed=chart_seed + 1
+            "candles": index_candles(
+                'anchor5', anchor, config['periods'], config['interval'], seed=chart_seed + 1, series=series.get('anchor5')
             ),
             "currentValue": anchor['value'],  # CONSTANT - doesn't change with timeframe
             "change_24h_percentage": anchor['change_24h'],
@@ -492,13 +659,8 @@ def calculate_sophisticated_indices(market_data: List[Dict], time_period: str) -
             "methodology": "volume-weighted",
             "baseValue": 100, 
             "timeframe": time_period,
-            "candles": generate_gbm_candles(
-                vibe['value'], 
-                vibe['change_24h'], 
-                vibe['volatility_class'],
-                config['periods'], 
-                config['interval'],
-                seed=chart_seed + 2
+            "candles": index_candles(
+                'vibe20', vibe, config['periods'], config['interval'], seed=chart_seed + 2, series=series.get('vibe20')
             ),
             "currentValue": vibe['value'],  # CONSTANT
             "change_24h_percentage": vibe['change_24h'],
@@ -516,13 +678,8 @@ def calculate_sophisticated_indices(market_data: List[Dict], time_period: str) -
             "methodology": "momentum-ranked, equal-weighted",
             "baseValue": 1000, 
             "timeframe": time_period,
-            "candles": generate_gbm_candles(
-                wave['value'], 
-                wave['change_24h'], 
-                wave['volatility_class'],
-                config['periods'], 
-                config['interval'],
-                seed=chart_seed + 3
+            "candles": index_candles(
+                'wave100', wave, config['periods'], config['interval'], seed=chart_seed + 3, series=series.get('wave100')
             ),
             "currentValue": wave['value'],  # CONSTANT
             "change_24h_percentage": wave['change_24h'],
@@ -552,15 +709,139 @@ async def root():
 async def health():
     """
     Health check endpoint.
+    Reports "degraded" while any upstream circuit breaker is not closed; the
+    process itself is still up and unaffected endpoints keep serving.
     """
+    upstreams = breaker_states()
+    degraded = [name for name, state in upstreams.items() if state["state"] != "closed"]
     return {
-        "status": "healthy",
+        "status": "degraded" if degraded else "healthy",
         "supabase_configured": bool(SUPABASE_SERVICE_KEY),
         "coingecko_configured": bool(COINGECKO_API_KEY),
         "turnkey_configured": bool(os.environ.get('TURNKEY_ORGANIZATION_ID')),
-        "wallet_custody": "turnkey-embedded - secure TEE infrastructure"
+        "wallet_custody": "turnkey-embedded - secure TEE infrastructure",
+        "upstreams": upstreams
     }
 
+
+# ============================================================================
+# WARM-UP / READINESS
+# ============================================================================
+# After a deploy the first requests would otherwise pay the TLS handshakes,
+# the Turnkey API key derivation and an empty crypto_cache. The lifespan runs
+# warm_up() in the background; /api/ready reports 503 until it has finished.
+
+WARMUP_STAGE_TIMEOUT = float(os.environ.get('WARMUP_STAGE_TIMEOUT', '30'))  # seconds
+
+warmup_state: Dict[str, Any] = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "stages": {}
+}
+
+
+async def preconnect_supabase() -> bool:
+    """Open the shared Supabase pool (one connection + TLS handshake)."""
+    if not SUPABASE_URL:
+        return False
+    response = await get_supabase_client().get(
+        f"{SUPABASE_URL}/auth/v1/health",
+        headers={"apikey": SUPABASE_SERVICE_KEY}
+    )
+    return response.status_code == 200
+
+
+def build_index_payloads(market_data: List[Dict]) -> None:
+    """Build and cache the crypto-indices payload for every time period."""
+    for time_period in CACHE_TTL:
+        indices = calculate_sophisticated_indices(market_data, time_period)
+        crypto_cache[f"indices_{time_period}"] = {'data': indices, 'timestamp': time.time()}
+
+
+async def prime_crypto_indices() -> bool:
+    """First market snapshot + all index payloads (also opens the CoinGecko pool)."""
+    market_data = await fetch_coingecko_markets(COINGECKO_API_KEY)
+    if not market_data:
+        return False
+    await record_index_samples(market_data)
+    await asyncio.to_thread(build_index_payloads, market_data)
+    return True
+
+
+async def run_warm_up_stage(name: str, stage) -> None:
+    started = time.perf_counter()
+    error = None
+    try:
+        ok = bool(await asyncio.wait_for(stage(), timeout=WARMUP_STAGE_TIMEOUT))
+    except Exception as e:
+        ok = False
+        error = str(e) or type(e).__name__
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    warmup_state["stages"][name] = {"ok": ok, "ms": elapsed_ms, "error": error}
+    if ok:
+        logger.info(f"[WARMUP] {name} ready in {elapsed_ms} ms")
+    else:
+        logger.warning(f"[WARMUP] {name} not warmed after {elapsed_ms} ms: {error or 'unavailable'}")
+
+
+async def warm_up():
+    """
+    Warm everything the first user requests would otherwise pay for. Stages
+    run concurrently; one failing (e.g. CoinGecko down) is recorded but does
+    not keep the instance unready - it then serves cold, as before.
+    """
+    warmup_state["started_at"] = time.time()
+    await asyncio.gather(
+        run_warm_up_stage("supabase_pool", preconnect_supabase),
+        run_warm_up_stage("turnkey", verify_turnkey_config),
+        run_warm_up_stage("crypto_indices", prime_crypto_indices)
+    )
+    warmup_state["finished_at"] = time.time()
+    warmup_state["ready"] = True
+    logger.info(
+        f"[WARMUP] Ready after {warmup_state['finished_at'] - warmup_state['started_at']:.2f}s"
+    )
+
+
+@api_router.get("/ready")
+async def ready():
+    """
+    Readiness check: 503 until the startup warm-up has finished, then 200.
+    Route traffic on this; /api/health only says the process is up.
+    """
+    return JSONResponse(
+        status_code=200 if warmup_state["ready"] else 503,
+        content=warmup_state
+    )
+
+
+@api_router.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint (text exposition format 0.0.4).
+    Upstream latency, cache hit rates, loop lag and in-flight requests are
+    recorded as they happen; component counters are sampled here.
+    """
+    record_component_stats("log_pipeline", log_pipeline_stats())
+    record_component_stats("nonce_manager", nonce_manager.metrics())
+    record_component_stats("tracing", tracing_stats())
+    record_component_stats("idempotency", idempotency_store.stats())
+    record_component_stats("user_locks", user_locks.stats())
+    try:
+        record_component_stats("creation_journal", await asyncio.to_thread(creation_journal.stats))
+    except Exception as e:
+        logger.warning(f"[METRICS] creation journal stats unavailable: {e}")
+    try:
+        record_component_stats("index_history", await asyncio.to_thread(index_history.stats))
+    except Exception as e:
+        logger.warning(f"[METRICS] index history stats unavailable: {e}")
+    try:
+        record_component_stats("sub_org_pool", await asyncio.to_thread(sub_org_pool.metrics))
+    except Exception as e:
+        logger.warning(f"[METRICS] sub-org pool metrics unavailable: {e}")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ============================================================================
 # USER PROFILE MANAGEMENT - Single Source of Truth
 # ============================================================================
@@ -570,55 +851,96 @@ class EnsureProfileRequest(BaseModel):
     name: Optional[str] = None
 
 
+# Profiles known to exist: { user_id: {'data': profile, 'timestamp': ...} }
+# Repeat logins within the TTL skip Supabase entirely.
+profile_cache: Dict[str, Dict[str, Any]] = {}
+PROFILE_CACHE_TTL = 120  # seconds
+PROFILE_CACHE_MAX_ENTRIES = 10000
+
+
+def cache_profile(user_id: str, profile: Dict) -> None:
+    """Remember that a profile exists (bounded - oldest entries evicted first)"""
+    profile_cache.pop(user_id, None)
+    while len(profile_cache) >= PROFILE_CACHE_MAX_ENTRIES:
+        profile_cache.pop(next(iter(profile_cache)))
+    profile_cache[user_id] = {'data': profile, 'timestamp': time.time()}
+
+
+def invalidate_profile_cache(*user_ids: str) -> None:
+    """Forget cached profiles (call whenever a profile is deleted)"""
+    for user_id in user_ids:
+        profile_cache.pop(user_id, None)
+
+
 async def ensure_profile_exists(user_id: str, email: str, name: Optional[str] = None) -> Dict:
     """
     Ensure a profile exists in the profiles table for the given user.
     This keeps profiles as the single source of truth for user data.
     
+    Uses a single idempotent upsert (on_conflict=user_id, merge-duplicates,
+    return=representation), so concurrent logins can't race into duplicate
+    inserts and an existing profile comes back in the same round trip. The
+    upsert carries only user_id and the auth email - never the name, which
+    the user may have changed. A new row gets its default name with a second
+    call (PATCH where name is null; a login that loses that race re-reads the
+    row). Results are cached for PROFILE_CACHE_TTL.
+    
     Returns the profile data.
     """
-    async with httpx.AsyncClient() as client:
-        # Check if profile exists
-        response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/profiles",
-            params={"user_id": f"eq.{user_id}", "select": "*"},
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-            }
-        )
-        
-        profiles = response.json() if response.status_code == 200 else []
-        
-        if profiles:
-            # Profile exists, return it
-            return profiles[0]
-        
-        # Profile doesn't exist - create it
-        profile_data = {
-            "user_id": user_id,
-            "email": email,
-            "name": name or email.split('@')[0]
-        }
-        
+    cached = profile_cache.get(user_id)
+    if cached and time.time() - cached['timestamp'] < PROFILE_CACHE_TTL:
+        return cached['data']
+    
+    headers = {
+        "apikey": SUPABASE_SERVICE_KEY,
+        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+        "Content-Type": "application/json",
+        "Prefer": "return=representation"
+    }
+    
+    async with shared_supabase_client() as client:
         response = await client.post(
             f"{SUPABASE_URL}/rest/v1/profiles",
-            json=profile_data,
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation"
-            }
+            params={"on_conflict": "user_id"},
+            json={"user_id": user_id, "email": email},
+            headers={**headers, "Prefer": "resolution=merge-duplicates,return=representation"}
         )
         
-        if response.status_code in [200, 201]:
-            result = response.json()
-            logger.info(f"Created profile for user {user_id}: {email}")
-            return result[0] if isinstance(result, list) else result
-        else:
-            logger.error(f"Failed to create profile: {response.status_code} - {response.text}")
+        if response.status_code not in [200, 201]:
+            logger.error(f"Failed to upsert profile: {response.status_code} - {response.text}")
+            return None
+        
+        result = response.json()
+        profile = (result[0] if isinstance(result, list) else result) if result else None
+        if not profile:
+            logger.error(f"Profile upsert for user {user_id} returned no row")
             return None
+        
+        if not profile.get("name"):
+            # New profile - set the default name, unless a parallel login just did
+            response = await client.patch(
+                f"{SUPABASE_URL}/rest/v1/profiles",
+                params={"user_id": f"eq.{user_id}", "name": "is.null"},
+                json={"name": name or email.split('@')[0]},
+                headers=headers
+            )
+            updated = response.json() if response.status_code == 200 else []
+            if updated:
+                profile = updated[0]
+                logger.info(f"Created profile for user {user_id}: {email}")
+            else:
+                # A parallel login named it first - read the name it set
+                response = await client.get(
+                    f"{SUPABASE_URL}/rest/v1/profiles",
+                    params={"user_id": f"eq.{user_id}", "select": "*"},
+                    headers=headers
+                )
+                rows = response.json() if response.status_code == 200 else []
+                if rows:
+                    profile = rows[0]
+    
+    cache_profile(user_id, profile)
+    return profile
 
 
 @api_router.post("/user/ensure-profile")
@@ -635,7 +957,7 @@ async def ensure_user_profile(
     
     token = authorization.replace("Bearer ", "")
     
-    async with httpx.AsyncClient() as client:
+    async with shared_supabase_client() as client:
         # Verify token and get user
         user_response = await client.get(
             f"{SUPABASE_URL}/auth/v1/user",
@@ -680,7 +1002,7 @@ async def get_user_profile(authorization: str = Header(None)):
     
     token = authorization.replace("Bearer ", "")
     
-    async with httpx.AsyncClient() as client:
+    async with shared_supabase_client() as client:
         # Verify token and get user
         user_response = await client.get(
             f"{SUPABASE_URL}/auth/v1/user",
@@ -733,6 +1055,39 @@ async def get_user_profile(authorization: str = Header(None)):
         }
 
 
+# Admin routes: a shared admin secret (ADMIN_API_KEY), the service role key,
+# or a Supabase user whose app_metadata.role is ADMIN_ROLE (app_metadata is
+# writable only with the service role key, so users cannot grant it themselves)
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', '')
+ADMIN_ROLE = "admin"
+
+
+async def require_admin(authorization: Optional[str]) -> None:
+    """Raise 401 for a missing or invalid token, 403 for a non-admin user."""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing authorization")
+    
+    token = authorization[len("Bearer "):]
+    for secret in (ADMIN_API_KEY, SUPABASE_SERVICE_KEY):
+        if secret and hmac.compare_digest(token.encode(), secret.encode()):
+            return
+    
+    user_response = await get_supabase_client().get(
+        f"{SUPABASE_URL}/auth/v1/user",
+        headers={
+            "apikey": SUPABASE_SERVICE_KEY,
+            "Authorization": authorization
+        }
+    )
+    if user_response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    
+    user_data = user_response.json()
+    if (user_data.get("app_metadata") or {}).get("role") != ADMIN_ROLE:
+        logger.warning(f"[ADMIN] Non-admin user {user_data.get('id')} refused")
+        raise HTTPException(status_code=403, detail="ADMIN_REQUIRED")
+
+
 class DeleteUserRequest(BaseModel):
     user_id: str
 
@@ -751,129 +1106,269 @@ async def delete_user_completely(
     This ensures profiles table stays as single source of truth.
     When you delete from profiles, you should call this to clean up everywhere.
     
-    ADMIN ONLY: Requires service role key in header for now.
+    ADMIN ONLY: see require_admin.
     """
-    # For admin operations, we check for a special admin header
-    # In production, you'd want proper admin authentication
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization")
+    await require_admin(authorization)
     
-    async with httpx.AsyncClient() as client:
-        deleted_from = []
-        
-        # 1. Delete from user_wallets
-        response = await client.delete(
-            f"{SUPABASE_URL}/rest/v1/user_wallets",
-            params={"user_id": f"eq.{user_id}"},
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-            }
-        )
-        if response.status_code in [200, 204]:
-            deleted_from.append("user_wallets")
-        
-        # 2. Delete from profiles
-        response = await client.delete(
-            f"{SUPABASE_URL}/rest/v1/profiles",
-            params={"user_id": f"eq.{user_id}"},
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-            }
-        )
-        if response.status_code in [200, 204]:
-            deleted_from.append("profiles")
-        
-        # 3. Delete from auth.users (this is the critical one!)
-        response = await client.delete(
-            f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-            }
-        )
-        if response.status_code in [200, 204]:
-            deleted_from.append("auth.users")
-        else:
-            logger.warning(f"Failed to delete from auth.users: {response.status_code} - {response.text}")
-        
-        logger.info(f"Deleted user {user_id} from: {deleted_from}")
-        
-        return {
-            "success": True,
+    async with shared_supabase_client() as client:
+        deleted_from = await delete_user_everywhere(client, user_id)
+    invalidate_profile_cache(user_id)
+    invalidate_signature_cache(user_id)
+    
+    return {
+        "success": True,
+        "user_id": user_id,
+        "deleted_from": deleted_from
+    }
+
+
+BULK_DELETE_MAX_USERS = 5000
+
+
+class BulkDeleteUsersRequest(BaseModel):
+    user_ids: List[UUID]  # Anything else is a 422 - ids end up in in.(...) filters and URLs
+    concurrency: int = ADMIN_DELETE_CONCURRENCY  # Capped at ADMIN_MAX_CONCURRENCY
+
+
+@api_router.post("/admin/users/bulk-delete")
+async def bulk_delete_users_endpoint(
+    request: BulkDeleteUsersRequest,
+    authorization: str = Header(None)
+):
+    """
+    Delete many users completely from ALL tables (auth.users, profiles, user_wallets).
+    
+    Table rows are deleted with chunked in.(...) filters and auth.users deletes
+    run concurrently, so a batch costs a handful of calls per 100 users instead
+    of three serial calls per user.
+    
+    Returns per-user results in request order. Users Supabase refused to
+    delete for now (bulkhead full / circuit open) are marked retryable.
+    
+    ADMIN ONLY: see require_admin.
+    """
+    await require_admin(authorization)
+    
+    # De-duplicate while keeping request order
+    user_ids = list(dict.fromkeys(str(uid) for uid in request.user_ids))
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="No user_ids provided")
+    if len(user_ids) > BULK_DELETE_MAX_USERS:
+        raise HTTPException(status_code=400, detail=f"Too many user_ids (max {BULK_DELETE_MAX_USERS})")
+    
+    async with shared_supabase_client() as client:
+        deleted = await bulk_delete_users(client, user_ids, concurrency=clamp_concurrency(request.concurrency))
+    invalidate_profile_cache(*user_ids)
+    invalidate_signature_cache(*user_ids)
+    
+    results = [
+        {
             "user_id": user_id,
-            "deleted_from": deleted_from
+            "success": "auth.users" in outcome["deleted_from"],
+            "deleted_from": outcome["deleted_from"],
+            "retryable": outcome["retryable"]
         }
+        for user_id, outcome in deleted.items()
+    ]
+    deleted_count = sum(1 for r in results if r["success"])
+    retryable_count = sum(1 for r in results if r["retryable"])
+    
+    return {
+        "success": deleted_count == len(results),
+        "requested": len(results),
+        "deleted_count": deleted_count,
+        "failed_count": len(results) - deleted_count - retryable_count,
+        "retryable_count": retryable_count,
+        "results": results
+    }
+
+
+class SyncCleanupRequest(BaseModel):
+    """Options for the orphan cleanup job (all optional)"""
+    start_page: int = 1  # Resume from a previous run's next_page
+    per_page: int = ADMIN_USERS_PAGE_SIZE
+    max_pages: Optional[int] = None
+    concurrency: int = ADMIN_DELETE_CONCURRENCY  # Capped at ADMIN_MAX_CONCURRENCY
+    dry_run: bool = False
 
 
 @api_router.post("/admin/sync-cleanup")
-async def admin_sync_cleanup(authorization: str = Header(None)):
+async def admin_sync_cleanup(
+    request: Optional[SyncCleanupRequest] = None,
+    authorization: str = Header(None)
+):
     """
     Admin endpoint to clean up orphaned records:
     - Delete auth.users that don't have profiles
     - Delete user_wallets that don't have profiles
     
     This keeps profiles as the single source of truth.
-    """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization")
     
-    async with httpx.AsyncClient() as client:
-        # Get all profile user_ids
-        response = await client.get(
-            f"{SUPABASE_URL}/rest/v1/profiles",
-            params={"select": "user_id"},
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-            }
+    Streams every page of auth users (not just the first), batches PostgREST
+    deletes and runs auth-admin deletes concurrently. If the run stops early
+    (max_pages or an upstream error) the response carries next_page - send it
+    back as start_page to resume.
+    """
+    await require_admin(authorization)
+    
+    options = request or SyncCleanupRequest()
+    
+    async with shared_supabase_client() as client:
+        progress = await sync_cleanup_orphans(
+            client,
+            start_page=max(1, options.start_page),
+            per_page=max(1, min(options.per_page, 1000)),
+            concurrency=clamp_concurrency(options.concurrency),
+            max_pages=options.max_pages,
+            dry_run=options.dry_run
         )
-        profiles = response.json() if response.status_code == 200 else []
-        profile_user_ids = set(p.get('user_id') for p in profiles)
-        
-        # Get all auth users
-        response = await client.get(
-            f"{SUPABASE_URL}/auth/v1/admin/users",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-            }
+    
+    return {
+        "success": progress["error"] is None,
+        "profiles_count": progress["with_profile"],
+        "auth_users_before": progress["scanned"],
+        "deleted_orphaned_auth_users": progress["deleted_auth_users"],
+        **progress
+    }
+
+# ============================================================================
+# ADMIN BACKGROUND JOBS - long admin operations run outside the HTTP request
+# ============================================================================
+
+ADMIN_JOBS_DB_PATH = os.environ.get('ADMIN_JOBS_DB_PATH', str(ROOT_DIR / 'admin_jobs.db'))
+ADMIN_JOB_WORKERS = int(os.environ.get('ADMIN_JOB_WORKERS', '2'))
+
+job_runner = JobRunner(ADMIN_JOBS_DB_PATH, max_workers=ADMIN_JOB_WORKERS)
+
+# Counters that accumulate across resumed runs of the same cleanup job
+SYNC_CLEANUP_COUNTERS = ("pages_fetched", "scanned", "with_profile", "orphans_found", "deleted_auth_users", "failed")
+
+
+async def run_sync_cleanup_job(params: Dict, progress: Dict, report) -> Dict:
+    """
+    Job handler: orphan cleanup, resuming from the last reported next_page.
+    max_pages counts page fetches over all runs of the job, not per run.
+    """
+    options = SyncCleanupRequest(**params)
+    start_page = progress.get("next_page") or options.start_page
+    base = {key: progress.get(key, 0) for key in SYNC_CLEANUP_COUNTERS}
+    max_pages = options.max_pages
+    if max_pages is not None:
+        max_pages = max(0, max_pages - base["pages_fetched"])
+    
+    def report_total(current: Dict) -> None:
+        report({**current, **{key: current[key] + base[key] for key in SYNC_CLEANUP_COUNTERS}})
+    
+    async with shared_supabase_client() as client:
+        result = await sync_cleanup_orphans(
+            client,
+            start_page=max(1, start_page),
+            per_page=max(1, min(options.per_page, 1000)),
+            concurrency=clamp_concurrency(options.concurrency),
+            max_pages=max_pages,
+            dry_run=options.dry_run,
+            on_progress=report_total
         )
-        auth_data = response.json()
-        auth_users = auth_data.get('users', [])
-        
-        # Delete orphaned auth users
-        deleted_auth = 0
-        for user in auth_users:
-            user_id = user.get('id')
-            if user_id not in profile_user_ids:
-                # Delete wallet first
-                await client.delete(
-                    f"{SUPABASE_URL}/rest/v1/user_wallets",
-                    params={"user_id": f"eq.{user_id}"},
-                    headers={
-                        "apikey": SUPABASE_SERVICE_KEY,
-                        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-                    }
-                )
-                # Delete from auth
-                response = await client.delete(
-                    f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}",
-                    headers={
-                        "apikey": SUPABASE_SERVICE_KEY,
-                        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-                    }
-                )
-                if response.status_code in [200, 204]:
-                    deleted_auth += 1
-        
-        return {
-            "success": True,
-            "profiles_count": len(profile_user_ids),
-            "auth_users_before": len(auth_users),
-            "deleted_orphaned_auth_users": deleted_auth
-        }
+    
+    if result["error"]:
+        raise Exception(f"{result['error']} (resume with start_page={result['next_page']})")
+    return {**result, **{key: result[key] + base[key] for key in SYNC_CLEANUP_COUNTERS}}
+
+
+DELETE_USER_JOB_ATTEMPTS = 4  # Runs of delete_user_everywhere while Supabase refuses calls
+
+
+async def run_delete_user_job(params: Dict, progress: Dict, report) -> Dict:
+    """
+    Job handler: delete one user from all stores. Fails (rather than
+    succeeding with a partial result) unless auth.users was deleted.
+    """
+    user_id = params["user_id"]
+    for attempt in range(DELETE_USER_JOB_ATTEMPTS):
+        try:
+            async with shared_supabase_client() as client:
+                deleted_from = await delete_user_everywhere(client, user_id)
+            break
+        except UpstreamUnavailableError as e:
+            if attempt + 1 == DELETE_USER_JOB_ATTEMPTS:
+                raise
+            logger.warning(f"[JOBS] Deleting user {user_id} refused, retrying: {e}")
+            report({"refused_attempts": attempt + 1})
+            await asyncio.sleep(max(e.retry_after, 2 ** attempt))
+    invalidate_profile_cache(user_id)
+    invalidate_signature_cache(user_id)
+    if "auth.users" not in deleted_from:
+        raise Exception(f"User {user_id} not deleted from auth.users (deleted from: {deleted_from})")
+    return {"user_id": user_id, "deleted_from": deleted_from}
+
+
+job_runner.register("sync-cleanup", run_sync_cleanup_job)
+job_runner.register("delete-user", run_delete_user_job)
+
+
+async def start_job_runner():
+    await job_runner.start()
+
+
+async def stop_job_runner():
+    await job_runner.stop()
+
+
+@api_router.post("/admin/jobs/sync-cleanup", status_code=202)
+async def enqueue_sync_cleanup_job(
+    request: Optional[SyncCleanupRequest] = None,
+    authorization: str = Header(None)
+):
+    """
+    Enqueue the orphan cleanup as a background job.
+    Poll GET /api/admin/jobs/{job_id} for progress and counters.
+    """
+    await require_admin(authorization)
+    
+    job = await job_runner.enqueue("sync-cleanup", (request or SyncCleanupRequest()).model_dump())
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@api_router.post("/admin/jobs/delete-user/{user_id}", status_code=202)
+async def enqueue_delete_user_job(
+    user_id: UUID,  # Anything else is a 422 - the id ends up in /auth/v1/admin/users/{user_id}
+    authorization: str = Header(None)
+):
+    """Enqueue complete deletion of a user as a background job."""
+    await require_admin(authorization)
+    
+    job = await job_runner.enqueue("delete-user", {"user_id": str(user_id)})
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_admin_job(job_id: str, authorization: str = Header(None)):
+    """Get status, progress counters and result of a background job."""
+    await require_admin(authorization)
+    
+    job = await job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="JOB_NOT_FOUND")
+    return job
+
+# ============================================================================
+# TURNKEY SUB-ORG WARM POOL
+# ============================================================================
+
+async def start_sub_org_pool():
+    await sub_org_pool.start()
+
+
+async def stop_sub_org_pool():
+    await sub_org_pool.stop()
+
+
+@api_router.get("/admin/sub-org-pool")
+async def get_sub_org_pool_metrics(authorization: str = Header(None)):
+    """Warm pool depth, claim/miss counters and claim latency."""
+    await require_admin(authorization)
+    
+    return await asyncio.to_thread(sub_org_pool.metrics)
 
 # ============================================================================
 # TURNKEY WALLET ENDPOINTS
@@ -884,9 +1379,11 @@ class CreateWalletRequest(BaseModel):
     name: Optional[str] = None
     user_id: Optional[str] = None  # Optional - derived from JWT if not provided
     passkey_attestation: Optional[Dict[str, Any]] = None
+    activityId: Optional[str] = None  # Resume a pending wallet creation
 
 class SignMessageRequest(BaseModel):
     message: str
+    activityId: Optional[str] = None  # Resume a pending signing activity
 
 class SignTransactionRequest(BaseModel):
     # Option 1: Pre-encoded RLP transaction
@@ -899,8 +1396,24 @@ class SignTransactionRequest(BaseModel):
     gasLimit: Optional[str] = "21000"
     maxFeePerGas: Optional[str] = None
     maxPriorityFeePerGas: Optional[str] = None
-    nonce: Optional[int] = None
+    nonce: Optional[int] = None  # Default: next nonce for the wallet (needs EVM_RPC_URL), else 0
+    txType: Optional[int] = None  # 2 = EIP-1559 (default), 1 = EIP-2930, 0 = legacy
+    gasPrice: Optional[str] = None  # Legacy / EIP-2930 only
+    accessList: Optional[List[Dict[str, Any]]] = None  # [{address, storageKeys}]
     transaction_type: Optional[str] = "TRANSACTION_TYPE_ETHEREUM"
+    activityId: Optional[str] = None  # Resume a pending signing activity
+
+class SignBatchItem(BaseModel):
+    # Exactly one of message / transaction
+    message: Optional[str] = None
+    transaction: Optional[SignTransactionRequest] = None
+
+class SignBatchRequest(BaseModel):
+    items: List[SignBatchItem]
+    concurrency: Optional[int] = 8  # Max in-flight transaction signing activities
+
+class ReleaseNoncesRequest(BaseModel):
+    nonces: List[int]
 
 class EmailOtpInitRequest(BaseModel):
     email: str
@@ -916,9 +1429,33 @@ class PasskeyVerifyRequest(BaseModel):
     attestation: Optional[Dict[str, Any]] = None
 
 
-async def get_user_and_wallet(authorization: str) -> Tuple[Dict, Dict]:
+async def resolve_token_user_id(authorization: str) -> Optional[str]:
     """
-    SECURITY: Verify auth token and get user's wallet.
+    User id behind a bearer token, or None if it does not verify. Scopes
+    Idempotency-Key entries to the user rather than the token, which changes
+    on every JWT refresh.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    try:
+        user_response = await get_supabase_client().get(
+            f"{SUPABASE_URL}/auth/v1/user",
+            headers={
+                "apikey": SUPABASE_SERVICE_KEY,
+                "Authorization": authorization
+            }
+        )
+    except (httpx.HTTPError, HTTPException) as e:
+        logger.warning(f"[IDEMPOTENCY] Could not resolve token user: {e}")
+        return None
+    if user_response.status_code != 200:
+        return None
+    return user_response.json().get("id")
+
+
+async def get_user_and_wallet(authorization: str) -> Tuple[Dict, Dict]:
+    """
+    SECURITY: Verify auth token and get user's wallet.
     Ensures the user can only access their own wallet.
     """
     if not authorization or not authorization.startswith("Bearer "):
@@ -926,7 +1463,7 @@ async def get_user_and_wallet(authorization: str) -> Tuple[Dict, Dict]:
     
     token = authorization.replace("Bearer ", "")
     
-    async with httpx.AsyncClient() as client:
+    async with shared_supabase_client() as client:
         # Verify Supabase token
         user_response = await client.get(
             f"{SUPABASE_URL}/auth/v1/user",
@@ -970,6 +1507,20 @@ async def get_user_and_wallet(authorization: str) -> Tuple[Dict, Dict]:
         return user_data, wallet
 
 
+def activity_pending_error(e: TurnkeyActivityPendingError) -> HTTPException:
+    """
+    503 for a Turnkey activity still running at its deadline. The client retries
+    with the activityId to resume the SAME activity instead of creating a new one.
+    Sub-org and wallet creation also journal the id (creation_journal.py), so a
+    plain retry of those resumes it too.
+    """
+    return HTTPException(
+        status_code=503,
+        detail=f"ACTIVITY_PENDING:{e.activity_id}",
+        headers={"Retry-After": "2"}
+    )
+
+
 @api_router.post("/turnkey/create-wallet")
 async def create_turnkey_wallet(
     request: CreateWalletRequest,
@@ -1000,7 +1551,7 @@ async def create_turnkey_wallet(
         
         token = authorization.replace("Bearer ", "")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with shared_supabase_client() as client:
             # Step 1: Verify user authentication
             user_response = await client.get(
                 f"{SUPABASE_URL}/auth/v1/user",
@@ -1035,88 +1586,125 @@ async def create_turnkey_wallet(
                     content={"error": "NOT_VERIFIED"}
                 )
             
-            # Step 4: IDEMPOTENCY CHECK - Check if user already has a wallet
-            logger.info(f"[WALLET] Checking for existing wallet for user {effective_user_id}")
-            check_response = await client.get(
-                f"{SUPABASE_URL}/rest/v1/user_wallets",
-                params={"user_id": f"eq.{effective_user_id}", "select": "*"},
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
-                }
-            )
+            # Serialise check-then-create per user (double-clicks, parallel tabs)
+            async with user_locks.hold(effective_user_id):
+                # Step 4: IDEMPOTENCY CHECK - Check if user already has a wallet
+                logger.info(f"[WALLET] Checking for existing wallet for user {effective_user_id}")
+                check_response = await client.get(
+                    f"{SUPABASE_URL}/rest/v1/user_wallets",
+                    params={"user_id": f"eq.{effective_user_id}", "select": "*"},
+                    headers={
+                        "apikey": SUPABASE_SERVICE_KEY,
+                        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"
+                    }
+                )
             
-            sub_org_id = None
-            if check_response.status_code == 200:
-                existing_wallets = check_response.json()
-                if existing_wallets and len(existing_wallets) > 0:
-                    existing = existing_wallets[0]
-                    # Get sub_org_id from existing record
-                    sub_org_id = existing.get("turnkey_sub_org_id")
+                sub_org_id = None
+                if check_response.status_code == 200:
+                    existing_wallets = check_response.json()
+                    if existing_wallets and len(existing_wallets) > 0:
+                        existing = existing_wallets[0]
+                        # Get sub_org_id from existing record
+                        sub_org_id = existing.get("turnkey_sub_org_id")
                     
-                    # Check if wallet already exists (idempotent)
-                    if existing.get("wallet_address") and existing.get("turnkey_wallet_id"):
-                        logger.info(f"[WALLET] IDEMPOTENT: Returning existing wallet for user {effective_user_id}")
-                        return {
-                            "walletAddress": existing.get("wallet_address"),
-                            "walletId": existing.get("turnkey_wallet_id")
-                        }
-            
-            # If not in DB, check verified_sub_orgs (from OTP verification)
-            if not sub_org_id:
-                sub_org_id = verified_sub_orgs.get(effective_user_id)
-                if sub_org_id:
-                    logger.info(f"[WALLET] Found sub_org_id {sub_org_id} in verified_sub_orgs for user {effective_user_id}")
+                        # Check if wallet already exists (idempotent)
+                        if existing.get("wallet_address") and existing.get("turnkey_wallet_id"):
+                            logger.info(f"[WALLET] IDEMPOTENT: Returning existing wallet for user {effective_user_id}")
+                            return {
+                                "walletAddress": existing.get("wallet_address"),
+                                "walletId": existing.get("turnkey_wallet_id")
+                            }
             
-            if not sub_org_id:
-                logger.error(f"[WALLET] No sub-org found for verified user {effective_user_id}")
-                raise HTTPException(status_code=400, detail="NO_SUB_ORG:Please complete email verification first")
-            
-            # Step 5: Create wallet in existing sub-org
-            logger.info(f"[WALLET] Creating wallet in existing sub-org {sub_org_id} for user {effective_user_id}")
-            
-            from turnkey_service import create_wallet_in_sub_org
-            
-            wallet_id, eth_address = await create_wallet_in_sub_org(
-                sub_org_id=sub_org_id,
-                user_email=effective_email
-            )
+                # If not in DB, check verified_sub_orgs (from OTP verification)
+                if not sub_org_id:
+                    sub_org_id = verified_sub_orgs.get(effective_user_id)
+                    if sub_org_id:
+                        logger.info(f"[WALLET] Found sub_org_id {sub_org_id} in verified_sub_orgs for user {effective_user_id}")
             
-            if not wallet_id or not eth_address:
-                raise HTTPException(status_code=500, detail="Failed to create wallet via Turnkey")
+                # Then the journal (created by another worker, DB write not landed yet)
+                if not sub_org_id:
+                    journaled_sub_org = await asyncio.to_thread(creation_journal.get, effective_user_id, KIND_SUB_ORG)
+                    sub_org_id = ((journaled_sub_org or {}).get("result") or {}).get("subOrgId")
             
-            logger.info(f"[WALLET] Created wallet {wallet_id} with address {eth_address} in sub-org {sub_org_id}")
+                if not sub_org_id:
+                    logger.error(f"[WALLET] No sub-org found for verified user {effective_user_id}")
+                    raise HTTPException(status_code=400, detail="NO_SUB_ORG:Please complete email verification first")
             
-            # Step 6: Store wallet in user_wallets table (INSERT new record)
-            wallet_data = {
-                "user_id": effective_user_id,
-                "wallet_address": eth_address,
-                "turnkey_sub_org_id": sub_org_id,
-                "turnkey_wallet_id": wallet_id,
-                "provider": "turnkey",
-                "network": "polygon",
-                "created_via": "passkey" if request.passkey_attestation else "email",
-                "provenance": "turnkey_invisible"
-            }
+                # Step 5: Create wallet in existing sub-org - unless one was already
+                # submitted for this user: then resume that activity, or reuse its
+                # result if only the user_wallets write is missing
+                journaled = await asyncio.to_thread(creation_journal.get, effective_user_id, KIND_WALLET) or {}
+                if journaled.get("result"):
+                    wallet_id = journaled["result"]["walletId"]
+                    eth_address = journaled["result"]["walletAddress"]
+                    logger.info(f"[WALLET] Reusing journaled wallet {wallet_id} for user {effective_user_id}")
+                else:
+                    activity_id = journaled.get("activity_id") or request.activityId
+                    logger.info(
+                        f"[WALLET] Creating wallet in existing sub-org {sub_org_id} for user {effective_user_id}"
+                        + (f" (resuming activity {activity_id})" if activity_id else "")
+                    )
+                
+                    try:
+                        wallet_id, eth_address = await create_wallet_in_sub_org(
+                            sub_org_id=sub_org_id,
+                            user_email=effective_email,
+                            activity_id=activity_id,
+                            on_submitted=lambda submitted_id: creation_journal.record_submitted(
+                                effective_user_id, KIND_WALLET, submitted_id
+                            )
+                        )
+                    except TurnkeyActivityPendingError:
+                        raise
+                    except TurnkeyActivityError:
+                        # Failed for good - the next attempt submits a new activity
+                        await asyncio.to_thread(creation_journal.clear, effective_user_id, KIND_WALLET)
+                        raise HTTPException(status_code=500, detail="Failed to create wallet via Turnkey")
+                
+                    if not wallet_id or not eth_address:
+                        raise HTTPException(status_code=500, detail="Failed to create wallet via Turnkey")
+                
+                    await asyncio.to_thread(
+                        creation_journal.record_result,
+                        effective_user_id,
+                        KIND_WALLET,
+                        {"walletId": wallet_id, "walletAddress": eth_address}
+                    )
+                    logger.info(f"[WALLET] Created wallet {wallet_id} with address {eth_address} in sub-org {sub_org_id}")
             
-            create_response = await client.post(
-                f"{SUPABASE_URL}/rest/v1/user_wallets",
-                json=wallet_data,
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation"
+                # Step 6: Store wallet in user_wallets table (INSERT new record)
+                wallet_data = {
+                    "user_id": effective_user_id,
+                    "wallet_address": eth_address,
+                    "turnkey_sub_org_id": sub_org_id,
+                    "turnkey_wallet_id": wallet_id,
+                    "provider": "turnkey",
+                    "network": "polygon",
+                    "created_via": "passkey" if request.passkey_attestation else "email",
+                    "provenance": "turnkey_invisible"
                 }
-            )
             
-            if create_response.status_code not in [200, 201]:
-                logger.error(f"[WALLET] Failed to store in user_wallets: {create_response.status_code} - {create_response.text}")
-            else:
-                logger.info(f"[WALLET] Successfully stored in user_wallets table")
-                # Clean up verified_sub_orgs now that it's in DB
-                if effective_user_id in verified_sub_orgs:
-                    del verified_sub_orgs[effective_user_id]
+                create_response = await client.post(
+                    f"{SUPABASE_URL}/rest/v1/user_wallets",
+                    json=wallet_data,
+                    headers={
+                        "apikey": SUPABASE_SERVICE_KEY,
+                        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+                        "Content-Type": "application/json",
+                        "Prefer": "return=representation"
+                    }
+                )
+            
+                if create_response.status_code not in [200, 201]:
+                    logger.error(f"[WALLET] Failed to store in user_wallets: {create_response.status_code} - {create_response.text}")
+                else:
+                    logger.info(f"[WALLET] Successfully stored in user_wallets table")
+                    invalidate_signature_cache(effective_user_id)
+                    await asyncio.to_thread(creation_journal.clear, effective_user_id, KIND_WALLET)
+                    await asyncio.to_thread(creation_journal.clear, effective_user_id, KIND_SUB_ORG)
+                    # Clean up verified_sub_orgs now that it's in DB
+                    if effective_user_id in verified_sub_orgs:
+                        del verified_sub_orgs[effective_user_id]
         
         logger.info(f"[WALLET] SUCCESS: Created wallet for user {effective_user_id}: {eth_address}")
         
@@ -1127,9 +1715,10 @@ async def create_turnkey_wallet(
         
     except HTTPException:
         raise
+    except TurnkeyActivityPendingError as e:
+        raise activity_pending_error(e)
     except Exception as e:
         logger.error(f"[WALLET] Error creating Turnkey wallet: {e}")
-        import traceback
         logger.error(f"[WALLET] Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1138,9 +1727,55 @@ async def create_turnkey_wallet(
 # EMAIL OTP VERIFICATION ENDPOINTS - Using Turnkey's Built-in Email OTP
 # ============================================================================
 
+SUB_ORG_PERSIST_ATTEMPTS = 3
+
+
+async def persist_otp_sub_org(user_id: str, sub_org_id: str) -> bool:
+    """
+    Upsert the user's sub_org_id into user_wallets (no wallet yet).
+    Runs as a post-response background task, retrying with backoff.
+    """
+    for attempt in range(SUB_ORG_PERSIST_ATTEMPTS):
+        try:
+            response = await get_supabase_client().post(
+                f"{SUPABASE_URL}/rest/v1/user_wallets",
+                json={
+                    "user_id": user_id,
+                    "turnkey_sub_org_id": sub_org_id,
+                    "wallet_address": None,
+                    "provider": "turnkey",
+                    "network": "polygon"
+                },
+                headers={
+                    "apikey": SUPABASE_SERVICE_KEY,
+                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
+                    "Content-Type": "application/json",
+                    "Prefer": "resolution=merge-duplicates"
+                }
+            )
+            if response.status_code in [200, 201, 204]:
+                await asyncio.to_thread(creation_journal.clear, user_id, KIND_SUB_ORG)
+                return True
+            logger.warning(f"[TURNKEY-OTP] Persist sub_org_id attempt {attempt + 1} failed: {response.status_code} - {response.text}")
+            delay = 2 ** attempt
+        except httpx.HTTPError as e:
+            logger.warning(f"[TURNKEY-OTP] Persist sub_org_id attempt {attempt + 1} failed: {e}")
+            delay = 2 ** attempt
+        except UpstreamUnavailableError as e:
+            # Bulkhead full / circuit open - wait at least as long as it asks
+            logger.warning(f"[TURNKEY-OTP] Persist sub_org_id attempt {attempt + 1} refused: {e.reason}")
+            delay = max(e.retry_after, 2 ** attempt)
+        if attempt + 1 < SUB_ORG_PERSIST_ATTEMPTS:
+            await asyncio.sleep(delay)
+    
+    logger.error(f"[TURNKEY-OTP] Could not persist sub_org_id {sub_org_id} for user {user_id}")
+    return False
+
+
 @api_router.post("/turnkey/init-email-auth")
 async def init_email_otp(
     request: EmailOtpInitRequest,
+    background_tasks: BackgroundTasks,
     authorization: str = Header(None)
 ):
     """
@@ -1153,6 +1788,10 @@ async def init_email_otp(
     4. User verifies OTP in sub-org
     5. ONLY THEN can they create wallet
     
+    Critical path is auth -> sub-org -> OTP send. Persisting the sub_org_id to
+    user_wallets runs after the response is sent (with retry); until it lands,
+    verify-email-otp and repeat sends use the sub_org_id kept in otp_storage.
+    
     Docs: https://docs.turnkey.com/authentication/email
     """
     try:
@@ -1162,155 +1801,164 @@ async def init_email_otp(
         token = authorization.replace("Bearer ", "")
         
         # Verify user via Supabase
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            user_response = await client.get(
-                f"{SUPABASE_URL}/auth/v1/user",
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {token}"
-                }
-            )
-            
-            if user_response.status_code != 200:
-                raise HTTPException(status_code=401, detail="INVALID_TOKEN")
-            
-            user_data = user_response.json()
-            user_id = user_data.get("id")
-            user_email = user_data.get("email")
-            
-            # Verify email matches
-            if request.email.lower() != user_email.lower():
-                raise HTTPException(status_code=400, detail="EMAIL_MISMATCH")
+        user_response = await get_supabase_client().get(
+            f"{SUPABASE_URL}/auth/v1/user",
+            headers={
+                "apikey": SUPABASE_SERVICE_KEY,
+                "Authorization": f"Bearer {token}"
+            }
+        )
         
-        current_time = time.time()
+        if user_response.status_code != 200:
+            raise HTTPException(status_code=401, detail="INVALID_TOKEN")
         
-        # Check rate limiting
-        existing = otp_storage.get(user_id, {})
+        user_data = user_response.json()
+        user_id = user_data.get("id")
+        user_email = user_data.get("email")
         
-        locked_until = existing.get("locked_until") or 0
-        if current_time < locked_until:
-            wait_time = int(locked_until - current_time)
-            raise HTTPException(
-                status_code=429, 
-                detail=f"RATE_LIMITED:Too many attempts. Try again in {wait_time} seconds."
-            )
+        # Verify email matches
+        if request.email.lower() != user_email.lower():
+            raise HTTPException(status_code=400, detail="EMAIL_MISMATCH")
         
-        last_sent = existing.get("last_sent_at", 0)
-        send_count = existing.get("send_count", 0)
+        # One send per user at a time: a parallel send must see this one's sub-org
+        async with user_locks.hold(user_id):
+            current_time = time.time()
         
-        if current_time - last_sent > OTP_RATE_WINDOW_SECONDS:
-            send_count = 0
+            # Check rate limiting
+            existing = otp_storage.get(user_id, {})
         
-        if send_count >= OTP_MAX_SENDS_PER_WINDOW:
-            raise HTTPException(
-                status_code=429, 
-                detail="RATE_LIMITED:Too many code requests. Please wait before requesting another."
-            )
+            locked_until = existing.get("locked_until") or 0
+            if current_time < locked_until:
+                wait_time = int(locked_until - current_time)
+                raise HTTPException(
+                    status_code=429, 
+                    detail=f"RATE_LIMITED:Too many attempts. Try again in {wait_time} seconds."
+                )
         
-        # STEP 1: Ensure user has a sub-org (create WITHOUT wallet if needed)
-        from turnkey_service import ensure_user_sub_org_for_otp
+            last_sent = existing.get("last_sent_at", 0)
+            send_count = existing.get("send_count", 0)
         
-        sub_org_id = await ensure_user_sub_org_for_otp(
-            supabase_user_id=user_id,
-            user_email=user_email,
-            user_name=user_email.split('@')[0]
-        )
+            if current_time - last_sent > OTP_RATE_WINDOW_SECONDS:
+                send_count = 0
         
-        if not sub_org_id:
-            logger.error(f"[TURNKEY-OTP] Failed to ensure sub-org for user {user_id}")
-            raise HTTPException(status_code=500, detail="TURNKEY_OTP_FAILED:Failed to prepare organization")
+            if send_count >= OTP_MAX_SENDS_PER_WINDOW:
+                raise HTTPException(
+                    status_code=429, 
+                    detail="RATE_LIMITED:Too many code requests. Please wait before requesting another."
+                )
         
-        logger.info(f"[TURNKEY-OTP] User {user_id} has sub-org {sub_org_id}")
+            # STEP 1: Ensure user has a sub-org (create WITHOUT wallet if needed)
+            # A previous send already resolved it - reuse it rather than probing the
+            # DB, which may not have the deferred write yet
+            sub_org_id = existing.get("sub_org_id") or verified_sub_orgs.get(user_id)
+            journaled = {}
+            if not sub_org_id:
+                # The journal is shared by all workers: a sub-org created (or still
+                # being created) for this user elsewhere, DB write not landed yet
+                journaled = await asyncio.to_thread(creation_journal.get, user_id, KIND_SUB_ORG) or {}
+                sub_org_id = (journaled.get("result") or {}).get("subOrgId")
+            if not sub_org_id:
+                try:
+                    sub_org_id = await ensure_user_sub_org_for_otp(
+                        supabase_user_id=user_id,
+                        user_email=user_email,
+                        user_name=user_email.split('@')[0],
+                        activity_id=journaled.get("activity_id"),
+                        on_submitted=lambda submitted_id: creation_journal.record_submitted(
+                            user_id, KIND_SUB_ORG, submitted_id
+                        )
+                    )
+                except TurnkeyActivityPendingError:
+                    raise
+                except TurnkeyActivityError:
+                    # Failed for good - the next attempt submits a new activity
+                    await asyncio.to_thread(creation_journal.clear, user_id, KIND_SUB_ORG)
+                    raise
+                if sub_org_id:
+                    await asyncio.to_thread(creation_journal.record_result, user_id, KIND_SUB_ORG, {"subOrgId": sub_org_id})
         
-        # STEP 2: Send OTP via Turnkey against the SUB-ORG
-        from turnkey_client import TurnkeyClient, ApiKeyStamper, ApiKeyStamperConfig
+            if not sub_org_id:
+                logger.error(f"[TURNKEY-OTP] Failed to ensure sub-org for user {user_id}")
+                raise HTTPException(status_code=500, detail="TURNKEY_OTP_FAILED:Failed to prepare organization")
         
-        TURNKEY_API_PUBLIC_KEY = os.environ.get('TURNKEY_API_PUBLIC_KEY', '')
-        TURNKEY_API_PRIVATE_KEY = os.environ.get('TURNKEY_API_PRIVATE_KEY', '')
+            logger.info(f"[TURNKEY-OTP] User {user_id} has sub-org {sub_org_id}")
         
-        config = ApiKeyStamperConfig(
-            api_public_key=TURNKEY_API_PUBLIC_KEY,
-            api_private_key=TURNKEY_API_PRIVATE_KEY
-        )
-        stamper = ApiKeyStamper(config)
+            # STEP 2: Send OTP via Turnkey against the SUB-ORG
+            TURNKEY_API_PUBLIC_KEY = os.environ.get('TURNKEY_API_PUBLIC_KEY', '')
+            TURNKEY_API_PRIVATE_KEY = os.environ.get('TURNKEY_API_PRIVATE_KEY', '')
         
-        # Client targets the SUB-ORG where OTP is enabled by default
-        turnkey_client = TurnkeyClient(
-            base_url="https://api.turnkey.com",
-            stamper=stamper,
-            organization_id=sub_org_id  # TARGET SUB-ORG
-        )
+            config = ApiKeyStamperConfig(
+                api_public_key=TURNKEY_API_PUBLIC_KEY,
+                api_private_key=TURNKEY_API_PRIVATE_KEY
+            )
+            stamper = ApiKeyStamper(config)
         
-        # OTP against SUB-ORG (OTP is enabled by default in sub-orgs)
-        otp_body = {
-            "type": "ACTIVITY_TYPE_INIT_OTP_AUTH",
-            "timestampMs": str(int(time.time() * 1000)),
-            "organizationId": sub_org_id,  # SUB-ORG, not parent
-            "parameters": {
-                "otpType": "OTP_TYPE_EMAIL",
-                "contact": user_email,
-                "emailCustomization": {
-                    "appName": "Sequence Theory"
-                },
-                "expirationSeconds": "600"
+            # Client targets the SUB-ORG where OTP is enabled by default
+            turnkey_client = TurnkeyClient(
+                base_url=TURNKEY_API_BASE_URL,
+                stamper=stamper,
+                organization_id=sub_org_id  # TARGET SUB-ORG
+            )
+        
+            # OTP against SUB-ORG (OTP is enabled by default in sub-orgs)
+            otp_body = {
+                "type": "ACTIVITY_TYPE_INIT_OTP_AUTH",
+                "timestampMs": str(int(time.time() * 1000)),
+                "organizationId": sub_org_id,  # SUB-ORG, not parent
+                "parameters": {
+                    "otpType": "OTP_TYPE_EMAIL",
+                    "contact": user_email,
+                    "emailCustomization": {
+                        "appName": "Sequence Theory"
+                    },
+                    "expirationSeconds": "600"
+                }
             }
-        }
         
-        logger.info(f"[TURNKEY-OTP] Calling init_otp_auth against SUB-ORG {sub_org_id} for {user_email}")
+            logger.info(f"[TURNKEY-OTP] Calling init_otp_auth against SUB-ORG {sub_org_id} for {user_email}")
         
-        result = turnkey_client.init_otp_auth(otp_body)
+            # Turnkey client is synchronous - keep it off the event loop
+            result = await asyncio.to_thread(turnkey_client.init_otp_auth, otp_body)
         
-        activity = result.get("activity", {})
-        activity_result = activity.get("result", {})
-        init_result = activity_result.get("initOtpAuthResultV2") or activity_result.get("initOtpAuthResult") or {}
-        otp_id = init_result.get("otpId")
+            activity = result.get("activity", {})
+            activity_result = activity.get("result", {})
+            init_result = activity_result.get("initOtpAuthResultV2") or activity_result.get("initOtpAuthResult") or {}
+            otp_id = init_result.get("otpId")
+        
+            if not otp_id:
+                logger.error(f"[TURNKEY-OTP] No otpId in response: {activity_result}")
+                raise HTTPException(status_code=500, detail="TURNKEY_OTP_FAILED:Failed to initiate email verification")
+        
+            logger.info(f"[TURNKEY-OTP] SUCCESS - OTP sent to {user_email}, otpId: {otp_id}")
+        
+            # Store OTP info with sub_org_id for verification step
+            otp_storage[user_id] = {
+                "otp_id": otp_id,
+                "sub_org_id": sub_org_id,
+                "expires": current_time + OTP_EXPIRY_SECONDS,
+                "email": user_email,
+                "attempts": 0,
+                "last_sent_at": current_time,
+                "send_count": send_count + 1,
+                "locked_until": None
+            }
         
-        if not otp_id:
-            logger.error(f"[TURNKEY-OTP] No otpId in response: {activity_result}")
-            raise HTTPException(status_code=500, detail="TURNKEY_OTP_FAILED:Failed to initiate email verification")
-        
-        logger.info(f"[TURNKEY-OTP] SUCCESS - OTP sent to {user_email}, otpId: {otp_id}")
-        
-        # Store OTP info with sub_org_id for verification step
-        otp_storage[user_id] = {
-            "otp_id": otp_id,
-            "sub_org_id": sub_org_id,
-            "expires": current_time + OTP_EXPIRY_SECONDS,
-            "email": user_email,
-            "attempts": 0,
-            "last_sent_at": current_time,
-            "send_count": send_count + 1,
-            "locked_until": None
-        }
-        
-        # PERSIST sub_org_id to DB for durability
-        async with httpx.AsyncClient(timeout=30.0) as db_client:
-            # Upsert to user_wallets with just sub_org_id (no wallet yet)
-            await db_client.post(
-                f"{SUPABASE_URL}/rest/v1/user_wallets",
-                json={
-                    "user_id": user_id,
-                    "turnkey_sub_org_id": sub_org_id,
-                    "wallet_address": None,
-                    "provider": "turnkey",
-                    "network": "polygon"
-                },
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "resolution=merge-duplicates"
-                }
-            )
+            # PERSIST sub_org_id to DB for durability (after the response is sent)
+            background_tasks.add_task(persist_otp_sub_org, user_id, sub_org_id)
         
         # RETURN otpId to client - client MUST send it back in verify
         return {"ok": True, "otpId": otp_id}
         
     except HTTPException:
         raise
+    except TurnkeyActivityPendingError as e:
+        raise activity_pending_error(e)
+    except SubOrgAttachPending as e:
+        # The pooled sub-org stays reserved for this user - a retry resumes it
+        logger.warning(f"[TURNKEY-OTP] {e}")
+        raise HTTPException(status_code=503, detail="SUB_ORG_ATTACH_PENDING", headers={"Retry-After": "2"})
     except Exception as e:
         logger.error(f"[TURNKEY-OTP] Error initiating email OTP: {e}")
-        import traceback
         logger.error(f"[TURNKEY-OTP] Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"TURNKEY_OTP_FAILED:{str(e)}")
 
@@ -1333,7 +1981,7 @@ async def verify_email_otp(
         token = authorization.replace("Bearer ", "")
         
         # Verify user via Supabase
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with shared_supabase_client() as client:
             user_response = await client.get(
                 f"{SUPABASE_URL}/auth/v1/user",
                 headers={
@@ -1367,7 +2015,7 @@ async def verify_email_otp(
             raise HTTPException(status_code=400, detail="OTP_NOT_FOUND:Missing otpId. Please request a new code.")
         
         # Get sub_org_id from DB (durable) - NOT from memory
-        async with httpx.AsyncClient(timeout=30.0) as db_client:
+        async with shared_supabase_client() as db_client:
             wallet_response = await db_client.get(
                 f"{SUPABASE_URL}/rest/v1/user_wallets",
                 params={"user_id": f"eq.{user_id}", "select": "turnkey_sub_org_id"},
@@ -1394,8 +2042,6 @@ async def verify_email_otp(
         # Per Turnkey docs: https://docs.turnkey.com/authentication/email#otp-based-authentication-flow
         logger.info(f"[TURNKEY-OTP] Verifying OTP for user {user_id} in sub-org {sub_org_id}, otpId: {otp_id}")
         
-        from turnkey_client import TurnkeyClient, ApiKeyStamper, ApiKeyStamperConfig
-        
         TURNKEY_API_PUBLIC_KEY = os.environ.get('TURNKEY_API_PUBLIC_KEY', '')
         TURNKEY_API_PRIVATE_KEY = os.environ.get('TURNKEY_API_PRIVATE_KEY', '')
         
@@ -1407,7 +2053,7 @@ async def verify_email_otp(
         
         # Client targets the SUB-ORG (same as init)
         turnkey_client = TurnkeyClient(
-            base_url="https://api.turnkey.com",
+            base_url=TURNKEY_API_BASE_URL,
             stamper=stamper,
             organization_id=sub_org_id  # TARGET SUB-ORG
         )
@@ -1483,7 +2129,6 @@ async def verify_email_otp(
         raise
     except Exception as e:
         logger.error(f"[TURNKEY-OTP] Error verifying OTP: {e}")
-        import traceback
         logger.error(f"[TURNKEY-OTP] Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail="INTERNAL_ERROR")
 
@@ -1504,7 +2149,7 @@ async def verify_passkey(
         token = authorization.replace("Bearer ", "")
         
         # Verify user
-        async with httpx.AsyncClient() as client:
+        async with shared_supabase_client() as client:
             user_response = await client.get(
                 f"{SUPABASE_URL}/auth/v1/user",
                 headers={
@@ -1558,7 +2203,7 @@ async def get_verification_status(authorization: str = Header(None)):
         token = authorization.replace("Bearer ", "")
         
         # Verify user
-        async with httpx.AsyncClient() as client:
+        async with shared_supabase_client() as client:
             user_response = await client.get(
                 f"{SUPABASE_URL}/auth/v1/user",
                 headers={
@@ -1602,7 +2247,7 @@ async def get_turnkey_wallet_info(authorization: str = Header(None)):
         
         token = authorization.replace("Bearer ", "")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with shared_supabase_client() as client:
             # Verify user
             user_response = await client.get(
                 f"{SUPABASE_URL}/auth/v1/user",
@@ -1672,6 +2317,187 @@ async def get_turnkey_wallet_info(authorization: str = Header(None)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Recent message signatures, scoped per user:
+# { user_id: { (sub_org_id, wallet_address, message_hash, hash_function): {'data': sig, 'timestamp': ...} } }
+# Page reloads re-request signatures for the same login challenge / SIWE
+# message; within the TTL those are answered without a Turnkey activity.
+# Set SIGNATURE_CACHE_TTL=0 to disable.
+signature_cache: Dict[str, Dict[Tuple[str, str, str, str], Dict[str, Any]]] = {}
+SIGNATURE_CACHE_TTL = int(os.environ.get('SIGNATURE_CACHE_TTL', '60'))  # seconds
+SIGNATURE_CACHE_MAX_USERS = 5000
+SIGNATURE_CACHE_MAX_PER_USER = 32
+
+# Signing activities in flight for the same key - concurrent retries share one
+signature_inflight: Dict[Tuple[str, ...], asyncio.Future] = {}
+
+
+def get_cached_signature(user_id: str, key: Tuple[str, str, str, str]) -> Optional[Dict]:
+    entries = signature_cache.get(user_id)
+    cached = entries.get(key) if entries else None
+    if not cached:
+        return None
+    if time.time() - cached['timestamp'] >= SIGNATURE_CACHE_TTL:
+        entries.pop(key, None)
+        return None
+    return cached['data']
+
+
+def cache_signature(user_id: str, key: Tuple[str, str, str, str], signature: Dict) -> None:
+    """Remember a signature (bounded per user and in users - oldest evicted first)"""
+    if SIGNATURE_CACHE_TTL <= 0:
+        return
+    entries = signature_cache.pop(user_id, None)
+    if entries is None:
+        entries = {}
+        while len(signature_cache) >= SIGNATURE_CACHE_MAX_USERS:
+            signature_cache.pop(next(iter(signature_cache)))
+    signature_cache[user_id] = entries
+    entries.pop(key, None)
+    while len(entries) >= SIGNATURE_CACHE_MAX_PER_USER:
+        entries.pop(next(iter(entries)))
+    entries[key] = {'data': signature, 'timestamp': time.time()}
+
+
+def invalidate_signature_cache(*user_ids: str) -> None:
+    """Forget cached signatures (call whenever a user's wallet changes or is deleted)"""
+    for user_id in user_ids:
+        signature_cache.pop(user_id, None)
+
+
+async def sign_message_hash(
+    user_id: str,
+    sub_org_id: str,
+    wallet_address: str,
+    message_hash: str,
+    activity_id: Optional[str] = None
+) -> Dict:
+    """
+    Sign an already-hashed message, answering repeats from signature_cache
+    and sharing one activity between concurrent identical requests.
+    
+    A resumed activity (activity_id) bypasses both: its payload is whatever
+    was submitted earlier, not necessarily message_hash, so its signature is
+    neither cached nor handed to waiters under this hash.
+    """
+    hash_function = "HASH_FUNCTION_NO_OP"  # Already hashed
+    
+    if activity_id:
+        return await sign_raw_payload(
+            sub_org_id=sub_org_id,
+            wallet_address=wallet_address,
+            payload=message_hash,
+            encoding="PAYLOAD_ENCODING_HEXADECIMAL",
+            hash_function=hash_function,
+            activity_id=activity_id
+        )
+    
+    key = (sub_org_id, wallet_address, message_hash, hash_function)
+    inflight_key = (user_id, *key)
+    
+    while SIGNATURE_CACHE_TTL > 0:
+        cached = get_cached_signature(user_id, key)
+        if cached:
+            logger.info(f"Signature cache hit for user {user_id}")
+            return cached
+        inflight = signature_inflight.get(inflight_key)
+        if not inflight:
+            break
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+            # The request that owned the activity went away - sign ourselves
+    
+    future = asyncio.get_running_loop().create_future()
+    signature_inflight[inflight_key] = future
+    try:
+        signature_data = await sign_raw_payload(
+            sub_org_id=sub_org_id,
+            wallet_address=wallet_address,
+            payload=message_hash,
+            encoding="PAYLOAD_ENCODING_HEXADECIMAL",
+            hash_function=hash_function
+        )
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Mark retrieved - waiters re-raise it themselves
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        if signature_inflight.get(inflight_key) is future:
+            del signature_inflight[inflight_key]
+    
+    future.set_result(signature_data)
+    cache_signature(user_id, key, signature_data)
+    return signature_data
+
+
+def personal_sign_hash(message: str) -> str:
+    """Keccak-256 of an Ethereum personal_sign (EIP-191) prefixed message, as hex"""
+    prefix = f"\x19Ethereum Signed Message:\n{len(message)}"
+    prefixed_message = prefix + message
+    k = keccak.new(digest_bits=256)
+    k.update(prefixed_message.encode())
+    return k.hexdigest()
+
+
+async def start_fee_oracle():
+    await fee_oracle.start()
+
+
+async def stop_fee_oracle():
+    await fee_oracle.stop()
+
+
+@traced("build_unsigned_transaction")
+async def build_unsigned_transaction(
+    request: SignTransactionRequest,
+    sender: str
+) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Return the unsigned transaction hex for a sign request: the pre-encoded
+    unsigned_transaction, or one encoded from the fields (EIP-1559 unless
+    txType says otherwise). Missing fees and nonce are filled in by
+    tx_builder. None if neither is given.
+    
+    Returns: (unsigned_tx, reserved_nonce) - reserved_nonce is set when the
+    nonce was allocated by nonce_manager and must be released if the
+    transaction is not signed.
+    """
+    if request.unsigned_transaction:
+        return request.unsigned_transaction, None
+    if not request.to:
+        return None, None
+    
+    tx = await build_transaction(
+        sender=sender,
+        to=request.to,
+        value=request.value,
+        data=request.data,
+        chain_id=request.chainId,
+        gas_limit=request.gasLimit,
+        nonce=request.nonce,
+        tx_type=request.txType,
+        max_fee_per_gas=request.maxFeePerGas,
+        max_priority_fee_per_gas=request.maxPriorityFeePerGas,
+        gas_price=request.gasPrice,
+        access_list=request.accessList
+    )
+    unsigned_tx = tx.to_hex()
+    logger.info(f"Built unsigned tx: {unsigned_tx[:50]}...")
+    reserved_nonce = tx.nonce if request.nonce is None and nonce_manager.enabled else None
+    return unsigned_tx, reserved_nonce
+
+
+async def release_reserved_nonce(wallet_address: str, nonce: Optional[int]) -> None:
+    """Give back a server-allocated nonce whose transaction was never signed."""
+    if nonce is not None:
+        await nonce_manager.release(wallet_address, [nonce])
+
+
 @api_router.post("/turnkey/sign-message")
 async def sign_turnkey_message(
     request: SignMessageRequest,
@@ -1697,23 +2523,14 @@ async def sign_turnkey_message(
         if not sub_org_id or not wallet_address:
             raise HTTPException(status_code=400, detail="Wallet not properly configured")
         
-        from turnkey_service import sign_raw_payload
-        from Crypto.Hash import keccak
-        
-        # Prepare message for signing (Ethereum personal_sign format)
-        message = request.message
-        prefix = f"\x19Ethereum Signed Message:\n{len(message)}"
-        prefixed_message = prefix + message
-        k = keccak.new(digest_bits=256)
-        k.update(prefixed_message.encode())
-        message_hash = k.hexdigest()
+        message_hash = personal_sign_hash(request.message)
         
-        signature_data = await sign_raw_payload(
-            sub_org_id=sub_org_id,
-            wallet_address=wallet_address,
-            payload=message_hash,
-            encoding="PAYLOAD_ENCODING_HEXADECIMAL",
-            hash_function="HASH_FUNCTION_NO_OP"  # Already hashed
+        signature_data = await sign_message_hash(
+            user_data.get("id"),
+            sub_org_id,
+            wallet_address,
+            message_hash,
+            activity_id=request.activityId
         )
         
         logger.info(f"Signed message for user {user_data.get('id')}")
@@ -1729,6 +2546,8 @@ async def sign_turnkey_message(
         
     except HTTPException:
         raise
+    except TurnkeyActivityPendingError as e:
+        raise activity_pending_error(e)
     except Exception as e:
         logger.error(f"Error signing message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1763,72 +2582,255 @@ async def sign_turnkey_transaction(
         if not sub_org_id or not wallet_address:
             raise HTTPException(status_code=400, detail="Wallet not properly configured")
         
-        # Build or use provided unsigned transaction
-        unsigned_tx = request.unsigned_transaction
-        
-        if not unsigned_tx and request.to:
-            # Build RLP-encoded unsigned transaction from fields
-            import rlp
-            
-            # Parse values
-            to_addr = bytes.fromhex(request.to[2:] if request.to.startswith('0x') else request.to) if request.to else b''
-            value = int(request.value or '0', 16) if request.value.startswith('0x') else int(request.value or '0')
-            data = bytes.fromhex(request.data[2:] if request.data.startswith('0x') else request.data) if request.data else b''
-            chain_id = request.chainId or 137
-            gas_limit = int(request.gasLimit or '21000', 16) if str(request.gasLimit).startswith('0x') else int(request.gasLimit or '21000')
-            nonce = request.nonce or 0
-            
-            # For EIP-1559 transactions (type 2) on Polygon
-            max_fee_per_gas = int(request.maxFeePerGas or '50000000000', 16) if request.maxFeePerGas and str(request.maxFeePerGas).startswith('0x') else int(request.maxFeePerGas or '50000000000')  # 50 gwei default
-            max_priority_fee_per_gas = int(request.maxPriorityFeePerGas or '30000000000', 16) if request.maxPriorityFeePerGas and str(request.maxPriorityFeePerGas).startswith('0x') else int(request.maxPriorityFeePerGas or '30000000000')  # 30 gwei default
-            
-            # EIP-1559 transaction structure (type 2)
-            # [chainId, nonce, maxPriorityFeePerGas, maxFeePerGas, gasLimit, to, value, data, accessList]
-            tx_fields = [
-                chain_id,
-                nonce,
-                max_priority_fee_per_gas,
-                max_fee_per_gas,
-                gas_limit,
-                to_addr,
-                value,
-                data,
-                []  # access list (empty for simple transactions)
-            ]
-            
-            # Encode as type 2 transaction: 0x02 || RLP([...])
-            rlp_encoded = rlp.encode(tx_fields)
-            unsigned_tx = '0x02' + rlp_encoded.hex()
+        if request.activityId:
+            # Resuming: the pending activity signs the transaction it was
+            # submitted with - build nothing and reserve no nonce
+            unsigned_tx, reserved_nonce = request.unsigned_transaction or "", None
+        else:
+            # Build or use provided unsigned transaction
+            try:
+                unsigned_tx, reserved_nonce = await build_unsigned_transaction(request, wallet_address)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             
-            logger.info(f"Built unsigned tx: {unsigned_tx[:50]}...")
-        
-        if not unsigned_tx:
-            raise HTTPException(status_code=400, detail="Either unsigned_transaction or 'to' field required")
+            if not unsigned_tx:
+                raise HTTPException(status_code=400, detail="Either unsigned_transaction or 'to' field required")
         
-        from turnkey_service import sign_transaction
-        
-        signed_data = await sign_transaction(
-            sub_org_id=sub_org_id,
-            wallet_address=wallet_address,
-            unsigned_transaction=unsigned_tx,
-            transaction_type=request.transaction_type
-        )
+        try:
+            signed_data = await sign_transaction(
+                sub_org_id=sub_org_id,
+                wallet_address=wallet_address,
+                unsigned_transaction=unsigned_tx,
+                transaction_type=request.transaction_type,
+                activity_id=request.activityId
+            )
+        except TurnkeyActivityPendingError:
+            raise  # May still be signed - keep the nonce
+        except Exception:
+            await release_reserved_nonce(wallet_address, reserved_nonce)
+            raise
         
         logger.info(f"Signed transaction for user {user_data.get('id')}")
         
         return {
             "success": True,
             "signedTransaction": signed_data.get("signedTransaction"),
-            "from": wallet_address
+            "from": wallet_address,
+            "nonce": request.nonce if reserved_nonce is None else reserved_nonce
         }
         
     except HTTPException:
         raise
+    except TurnkeyActivityPendingError as e:
+        raise activity_pending_error(e)
     except Exception as e:
         logger.error(f"Error signing transaction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Batch signing limits
+SIGN_BATCH_MAX_ITEMS = 500
+SIGN_BATCH_PAYLOADS_PER_ACTIVITY = 100  # messages per SIGN_RAW_PAYLOADS activity
+SIGN_BATCH_MAX_CONCURRENCY = 16
+
+
+@api_router.post("/turnkey/sign-batch")
+async def sign_turnkey_batch(
+    request: SignBatchRequest,
+    authorization: str = Header(None)
+):
+    """
+    Sign many messages and/or transactions in one request.
+    
+    - Auth and wallet lookup happen once for the whole batch
+    - Messages are hashed locally and signed together, up to
+      SIGN_BATCH_PAYLOADS_PER_ACTIVITY per SIGN_RAW_PAYLOADS activity;
+      signatures still in signature_cache are reused
+    - Transactions fan out under a bounded semaphore (``concurrency``)
+    - Items fail independently; results come back in input order
+    
+    SECURITY: same as sign-message / sign-transaction - only the
+    authenticated user's wallet is used.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items to sign")
+    if len(request.items) > SIGN_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {SIGN_BATCH_MAX_ITEMS} items per batch")
+    for index, item in enumerate(request.items):
+        if (item.message is None) == (item.transaction is None):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Item {index}: exactly one of 'message' or 'transaction' required"
+            )
+    
+    try:
+        user_data, wallet = await get_user_and_wallet(authorization)
+        
+        if not wallet:
+            raise HTTPException(status_code=404, detail="No wallet found for user")
+        
+        sub_org_id = wallet.get("turnkey_sub_org_id")
+        wallet_address = wallet.get("wallet_address")
+        
+        if not sub_org_id or not wallet_address:
+            raise HTTPException(status_code=400, detail="Wallet not properly configured")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(request.items)
+        semaphore = asyncio.Semaphore(
+            min(max(1, request.concurrency or 1), SIGN_BATCH_MAX_CONCURRENCY)
+        )
+        
+        user_id = user_data.get("id")
+        message_hashes = {
+            i: personal_sign_hash(item.message)
+            for i, item in enumerate(request.items) if item.message is not None
+        }
+        
+        def signature_key(index: int) -> Tuple[str, str, str, str]:
+            return (sub_org_id, wallet_address, message_hashes[index], "HASH_FUNCTION_NO_OP")
+        
+        async def sign_message_chunk(indices: List[int]) -> None:
+            hashes = [message_hashes[i] for i in indices]
+            async with semaphore:
+                try:
+                    signatures = await sign_raw_payloads(
+                        sub_org_id=sub_org_id,
+                        wallet_address=wallet_address,
+                        payloads=hashes,
+                        encoding="PAYLOAD_ENCODING_HEXADECIMAL",
+                        hash_function="HASH_FUNCTION_NO_OP"  # Already hashed
+                    )
+                except Exception as e:
+                    for i in indices:
+                        results[i] = {"index": i, "success": False, "error": str(e)}
+                    return
+            for i, sig in zip(indices, signatures):
+                cache_signature(user_id, signature_key(i), sig)
+                results[i] = {"index": i, "success": True, **sig}
+        
+        async def sign_transaction_item(index: int, transaction: SignTransactionRequest,
+                                        reserved_nonce: Optional[int]) -> None:
+            try:
+                unsigned_tx, _ = await build_unsigned_transaction(transaction, wallet_address)
+                if not unsigned_tx:
+                    raise ValueError("Either unsigned_transaction or 'to' field required")
+                async with semaphore:
+                    signed_data = await sign_transaction(
+                        sub_org_id=sub_org_id,
+                        wallet_address=wallet_address,
+                        unsigned_transaction=unsigned_tx,
+                        transaction_type=transaction.transaction_type
+                    )
+            except Exception as e:
+                if not isinstance(e, TurnkeyActivityPendingError):
+                    await release_reserved_nonce(wallet_address, reserved_nonce)
+                settled.add(index)
+                results[index] = {"index": index, "success": False, "error": str(e)}
+                return
+            settled.add(index)
+            results[index] = {
+                "index": index,
+                "success": True,
+                "signedTransaction": signed_data.get("signedTransaction"),
+                "nonce": transaction.nonce
+            }
+        
+        message_indices = []
+        for i in message_hashes:
+            cached = get_cached_signature(user_id, signature_key(i)) if SIGNATURE_CACHE_TTL > 0 else None
+            if cached:
+                results[i] = {"index": i, "success": True, **cached}
+            else:
+                message_indices.append(i)
+        transaction_indices = [i for i, item in enumerate(request.items) if item.transaction is not None]
+        
+        # Reserve nonces for the whole batch at once, in item order
+        transactions: Dict[int, SignTransactionRequest] = {}
+        reserved_nonces: Dict[int, int] = {}
+        # Transactions whose nonce is used, kept for a pending activity or given back
+        settled: Set[int] = set()
+        needs_nonce = [
+            i for i in transaction_indices
+            if request.items[i].transaction.nonce is None
+            and request.items[i].transaction.to
+            and not request.items[i].transaction.unsigned_transaction
+        ]
+        if needs_nonce and nonce_manager.enabled:
+            nonces = await nonce_manager.reserve(wallet_address, len(needs_nonce))
+            reserved_nonces = dict(zip(needs_nonce, nonces))
+        try:
+            for i in transaction_indices:
+                transaction = request.items[i].transaction
+                if i in reserved_nonces:
+                    transaction = transaction.model_copy(update={"nonce": reserved_nonces[i]})
+                transactions[i] = transaction
+            
+            await asyncio.gather(
+                *(sign_message_chunk(message_indices[i:i + SIGN_BATCH_PAYLOADS_PER_ACTIVITY])
+                  for i in range(0, len(message_indices), SIGN_BATCH_PAYLOADS_PER_ACTIVITY)),
+                *(sign_transaction_item(i, transactions[i], reserved_nonces.get(i)) for i in transaction_indices)
+            )
+        except BaseException:
+            # Failed or cancelled (e.g. at the request deadline) before every item
+            # answered: a nonce left reserved would stall the wallet's later transactions
+            unsettled = [nonce for i, nonce in reserved_nonces.items() if i not in settled]
+            if unsettled:
+                await asyncio.shield(nonce_manager.release(wallet_address, unsettled))
+            raise
+        
+        succeeded = sum(1 for r in results if r["success"])
+        logger.info(
+            f"Signed batch for user {user_data.get('id')}: {succeeded}/{len(results)} succeeded "
+            f"({len(message_hashes)} messages, {len(message_hashes) - len(message_indices)} cached, "
+            f"{len(transaction_indices)} transactions)"
+        )
+        
+        return {
+            "success": succeeded == len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results,
+            "signer": wallet_address
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error signing batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/turnkey/release-nonces")
+async def release_turnkey_nonces(
+    request: ReleaseNoncesRequest,
+    authorization: str = Header(None)
+):
+    """
+    Return server-allocated nonces whose signed transactions were never
+    broadcast (e.g. broadcast failed), so the next transactions reuse them
+    instead of getting stuck behind the gap.
+    
+    SECURITY: only releases nonces of the authenticated user's wallet.
+    """
+    if not nonce_manager.enabled:
+        raise HTTPException(status_code=400, detail="Server-side nonce management is not enabled")
+    
+    user_data, wallet = await get_user_and_wallet(authorization)
+    
+    if not wallet or not wallet.get("wallet_address"):
+        raise HTTPException(status_code=404, detail="No wallet found for user")
+    
+    wallet_address = wallet["wallet_address"]
+    released = await nonce_manager.release(wallet_address, request.nonces)
+    logger.info(f"Released nonces {released} for user {user_data.get('id')}")
+    
+    return {
+        "success": True,
+        "released": released,
+        "nonces": nonce_manager.snapshot(wallet_address)
+    }
+
+
 @api_router.post("/crypto-indices")
 async def get_crypto_indices(request: IndicesRequest):
     """Get crypto indices with sophisticated market data"""
@@ -1841,7 +2843,9 @@ async def get_crypto_indices(request: IndicesRequest):
             cached = crypto_cache[cache_key]
             ttl = CACHE_TTL.get(time_period, 120)
             if time.time() - cached['timestamp'] < ttl:
+                record_cache("crypto_cache", hit=True)
                 return cached['data']
+        record_cache("crypto_cache", hit=False)
         
         # Fetch fresh data
         market_data = await fetch_coingecko_markets(COINGECKO_API_KEY)
@@ -1851,6 +2855,7 @@ async def get_crypto_indices(request: IndicesRequest):
                 return crypto_cache[cache_key]['data']
             raise HTTPException(status_code=503, detail="Unable to fetch market data")
         
+        await record_index_samples(market_data)
         indices = calculate_sophisticated_indices(market_data, time_period)
         
         crypto_cache[cache_key] = {'data': indices, 'timestamp': time.time()}
@@ -1876,6 +2881,25 @@ async def get_traditional_markets():
 
 app.include_router(api_router)
 
+
+async def close_shared_http_clients():
+    await close_http_clients()
+
+
+async def log_import_report():
+    try:
+        await asyncio.to_thread(write_startup_report)
+    except Exception as e:
+        logger.warning(f"[STARTUP] Import-time report failed: {e}")
+
+
+async def report_startup():
+    """Log how long importing this module took; optionally the -X importtime breakdown."""
+    logger.info(f"[STARTUP] server imported in {SERVER_IMPORT_SECONDS * 1000:.0f} ms")
+    if STARTUP_IMPORT_REPORT:
+        asyncio.create_task(log_import_report(), name="startup-import-report")
+
+
 # CORS Configuration for cross-origin requests
 # TVC (The Vault Club) calls these endpoints from a different domain
 ALLOWED_ORIGINS = [
@@ -1900,6 +2924,10 @@ def is_allowed_origin(origin: str) -> bool:
         return True
     return False
 
+# Innermost: duplicate requests wait under their own deadline, and the
+# deadline's 504 still passes through CORS, tracing and metrics
+app.add_middleware(IdempotencyMiddleware, resolve_user=resolve_token_user_id)
+app.add_middleware(DeadlineMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1908,3 +2936,8 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# All handler dependencies are imported above, at startup - not on first request
+SERVER_IMPORT_SECONDS = time.perf_counter() - SERVER_IMPORT_STARTED
@@ -0,0 +1,102 @@
+"""
+SPARKLINE INDEX SERIES
+======================
+
+Real 7-day paths of Anchor5, Vibe20 and Wave100 from the ``sparkline_in_7d``
+prices CoinGecko already returns for every coin (168 hourly points) - no
+extra upstream calls.
+
+- The constituents' sparklines form one points x N price matrix (oldest row
+  first); each index is one weight column, so all three series come out of
+  a single matrix product
+- Weights follow calculate_index_scores: a constituent's price counts
+  INDEX_PRICE_MULTIPLIERS[index] times (Anchor5 price-weighted sum, Vibe20
+  sum x2, Wave100 equal-weighted sum x100)
+- Constituents are today's: the series shows how the current basket moved,
+  not past rebalances
+- Points are hourly, the newest at the score computation time. Short
+  sparklines are padded with their earliest price, gaps forward-filled, and a
+  coin without one stays flat at its current price
+- Each sample carries the constituents' current summed 24h volume (there is
+  no volume history in the sparkline)
+"""
+
+import logging
+from typing import Dict, List, Any
+
+import numpy as np
+
+from index_history import Sample
+
+logger = logging.getLogger(__name__)
+
+SPARKLINE_POINTS = 168
+SPARKLINE_INTERVAL = 3600  # seconds between points
+
+# Index value = multiplier x sum of constituent prices
+INDEX_PRICE_MULTIPLIERS = {
+    'anchor5': 1.0,
+    'vibe20': 2.0,
+    'wave100': 100.0,
+}
+
+
+def _coin_key(coin: Dict[str, Any]) -> str:
+    return coin.get('id') or coin.get('symbol', '')
+
+
+def sparkline_matrix(coins: List[Dict[str, Any]], points: int = SPARKLINE_POINTS) -> np.ndarray:
+    """points x len(coins) hourly prices, oldest row first, no gaps."""
+    padded = []
+    for coin in coins:
+        prices = ((coin.get('sparkline_in_7d') or {}).get('price') or [])[-points:]
+        padded.append([None] * (points - len(prices)) + prices)
+    # One conversion for the whole matrix; None becomes NaN
+    matrix = np.array(padded, dtype=float).reshape(len(coins), points).T
+
+    matrix[~np.isfinite(matrix)] = np.nan
+    missing = np.isnan(matrix)
+    columns = np.arange(len(coins))
+
+    # Forward-fill: each cell takes the last valid row at or above it
+    rows = np.where(missing, 0, np.arange(points)[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    matrix = matrix[rows, columns]
+
+    # Leading gaps take the earliest price; empty columns the current price
+    first_valid = matrix[np.argmax(~missing, axis=0), columns]
+    current = np.array([float(c.get('current_price') or 0) for c in coins])
+    fill = np.where(np.isnan(first_valid), current, first_valid)
+    return np.where(np.isnan(matrix), fill, matrix)
+
+
+def index_series(scores: Dict[str, Dict], end_ts: float) -> Dict[str, List[Sample]]:
+    """
+    ``{index: [(ts, value, volume_24h), ...]}`` over the last 7 days for the
+    indices in ``scores`` (calculate_index_scores output), oldest first.
+    """
+    names = [name for name in INDEX_PRICE_MULTIPLIERS if scores.get(name)]
+    columns: Dict[str, int] = {}
+    coins: List[Dict[str, Any]] = []
+    for name in names:
+        for coin in scores[name]['coins']:
+            if _coin_key(coin) not in columns:
+                columns[_coin_key(coin)] = len(coins)
+                coins.append(coin)
+    if not coins:
+        return {}
+
+    weights = np.zeros((len(coins), len(names)))
+    for k, name in enumerate(names):
+        for coin in scores[name]['coins']:
+            weights[columns[_coin_key(coin)], k] += INDEX_PRICE_MULTIPLIERS[name]
+
+    series = sparkline_matrix(coins) @ weights
+    points = series.shape[0]
+    timestamps = [end_ts - (points - 1 - i) * SPARKLINE_INTERVAL for i in range(points)]
+
+    result = {}
+    for k, name in enumerate(names):
+        volume = float(sum(c.get('total_volume') or 0 for c in scores[name]['coins']))
+        result[name] = [(ts, value, volume) for ts, value in zip(timestamps, series[:, k].tolist())]
+    return result
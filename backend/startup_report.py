@@ -0,0 +1,139 @@
+"""
+STARTUP IMPORT-TIME REPORT
+==========================
+
+Captures the ``python -X importtime`` breakdown for importing ``server`` so
+cold-start regressions (a heavy dependency creeping into the import graph, a
+lazy import turning eager) show up in the logs instead of in first-request
+latency.
+
+The breakdown is collected in a separate interpreter (importtime only covers
+imports that haven't happened yet) and reports the total import time plus the
+most expensive modules by cumulative and by self time.
+
+Usage:
+    python3 startup_report.py [--top 25] [--json]
+
+From the server: set STARTUP_IMPORT_REPORT=true to log the report (and write
+it to STARTUP_REPORT_PATH) shortly after startup.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+STARTUP_IMPORT_REPORT = os.environ.get('STARTUP_IMPORT_REPORT', 'false').lower() == 'true'
+STARTUP_REPORT_PATH = os.environ.get('STARTUP_REPORT_PATH', str(ROOT_DIR / 'startup_report.json'))
+REPORT_TOP_MODULES = 25
+REPORT_TIMEOUT_SECONDS = 120
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    Parse ``-X importtime`` stderr lines:
+        import time: self [us] | cumulative | imported package
+        import time:       123 |        456 |   package.module
+    """
+    modules: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        entry = {
+            "module": stripped,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+            # importtime indents nested imports by two spaces per level
+            "depth": (len(name) - len(stripped) - 1) // 2,
+            "root": stripped
+        }
+        # Nested imports are printed before the top-level import that pulled them in
+        pending.append(entry)
+        if entry["depth"] == 0:
+            for nested in pending:
+                nested["root"] = stripped
+            modules.extend(pending)
+            pending = []
+    return modules
+
+
+def collect_import_report(target: str = "server", top: int = REPORT_TOP_MODULES) -> Dict[str, Any]:
+    """Import ``target`` in a fresh interpreter with -X importtime and summarise."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=str(ROOT_DIR),
+        capture_output=True,
+        text=True,
+        timeout=REPORT_TIMEOUT_SECONDS
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {target} failed: {completed.stderr.strip().splitlines()[-1:]}")
+
+    modules = [m for m in parse_importtime(completed.stderr) if m["root"] == target]
+    total_us = sum(m["cumulative_us"] for m in modules if m["depth"] == 0)
+    direct = [m for m in modules if m["depth"] == 1]
+    return {
+        "target": target,
+        "python": sys.version.split()[0],
+        "generated_at": time.time(),
+        "interpreter_wall_ms": round(wall_ms, 1),
+        "import_total_ms": round(total_us / 1000, 1),
+        "module_count": len(modules),
+        "top_cumulative": sorted(direct, key=lambda m: m["cumulative_us"], reverse=True)[:top],
+        "top_self": sorted(modules, key=lambda m: m["self_us"], reverse=True)[:top]
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"import {report['target']}: {report['import_total_ms']} ms across {report['module_count']} modules "
+        f"(interpreter wall {report['interpreter_wall_ms']} ms, python {report['python']})",
+        f"  direct imports of {report['target']} by cumulative time:"
+    ]
+    for m in report["top_cumulative"]:
+        lines.append(f"    {m['cumulative_us'] / 1000:9.1f} ms  {m['module']}")
+    lines.append("  modules by self time:")
+    for m in report["top_self"]:
+        lines.append(f"    {m['self_us'] / 1000:9.1f} ms  {m['module']}")
+    return "\n".join(lines)
+
+
+def write_startup_report(path: Optional[str] = None) -> Dict[str, Any]:
+    """Collect, log and persist the import report (blocking - run in a thread)."""
+    report = collect_import_report()
+    logger.info(f"[STARTUP] Import-time report\n{format_report(report)}")
+    path = path or STARTUP_REPORT_PATH
+    if path:
+        Path(path).write_text(json.dumps(report, indent=2))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time breakdown for server:app")
+    parser.add_argument("--target", default="server")
+    parser.add_argument("--top", type=int, default=REPORT_TOP_MODULES)
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = collect_import_report(args.target, args.top)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+TURNKEY SUB-ORG WARM POOL
+=========================
+
+Keeps N unassigned Turnkey sub-organizations pre-created so that signup
+doesn't wait on ACTIVITY_TYPE_CREATE_SUB_ORGANIZATION_V7 (our slowest
+Turnkey activity).
+
+- A background task refills the pool up to ``target_size`` whenever depth
+  falls to ``low_water_mark`` (checked after every claim and periodically)
+- Pool sub-orgs are created with only the Delegated Account as root user
+- A new user claims one atomically; the end-user root identity (email) is
+  attached at claim time via ``attach_fn``
+- If the pool is empty, callers fall back to creating a sub-org inline
+- A claimed sub-org stays reserved for its user until attached: if attaching
+  fails (CREATE_USERS may already have added the email) or the process dies
+  mid-attach, the user's next claim resumes the same sub-org instead of
+  creating a second one (SubOrgAttachPending tells the caller not to fall
+  back), and the refill loop retries claims left stale for
+  STALE_CLAIM_SECONDS. After ATTACH_MAX_ATTEMPTS the sub-org is marked failed
+  and logged for manual cleanup
+- Pool state is persisted in SQLite so pre-created sub-orgs survive restarts
+
+Metrics: pool depth, claims/misses, claim latency, refill counters.
+"""
+
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+POOL_STATUS_AVAILABLE = "available"
+POOL_STATUS_CLAIMED = "claimed"  # Taken by a user, end user not attached yet
+POOL_STATUS_ASSIGNED = "assigned"  # End user attached
+POOL_STATUS_FAILED = "failed"  # Attaching gave up
+
+ATTACH_MAX_ATTEMPTS = 5
+STALE_CLAIM_SECONDS = 10 * 60  # An attach not finished by then is retried by the refill loop
+REFILL_INTERVAL_SECONDS = 60
+REFILL_RETRY_SECONDS = 30
+CLAIM_LATENCY_SAMPLES = 1000
+
+# create_fn() -> (sub_org_id, delegated_user_id)
+CreateFn = Callable[[], Awaitable[Tuple[Optional[str], Optional[str]]]]
+# attach_fn(sub_org_id, delegated_user_id, supabase_user_id, user_email, user_name) -> success
+AttachFn = Callable[[str, str, str, str, str], Awaitable[bool]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sub_org_pool (
+    sub_org_id TEXT PRIMARY KEY,
+    delegated_user_id TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_at REAL,
+    user_email TEXT,
+    user_name TEXT,
+    attach_attempts INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# Columns added after the first release: (name, definition)
+_ADDED_COLUMNS = (
+    ("user_email", "TEXT"),
+    ("user_name", "TEXT"),
+    ("attach_attempts", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+# (sub_org_id, delegated_user_id, status)
+Taken = Tuple[str, Optional[str], str]
+
+
+class SubOrgAttachPending(Exception):
+    """Attaching the end user failed; the sub-org stays reserved for the next attempt."""
+
+    def __init__(self, sub_org_id: str):
+        super().__init__(f"Attaching the end user to pooled sub-org {sub_org_id} failed")
+        self.sub_org_id = sub_org_id
+
+
+def _percentile(samples, pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 2)
+
+
+class SubOrgPool:
+    """Warm pool of pre-created, unassigned Turnkey sub-orgs."""
+
+    def __init__(
+        self,
+        db_path: str,
+        target_size: int,
+        low_water_mark: int,
+        create_fn: CreateFn,
+        attach_fn: AttachFn
+    ):
+        self.db_path = db_path
+        self.target_size = max(0, target_size)
+        self.low_water_mark = min(max(0, low_water_mark), self.target_size)
+        self.create_fn = create_fn
+        self.attach_fn = attach_fn
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._refill_needed: Optional[asyncio.Event] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self._claim_latencies_ms: deque = deque(maxlen=CLAIM_LATENCY_SAMPLES)
+        self._counters = {
+            "claims": 0,
+            "misses": 0,
+            "attach_failures": 0,
+            "resumed": 0,
+            "abandoned": 0,
+            "created": 0,
+            "create_failures": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.target_size > 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # isolation_level=None: we issue BEGIN IMMEDIATE ourselves for claims
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._migrate(self._conn)
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sub_org_pool)")}
+        for name, definition in _ADDED_COLUMNS:
+            if name not in columns:
+                conn.execute(f"ALTER TABLE sub_org_pool ADD COLUMN {name} {definition}")
+        if "user_email" not in columns:
+            # Claims of the old schema were left "claimed" once attached
+            conn.execute(
+                "UPDATE sub_org_pool SET status = ? WHERE status = ?", (POOL_STATUS_ASSIGNED, POOL_STATUS_CLAIMED)
+            )
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def depth(self) -> int:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM sub_org_pool WHERE status = ?", (POOL_STATUS_AVAILABLE,)
+            ).fetchone()[0]
+
+    def _add(self, sub_org_id: str, delegated_user_id: Optional[str]) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO sub_org_pool (sub_org_id, delegated_user_id, status, created_at) VALUES (?, ?, ?, ?)",
+                (sub_org_id, delegated_user_id, POOL_STATUS_AVAILABLE, time.time())
+            )
+
+    def _take(self, supabase_user_id: str, user_email: str, user_name: str) -> Optional[Taken]:
+        """
+        The sub-org already reserved for this user (an earlier claim), else
+        atomically mark the oldest available one as claimed.
+        """
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT sub_org_id, delegated_user_id, status FROM sub_org_pool "
+                    "WHERE claimed_by = ? AND status IN (?, ?) ORDER BY claimed_at DESC LIMIT 1",
+                    (supabase_user_id, POOL_STATUS_CLAIMED, POOL_STATUS_ASSIGNED)
+                ).fetchone()
+                if row is None:
+                    row = conn.execute(
+                        "SELECT sub_org_id, delegated_user_id, status FROM sub_org_pool "
+                        "WHERE status = ? ORDER BY created_at LIMIT 1",
+                        (POOL_STATUS_AVAILABLE,)
+                    ).fetchone()
+                if row and row[2] != POOL_STATUS_ASSIGNED:
+                    conn.execute(
+                        "UPDATE sub_org_pool SET status = ?, claimed_by = ?, claimed_at = ?, user_email = ?, user_name = ? "
+                        "WHERE sub_org_id = ?",
+                        (POOL_STATUS_CLAIMED, supabase_user_id, time.time(), user_email, user_name, row[0])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return (row[0], row[1], row[2]) if row else None
+
+    def _mark_assigned(self, sub_org_id: str) -> None:
+        with self._lock:
+            self.conn.execute(
+                "UPDATE sub_org_pool SET status = ? WHERE sub_org_id = ?", (POOL_STATUS_ASSIGNED, sub_org_id)
+            )
+
+    def _record_attach_failure(self, sub_org_id: str) -> bool:
+        """Count a failed attach; returns True once the sub-org is given up on."""
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE sub_org_pool SET attach_attempts = attach_attempts + 1 WHERE sub_org_id = ?",
+                    (sub_org_id,)
+                )
+                conn.execute(
+                    "UPDATE sub_org_pool SET status = ? WHERE sub_org_id = ? AND attach_attempts >= ?",
+                    (POOL_STATUS_FAILED, sub_org_id, ATTACH_MAX_ATTEMPTS)
+                )
+                status = conn.execute(
+                    "SELECT status FROM sub_org_pool WHERE sub_org_id = ?", (sub_org_id,)
+                ).fetchone()[0]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return status == POOL_STATUS_FAILED
+
+    def _take_stale_claims(self) -> List[Tuple[str, Optional[str], str, str, str]]:
+        """Claims whose attach never finished, re-stamped so one sweep retries each."""
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT sub_org_id, delegated_user_id, claimed_by, user_email, user_name FROM sub_org_pool "
+                    "WHERE status = ? AND claimed_at < ? AND user_email IS NOT NULL",
+                    (POOL_STATUS_CLAIMED, now - STALE_CLAIM_SECONDS)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE sub_org_pool SET claimed_at = ? WHERE sub_org_id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [tuple(row) for row in rows]
+
+    # ------------------------------------------------------------------
+    # Claim
+    # ------------------------------------------------------------------
+
+    async def claim(self, supabase_user_id: str, user_email: str, user_name: str) -> Optional[str]:
+        """
+        Assign a pre-created sub-org to a user and attach their email identity.
+
+        Returns: sub_org_id, or None if the pool is empty/disabled (caller
+        should create a sub-org inline).
+        Raises: SubOrgAttachPending if attaching failed - the caller must not
+        create another sub-org; the user's next claim retries this one.
+        """
+        if not self.enabled:
+            return None
+
+        started = time.perf_counter()
+        taken = await asyncio.to_thread(self._take, supabase_user_id, user_email, user_name)
+        self._signal_refill()
+
+        if not taken:
+            self._counters["misses"] += 1
+            logger.warning(f"[SUB-ORG-POOL] Pool empty - user {supabase_user_id} falls back to inline creation")
+            return None
+
+        sub_org_id, delegated_user_id, status = taken
+        if status != POOL_STATUS_AVAILABLE:
+            self._counters["resumed"] += 1
+            logger.info(f"[SUB-ORG-POOL] Resuming sub-org {sub_org_id} claimed earlier by user {supabase_user_id}")
+            if status == POOL_STATUS_ASSIGNED:
+                return sub_org_id
+
+        if not await self._attach(sub_org_id, delegated_user_id, supabase_user_id, user_email, user_name):
+            raise SubOrgAttachPending(sub_org_id)
+
+        self._counters["claims"] += 1
+        self._claim_latencies_ms.append((time.perf_counter() - started) * 1000)
+        logger.info(f"[SUB-ORG-POOL] Assigned sub-org {sub_org_id} to user {supabase_user_id}")
+        return sub_org_id
+
+    async def _attach(
+        self,
+        sub_org_id: str,
+        delegated_user_id: Optional[str],
+        supabase_user_id: str,
+        user_email: str,
+        user_name: str
+    ) -> bool:
+        try:
+            attached = await self.attach_fn(sub_org_id, delegated_user_id, supabase_user_id, user_email, user_name)
+        except Exception as e:
+            logger.error(f"[SUB-ORG-POOL] Attach error for sub-org {sub_org_id}: {e}")
+            attached = False
+        if attached:
+            await asyncio.to_thread(self._mark_assigned, sub_org_id)
+            return True
+
+        self._counters["attach_failures"] += 1
+        if await asyncio.to_thread(self._record_attach_failure, sub_org_id):
+            self._counters["abandoned"] += 1
+            logger.error(
+                f"[SUB-ORG-POOL] Gave up attaching user {supabase_user_id} to sub-org {sub_org_id} after "
+                f"{ATTACH_MAX_ATTEMPTS} attempts - it may hold their email and needs manual cleanup"
+            )
+        return False
+
+    async def _sweep(self) -> None:
+        """Retry attaches left unfinished by a failure or a crash."""
+        for sub_org_id, delegated_user_id, supabase_user_id, user_email, user_name in \
+                await asyncio.to_thread(self._take_stale_claims):
+            if await self._attach(sub_org_id, delegated_user_id, supabase_user_id, user_email, user_name):
+                logger.info(f"[SUB-ORG-POOL] Sweep attached user {supabase_user_id} to sub-org {sub_org_id}")
+
+    # ------------------------------------------------------------------
+    # Refill
+    # ------------------------------------------------------------------
+
+    def _signal_refill(self) -> None:
+        if self._refill_needed is not None:
+            self._refill_needed.set()
+
+    async def start(self) -> None:
+        """Start the background refill task (no-op when the pool is disabled)."""
+        if not self.enabled or self._refill_task:
+            return
+        self._refill_needed = asyncio.Event()
+        self._refill_needed.set()
+        self._refill_task = asyncio.create_task(self._refill_loop(), name="sub-org-pool-refill")
+        logger.info(f"[SUB-ORG-POOL] Started (target={self.target_size}, low_water={self.low_water_mark})")
+
+    async def stop(self) -> None:
+        if self._refill_task:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+            self._refill_task = None
+
+    async def _refill_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._refill_needed.wait(), timeout=REFILL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_needed.clear()
+
+            try:
+                await self._sweep()
+            except Exception as e:
+                logger.error(f"[SUB-ORG-POOL] Sweep error: {e}")
+            depth = await asyncio.to_thread(self.depth)
+            if depth > self.low_water_mark:
+                continue
+            await self._refill(depth)
+
+    async def _refill(self, depth: int) -> None:
+        while depth < self.target_size:
+            try:
+                sub_org_id, delegated_user_id = await self.create_fn()
+            except Exception as e:
+                logger.error(f"[SUB-ORG-POOL] Refill error: {e}")
+                sub_org_id, delegated_user_id = None, None
+            if not sub_org_id:
+                self._counters["create_failures"] += 1
+                await asyncio.sleep(REFILL_RETRY_SECONDS)
+                return
+            await asyncio.to_thread(self._add, sub_org_id, delegated_user_id)
+            self._counters["created"] += 1
+            depth += 1
+        logger.info(f"[SUB-ORG-POOL] Refilled to depth {depth}")
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        latencies = list(self._claim_latencies_ms)
+        return {
+            "enabled": self.enabled,
+            "depth": self.depth() if self.enabled else 0,
+            "target_size": self.target_size,
+            "low_water_mark": self.low_water_mark,
+            **self._counters,
+            "claim_latency_ms": {
+                "count": len(latencies),
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                "p50": _percentile(latencies, 0.50),
+                "p95": _percentile(latencies, 0.95)
+            }
+        }
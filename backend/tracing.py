@@ -0,0 +1,370 @@
+"""
+REQUEST TRACING
+===============
+
+Lightweight in-process tracing: which stage of a request (Supabase auth, the
+user_wallets probe, sub-org creation, API-key stamping, the Turnkey HTTP
+call...) the time went to.
+
+- Trace ids and the current span live in contextvars, so they follow the
+  request through awaits, asyncio tasks and asyncio.to_thread workers
+  (the synchronous Turnkey client runs in threads)
+- span("name") / @traced("name") around upstream calls and CPU stages;
+  stage("name") also records metrics.stage_seconds
+- TracingMiddleware opens the root span per HTTP request, honours an incoming
+  W3C ``traceparent`` header and adds ``Server-Timing`` (per span name) and
+  ``X-Trace-Id`` response headers
+- Optional file exporter: TRACE_EXPORT_PATH=/path/traces.jsonl writes one
+  OTLP/JSON ExportTraceServiceRequest per line (the format the OpenTelemetry
+  collector's otlpjsonfile receiver reads), from a background thread
+
+Spans opened outside a request (warm-up, background jobs) start their own trace.
+"""
+
+import os
+import re
+import time
+import json
+import queue
+import atexit
+import random
+import inspect
+import logging
+import functools
+import threading
+from contextvars import ContextVar
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator, Callable
+
+from metrics import stage_seconds
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH', '')
+TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'sequence-theory-api')
+TRACE_EXPORT_QUEUE_SIZE = 10000
+SERVER_TIMING_MAX_ENTRIES = 20
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_NON_TOKEN = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "closed")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        self.closed = False
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start_ns", "end_ns", "_started", "duration", "status", "status_message")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self._started = time.perf_counter()
+        self.duration = 0.0
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def end(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+        self.trace.spans.append(self)
+        # Spans that outlive their request (background tasks) export on their own
+        if self.trace.closed:
+            _export([self])
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def start_span(
+    name: str,
+    kind: int = SPAN_KIND_INTERNAL,
+    trace_id: Optional[str] = None,
+    parent_id: Optional[str] = None,
+    **attributes: Any
+) -> Span:
+    """Start a span under the current one (or a new trace); the caller ends it."""
+    parent = _current_span.get()
+    if parent is not None and trace_id is None:
+        return Span(parent.trace, name, parent.span_id, kind, attributes)
+    return Span(_Trace(trace_id or _new_id(128)), name, parent_id, kind, attributes)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+    """Time the enclosed block as a child of the current span."""
+    current = start_span(name, kind, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+        if current.parent_id is None and not current.trace.closed:
+            finish_trace(current.trace)
+
+
+def traced(name: str, kind: int = SPAN_KIND_INTERNAL) -> Callable:
+    """Decorator form of span() for sync and async functions."""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stage(name: str) -> Callable:
+    """@traced for CPU stages that also records stage_seconds{stage}."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as current:
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    stage_seconds.observe(time.perf_counter() - current._started, stage=name)
+        return wrapper
+    return decorator
+
+
+def finish_trace(trace: _Trace) -> None:
+    trace.closed = True
+    _export(list(trace.spans))
+
+
+# ============================================================================
+# Server-Timing / HTTP middleware
+# ============================================================================
+
+def server_timing(spans: List[Span]) -> str:
+    """Server-Timing value: total duration per span name, slowest first."""
+    totals: Dict[str, List[float]] = {}
+    for s in spans:
+        entry = totals.setdefault(_NON_TOKEN.sub(".", s.name), [0.0, 0])
+        entry[0] += s.duration
+        entry[1] += 1
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:SERVER_TIMING_MAX_ENTRIES]
+    return ", ".join(
+        f"{name};dur={total * 1000:.1f}" + (f';desc="x{count}"' if count > 1 else "")
+        for name, (total, count) in ranked
+    )
+
+
+class TracingMiddleware:
+    """ASGI middleware: root span per request plus Server-Timing / X-Trace-Id headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = parent_id = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                match = _TRACEPARENT.match(value.decode("latin-1").strip())
+                if match:
+                    trace_id, parent_id = match.groups()
+                break
+
+        root = start_span(
+            f"{scope['method']} {scope['path']}",
+            SPAN_KIND_SERVER,
+            trace_id=trace_id,
+            parent_id=parent_id,
+            **{"http.method": scope["method"], "http.target": scope["path"]}
+        )
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status = STATUS_ERROR
+                elapsed = time.perf_counter() - root._started
+                timing = server_timing(root.trace.spans)
+                total = f"total;dur={elapsed * 1000:.1f}"
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", (f"{total}, {timing}" if timing else total).encode("latin-1")))
+                headers.append((b"x-trace-id", root.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException as e:
+            root.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            root.end()
+            finish_trace(root.trace)
+
+
+# ============================================================================
+# OTLP/JSON file exporter
+# ============================================================================
+
+_export_queue: Optional[queue.Queue] = None
+_export_thread: Optional[threading.Thread] = None
+_export_stats = {"exported": 0, "dropped": 0}
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    """ExportTraceServiceRequest (OTLP/JSON encoding) for ``spans``."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "tracing"},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": s.kind,
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [_attribute(k, v) for k, v in s.attributes.items()],
+                        "status": {"code": s.status, **({"message": s.status_message} if s.status_message else {})}
+                    }
+                    for s in spans
+                ]
+            }]
+        }]
+    }
+
+
+def _export_worker(path: str, spans_queue: queue.Queue) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        while True:
+            spans = spans_queue.get()
+            if spans is None:
+                break
+            try:
+                f.write(json.dumps(to_otlp(spans), separators=(",", ":")) + "\n")
+                if spans_queue.empty():
+                    f.flush()
+                _export_stats["exported"] += len(spans)
+            except Exception as e:
+                logger.warning(f"[TRACING] Export failed: {e}")
+
+
+def _export(spans: List[Span]) -> None:
+    if _export_queue is None or not spans:
+        return
+    try:
+        _export_queue.put_nowait(spans)
+    except queue.Full:
+        _export_stats["dropped"] += len(spans)
+
+
+def start_file_exporter(path: Optional[str] = None) -> bool:
+    """Start writing finished traces to ``path`` (default TRACE_EXPORT_PATH)."""
+    global _export_queue, _export_thread
+    path = path or TRACE_EXPORT_PATH
+    if not path or _export_thread is not None:
+        return False
+    _export_queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+    _export_thread = threading.Thread(
+        target=_export_worker, args=(path, _export_queue), name="trace-exporter", daemon=True
+    )
+    _export_thread.start()
+    atexit.register(stop_file_exporter)
+    logger.info(f"[TRACING] Exporting OTLP/JSON traces to {path}")
+    return True
+
+
+def stop_file_exporter() -> None:
+    """Flush queued traces and stop the exporter thread."""
+    global _export_queue, _export_thread
+    if _export_thread is None:
+        return
+    _export_queue.put(None)
+    _export_thread.join(timeout=5)
+    _export_queue = None
+    _export_thread = None
+
+
+def tracing_stats() -> Dict[str, Any]:
+    return {
+        "exporting": _export_thread is not None,
+        "queue_depth": _export_queue.qsize() if _export_queue else 0,
+        **_export_stats
+    }
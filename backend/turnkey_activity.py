@@ -0,0 +1,184 @@
+"""
+TURNKEY ACTIVITY AWAITER
+========================
+
+Turnkey submit endpoints can return before an activity has finished
+(ACTIVITY_STATUS_CREATED / ACTIVITY_STATUS_PENDING / consensus needed), with
+no ``result`` yet. Treating that as a failure makes clients retry, which
+submits duplicate activities.
+
+submit_activity() / resume_activity() instead:
+- run the (synchronous) Turnkey client call in a worker thread
+- poll get_activity with exponential backoff until the activity is
+  completed, failed, or the deadline passes - without blocking the loop
+- raise TurnkeyActivityPendingError carrying the activity id when the
+  deadline passes, so the caller can resume the SAME activity later
+- stop polling early enough to answer within the request's own deadline
+  (deadlines.py), and turn a poll refused by the Turnkey circuit breaker or
+  the request budget into TurnkeyActivityPendingError too: the activity was
+  submitted and must be resumed, not submitted again
+- hand the activity id to ``on_submitted`` from the worker thread as soon as
+  the submit returns, so callers can journal it (creation_journal.py) even
+  when the request awaiting the activity is cancelled meanwhile - the thread
+  runs on regardless
+- record submit-to-completion latency per activity type
+  (``turnkey_activity_seconds{type}`` in metrics.py)
+"""
+
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Callable
+
+from turnkey_client import TurnkeyClient
+from resilience import UpstreamUnavailableError
+from deadlines import DeadlineExceeded, remaining
+from metrics import turnkey_activity_seconds
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_STATUS_COMPLETED = "ACTIVITY_STATUS_COMPLETED"
+ACTIVITY_FAILED_STATUSES = {"ACTIVITY_STATUS_FAILED", "ACTIVITY_STATUS_REJECTED"}
+
+ACTIVITY_POLL_INITIAL_DELAY = 0.25  # seconds
+ACTIVITY_POLL_MAX_DELAY = 2.0
+ACTIVITY_DEADLINE_SECONDS = 30.0
+# Reserved from the request budget for answering ACTIVITY_PENDING in time
+ACTIVITY_DEADLINE_MARGIN = 1.0
+
+
+class TurnkeyActivityError(Exception):
+    """A Turnkey activity failed or was rejected."""
+
+    def __init__(self, message: str, activity_id: Optional[str] = None, status: Optional[str] = None):
+        super().__init__(message)
+        self.activity_id = activity_id
+        self.status = status
+
+
+class TurnkeyActivityPendingError(TurnkeyActivityError):
+    """The activity did not finish before the deadline. Resume it by id."""
+
+
+async def _poll_until_done(
+    client: TurnkeyClient,
+    activity: Dict[str, Any],
+    organization_id: str,
+    deadline: float
+) -> Dict[str, Any]:
+    delay = ACTIVITY_POLL_INITIAL_DELAY
+    while True:
+        activity_id = activity.get("id", "")
+        status = activity.get("status", "")
+
+        if status == ACTIVITY_STATUS_COMPLETED:
+            return activity
+        if status in ACTIVITY_FAILED_STATUSES:
+            raise TurnkeyActivityError(
+                f"Turnkey activity {activity_id} ended with {status}",
+                activity_id=activity_id,
+                status=status
+            )
+        # Older responses may omit status but carry the result
+        if not status and activity.get("result"):
+            return activity
+        if not activity_id:
+            raise TurnkeyActivityError(f"Turnkey activity has no id (status: {status or 'unknown'})")
+
+        time_left = deadline - time.monotonic()
+        if time_left <= 0:
+            raise TurnkeyActivityPendingError(
+                f"Turnkey activity {activity_id} still {status or 'pending'} at deadline",
+                activity_id=activity_id,
+                status=status
+            )
+
+        await asyncio.sleep(min(delay, time_left))
+        delay = min(delay * 2, ACTIVITY_POLL_MAX_DELAY)
+
+        try:
+            response = await asyncio.to_thread(
+                client.get_activity,
+                {"organizationId": organization_id, "activityId": activity_id}
+            )
+        except (UpstreamUnavailableError, DeadlineExceeded) as e:
+            raise TurnkeyActivityPendingError(
+                f"Turnkey activity {activity_id} submitted but polling refused: {e}",
+                activity_id=activity_id,
+                status=status
+            )
+        activity = response.get("activity", {})
+
+
+def _activity_deadline(started: float, deadline_seconds: float) -> float:
+    """Polling deadline: ``deadline_seconds`` after submit, or earlier if the request budget ends first."""
+    deadline = started + deadline_seconds
+    budget = remaining()
+    if budget is not None:
+        deadline = min(deadline, time.monotonic() + budget - ACTIVITY_DEADLINE_MARGIN)
+    return deadline
+
+
+async def submit_activity(
+    client: TurnkeyClient,
+    submit: Callable[[Dict[str, Any]], Dict[str, Any]],
+    body: Dict[str, Any],
+    deadline_seconds: float = ACTIVITY_DEADLINE_SECONDS,
+    on_submitted: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """
+    Submit an activity and wait for it to complete.
+
+    Args:
+        client: Client used for get_activity polling
+        submit: Bound client method, e.g. ``client.sign_raw_payload``
+        body: Activity body (``type`` and ``organizationId`` are required)
+        on_submitted: Called with the activity id in the worker thread right
+            after Turnkey accepted the activity
+
+    Returns: the completed activity dict (with ``result``)
+    """
+    def submit_and_record() -> Dict[str, Any]:
+        response = submit(body)
+        activity_id = response.get("activity", {}).get("id")
+        if on_submitted is not None and activity_id:
+            try:
+                on_submitted(activity_id)
+            except Exception as e:
+                logger.error(f"[TURNKEY] Failed to record submitted activity {activity_id}: {e}")
+        return response
+
+    started = time.monotonic()
+    with span(f"turnkey.activity.{body['type']}") as current:
+        response = await asyncio.to_thread(submit_and_record)
+        activity = await _poll_until_done(
+            client,
+            response.get("activity", {}),
+            body["organizationId"],
+            _activity_deadline(started, deadline_seconds)
+        )
+        current.set_attribute("turnkey.activity_id", activity.get("id", ""))
+    turnkey_activity_seconds.observe(time.monotonic() - started, type=body["type"])
+    return activity
+
+
+async def resume_activity(
+    client: TurnkeyClient,
+    organization_id: str,
+    activity_id: str,
+    deadline_seconds: float = ACTIVITY_DEADLINE_SECONDS
+) -> Dict[str, Any]:
+    """Wait for a previously submitted activity instead of submitting a new one."""
+    started = time.monotonic()
+    with span("turnkey.activity.resume", **{"turnkey.activity_id": activity_id}):
+        response = await asyncio.to_thread(
+            client.get_activity,
+            {"organizationId": organization_id, "activityId": activity_id}
+        )
+        return await _poll_until_done(
+            client,
+            response.get("activity", {}),
+            organization_id,
+            _activity_deadline(started, deadline_seconds)
+        )
@@ -10,15 +10,24 @@ This enables deployment without the turnkey-http, turnkey-api-key-stamper, or
 turnkey-sdk-types packages which are not available on PyPI.
 """
 
+import os
 import json
+import time
 import requests
 from base64 import urlsafe_b64encode
 from dataclasses import dataclass
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, Any
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.backends import default_backend
 
+from metrics import upstream_request_seconds, upstream_requests_in_flight
+from tracing import span, SPAN_KIND_CLIENT
+from resilience import get_guard, is_failure_status
+from deadlines import DeadlineExceeded, check_deadline, budget_timeout, submit_timeout, deadline_exhausted
+
 
 # ============================================================================
 # API Key Stamper (replaces turnkey-api-key-stamper)
@@ -38,8 +47,13 @@ class TStamp:
     stamp_header_value: str
 
 
-def _sign_with_api_key(public_key: str, private_key: str, content: str) -> str:
-    """Sign content with API key and validate public key matches."""
+@lru_cache(maxsize=8)
+def load_api_key(public_key: str, private_key: str) -> ec.EllipticCurvePrivateKey:
+    """
+    Derive the P-256 key from hex and validate it against the public key.
+    Cached: derivation is the expensive part of stamping, and the API key
+    never changes while the process runs.
+    """
     # Derive private key from hex
     ec_private_key = ec.derive_private_key(
         int(private_key, 16), ec.SECP256R1(), default_backend()
@@ -60,6 +74,13 @@ def _sign_with_api_key(public_key: str, private_key: str, content: str) -> str:
             f"got {derived_public_key}"
         )
 
+    return ec_private_key
+
+
+def _sign_with_api_key(public_key: str, private_key: str, content: str) -> str:
+    """Sign content with API key and validate public key matches."""
+    ec_private_key = load_api_key(public_key, private_key)
+
     # Sign the content
     signature = ec_private_key.sign(content.encode(), ec.ECDSA(hashes.SHA256()))
     return signature.hex()
@@ -100,6 +121,23 @@ class ApiKeyStamper:
 # Turnkey HTTP Client (replaces turnkey-http)
 # ============================================================================
 
+# One pooled session for every TurnkeyClient: connections (and their TLS
+# sessions) are reused across requests and worker threads
+TURNKEY_POOL_SIZE = 32
+
+# Without a timeout a hung connection holds its worker thread forever.
+# Reads cover one submit/query round trip - activities are polled separately.
+# Inside a request both are capped by the remaining request budget - for
+# activity submits plus the route's cancel grace (deadlines.submit_timeout),
+# so a submitted creation returns its activity id rather than being abandoned.
+TURNKEY_CONNECT_TIMEOUT = float(os.environ.get('TURNKEY_CONNECT_TIMEOUT', '5'))  # seconds
+TURNKEY_READ_TIMEOUT = float(os.environ.get('TURNKEY_READ_TIMEOUT', '30'))  # seconds
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=TURNKEY_POOL_SIZE))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=TURNKEY_POOL_SIZE))
+
+
 class TurnkeyClient:
     """HTTP client for the Turnkey API with request stamping."""
 
@@ -127,16 +165,22 @@ class TurnkeyClient:
         
         # Add stamp if stamper is configured
         if self.stamper:
-            stamp = self.stamper.stamp(body_str)
+            with span("turnkey.stamp"):
+                stamp = self.stamper.stamp(body_str)
             headers[stamp.stamp_header_name] = stamp.stamp_header_value
         
         # Make request
-        if method.upper() == "POST":
-            response = requests.post(url, data=body_str, headers=headers)
-        elif method.upper() == "GET":
-            response = requests.get(url, headers=headers)
-        else:
+        if method.upper() not in ("POST", "GET"):
             raise ValueError(f"Unsupported HTTP method: {method}")
+        check_deadline("turnkey")
+        try:
+            with get_guard("turnkey").call() as call:
+                response = self._send(method.upper(), url, body_str, headers, path.replace("/public/v1/", "", 1))
+                call.failed = is_failure_status(response.status_code)
+        except requests.Timeout as e:
+            if deadline_exhausted():
+                raise DeadlineExceeded("turnkey") from e
+            raise
         
         # Parse response
         try:
@@ -149,6 +193,32 @@ class TurnkeyClient:
         
         return result
 
+    def _send(self, method: str, url: str, body_str: str, headers: Dict[str, str], operation: str) -> requests.Response:
+        """One HTTP round trip, timed as a metric and a client span."""
+        status = "error"
+        cap = submit_timeout if operation.startswith("submit/") else budget_timeout
+        timeout = (cap(TURNKEY_CONNECT_TIMEOUT), cap(TURNKEY_READ_TIMEOUT))
+        started = time.perf_counter()
+        upstream_requests_in_flight.inc(upstream="turnkey")
+        try:
+            with span(f"turnkey.{operation}", SPAN_KIND_CLIENT, **{"http.method": method}) as current:
+                if method == "POST":
+                    response = _session.post(url, data=body_str, headers=headers, timeout=timeout)
+                else:
+                    response = _session.get(url, headers=headers, timeout=timeout)
+                status = str(response.status_code)
+                current.set_attribute("http.status_code", response.status_code)
+            return response
+        finally:
+            upstream_requests_in_flight.dec(upstream="turnkey")
+            upstream_request_seconds.observe(
+                time.perf_counter() - started,
+                upstream="turnkey",
+                operation=operation,
+                method=method,
+                status=status
+            )
+
     def get_whoami(self) -> Dict[str, Any]:
         """Get the current user/organization info."""
         body = {
@@ -156,6 +226,14 @@ class TurnkeyClient:
         }
         return self._make_request("POST", "/public/v1/query/whoami", body)
 
+    def get_activity(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Get an activity (status + result) by id."""
+        return self._make_request("POST", "/public/v1/query/get_activity", body)
+
+    def list_users(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """List the users of an organization/sub-organization."""
+        return self._make_request("POST", "/public/v1/query/list_users", body)
+
     def create_sub_organization(self, body: Dict[str, Any]) -> Dict[str, Any]:
         """Create a sub-organization."""
         return self._make_request("POST", "/public/v1/submit/create_sub_organization", body)
@@ -176,6 +254,10 @@ class TurnkeyClient:
         """Sign a raw payload."""
         return self._make_request("POST", "/public/v1/submit/sign_raw_payload", body)
 
+    def sign_raw_payloads(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Sign multiple raw payloads in one activity."""
+        return self._make_request("POST", "/public/v1/submit/sign_raw_payloads", body)
+
     def sign_transaction(self, body: Dict[str, Any]) -> Dict[str, Any]:
         """Sign a transaction."""
         return self._make_request("POST", "/public/v1/submit/sign_transaction", body)
@@ -188,6 +270,14 @@ class TurnkeyClient:
         """Create a wallet in an organization/sub-organization."""
         return self._make_request("POST", "/public/v1/submit/create_wallet", body)
 
+    def create_users(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Create users in an organization/sub-organization."""
+        return self._make_request("POST", "/public/v1/submit/create_users", body)
+
+    def update_root_quorum(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Set the root quorum (root users + threshold) of an organization."""
+        return self._make_request("POST", "/public/v1/submit/update_root_quorum", body)
+
 
 # ============================================================================
 # Type definitions (replaces turnkey-sdk-types)
@@ -29,10 +29,11 @@ only standard PyPI packages (cryptography, requests).
 """
 
 import os
-import json
+import asyncio
 import logging
-import httpx
-from typing import Optional, Dict, Any, Tuple
+import traceback
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple, List, Callable
 from datetime import datetime
 
 # Use local Turnkey client implementation (no external SDK required)
@@ -41,11 +42,23 @@ from turnkey_client import (
     ApiKeyStamper,
     ApiKeyStamperConfig,
 )
+from sub_org_pool import SubOrgPool
+from log_pipeline import JsonMessage, should_log
+from http_clients import shared_supabase_client
+from tracing import span, traced, current_trace_id
+from resilience import UpstreamUnavailableError
+from deadlines import DeadlineExceeded
+from turnkey_activity import (
+    submit_activity,
+    resume_activity,
+    TurnkeyActivityError,
+    TurnkeyActivityPendingError,
+)
 
 logger = logging.getLogger(__name__)
 
 # Turnkey Configuration
-TURNKEY_API_BASE_URL = "https://api.turnkey.com"
+TURNKEY_API_BASE_URL = os.environ.get('TURNKEY_API_BASE_URL', 'https://api.turnkey.com')
 TURNKEY_ORGANIZATION_ID = os.environ.get('TURNKEY_ORGANIZATION_ID', '')
 TURNKEY_API_PUBLIC_KEY = os.environ.get('TURNKEY_API_PUBLIC_KEY', '')
 TURNKEY_API_PRIVATE_KEY = os.environ.get('TURNKEY_API_PRIVATE_KEY', '')
@@ -54,6 +67,11 @@ TURNKEY_API_PRIVATE_KEY = os.environ.get('TURNKEY_API_PRIVATE_KEY', '')
 SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
 SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
 
+# Sub-org warm pool (disabled unless SUB_ORG_POOL_SIZE > 0)
+SUB_ORG_POOL_SIZE = int(os.environ.get('SUB_ORG_POOL_SIZE', '0'))
+SUB_ORG_POOL_LOW_WATER = int(os.environ.get('SUB_ORG_POOL_LOW_WATER', str(SUB_ORG_POOL_SIZE // 3)))
+SUB_ORG_POOL_DB_PATH = os.environ.get('SUB_ORG_POOL_DB_PATH', str(Path(__file__).parent / 'sub_org_pool.db'))
+
 
 def get_timestamp_ms() -> str:
     """Get current timestamp in milliseconds as string"""
@@ -64,15 +82,21 @@ def structured_log(event: str, **kwargs) -> None:
     """
     Emit a structured JSON log line for debugging Turnkey flows.
     All Turnkey operations MUST use this for traceability.
+    
+    The line is JSON-encoded on the log listener thread, not here, and
+    high-volume events may be sampled (see log_pipeline).
     """
+    if not should_log(event):
+        return
     log_entry = {
         "event": event,
         "timestamp": datetime.utcnow().isoformat(),
         "turnkey_parent_org_id": TURNKEY_ORGANIZATION_ID,
         "api_key_public": TURNKEY_API_PUBLIC_KEY[:20] + "..." if TURNKEY_API_PUBLIC_KEY else "NOT_SET",
+        "trace_id": current_trace_id(),
         **kwargs
     }
-    logger.info(f"[TURNKEY_STRUCTURED] {json.dumps(log_entry)}")
+    logger.info("[TURNKEY_STRUCTURED] %s", JsonMessage(log_entry))
 
 
 def get_turnkey_client(org_id: Optional[str] = None) -> TurnkeyClient:
@@ -106,10 +130,11 @@ def get_turnkey_client(org_id: Optional[str] = None) -> TurnkeyClient:
 async def verify_turnkey_config() -> bool:
     """
     Verify Turnkey configuration is valid by making a whoami request.
+    Also derives the API key and opens a pooled connection to Turnkey.
     """
     try:
         client = get_turnkey_client()
-        response = client.get_whoami()
+        response = await asyncio.to_thread(client.get_whoami)
         structured_log(
             "turnkey_config_verified",
             org_name=response.get('organizationName', 'unknown'),
@@ -122,6 +147,7 @@ async def verify_turnkey_config() -> bool:
         return False
 
 
+@traced("turnkey_service.create_otp_policy_for_sub_org")
 async def create_otp_policy_for_sub_org(sub_org_id: str, supabase_user_id: str) -> Tuple[bool, Optional[str]]:
     """
     Create OTP policy inside a sub-org to allow email OTP authentication.
@@ -193,11 +219,11 @@ async def create_otp_policy_for_sub_org(sub_org_id: str, supabase_user_id: str)
             error=str(e),
             error_type=type(e).__name__
         )
-        import traceback
         logger.error(f"[TURNKEY] Traceback: {traceback.format_exc()}")
         return False, None
 
 
+@traced("turnkey_service.init_otp_for_user")
 async def init_otp_for_user(
     supabase_user_id: str,
     user_email: str,
@@ -293,6 +319,9 @@ async def init_otp_for_user(
         else:
             return False, None, f"No otpId in response. Activity: {activity_id}, Status: {activity_status}"
         
+    except (UpstreamUnavailableError, DeadlineExceeded):
+        # Surface as 503 + Retry-After / 504 instead of a generic failure
+        raise
     except Exception as e:
         error_str = str(e)
         structured_log(
@@ -305,6 +334,7 @@ async def init_otp_for_user(
         return False, None, error_str
 
 
+@traced("turnkey_service.verify_otp_for_user")
 async def verify_otp_for_user(
     supabase_user_id: str,
     otp_id: str,
@@ -401,6 +431,9 @@ async def verify_otp_for_user(
         else:
             return False, f"Verification failed. Activity: {activity_id}, Status: {activity_status}"
         
+    except (UpstreamUnavailableError, DeadlineExceeded):
+        # Surface as 503 + Retry-After / 504 instead of a generic failure
+        raise
     except Exception as e:
         error_str = str(e)
         structured_log(
@@ -413,6 +446,7 @@ async def verify_otp_for_user(
         return False, error_str
 
 
+@traced("turnkey_service.create_sub_organization_with_wallet")
 async def create_sub_organization_with_wallet(
     supabase_user_id: str,
     user_email: str,
@@ -583,11 +617,11 @@ async def create_sub_organization_with_wallet(
             error=str(e),
             error_type=type(e).__name__
         )
-        import traceback
         logger.error(f"[TURNKEY] Traceback: {traceback.format_exc()}")
         raise
 
 
+@traced("turnkey_service.ensure_user_has_sub_org")
 async def ensure_user_has_sub_org(
     supabase_user_id: str,
     user_email: str,
@@ -732,39 +766,48 @@ async def ensure_user_has_sub_org(
     return sub_org_id, wallet_id, eth_address
 
 
+@traced("turnkey_service.sign_raw_payload")
 async def sign_raw_payload(
     sub_org_id: str,
     wallet_address: str,
     payload: str,
     encoding: str = "PAYLOAD_ENCODING_HEXADECIMAL",
-    hash_function: str = "HASH_FUNCTION_KECCAK256"
+    hash_function: str = "HASH_FUNCTION_KECCAK256",
+    activity_id: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Sign a raw payload with the user's wallet."""
+    """
+    Sign a raw payload with the user's wallet.
+    
+    Pass activity_id (from a previous ACTIVITY_PENDING error) to wait for that
+    activity instead of submitting a new one.
+    """
     structured_log(
         "sign_raw_payload_start",
         sub_org_id=sub_org_id,
         wallet_address=wallet_address,
-        activity_type="ACTIVITY_TYPE_SIGN_RAW_PAYLOAD_V2"
+        activity_type="ACTIVITY_TYPE_SIGN_RAW_PAYLOAD_V2",
+        resume_activity_id=activity_id
     )
     
     try:
         client = get_turnkey_client(sub_org_id)
         
-        body = {
-            "type": "ACTIVITY_TYPE_SIGN_RAW_PAYLOAD_V2",
-            "timestampMs": get_timestamp_ms(),
-            "organizationId": sub_org_id,
-            "parameters": {
-                "signWith": wallet_address,
-                "payload": payload,
-                "encoding": encoding,
-                "hashFunction": hash_function
+        if activity_id:
+            activity = await resume_activity(client, sub_org_id, activity_id)
+        else:
+            body = {
+                "type": "ACTIVITY_TYPE_SIGN_RAW_PAYLOAD_V2",
+                "timestampMs": get_timestamp_ms(),
+                "organizationId": sub_org_id,
+                "parameters": {
+                    "signWith": wallet_address,
+                    "payload": payload,
+                    "encoding": encoding,
+                    "hashFunction": hash_function
+                }
             }
-        }
-        
-        result = client.sign_raw_payload(body)
+            activity = await submit_activity(client, client.sign_raw_payload, body)
         
-        activity = result.get("activity", {})
         activity_result = activity.get("result", {})
         sign_result = activity_result.get("signRawPayloadResult", {})
         
@@ -787,42 +830,123 @@ async def sign_raw_payload(
         structured_log(
             "sign_raw_payload_error",
             sub_org_id=sub_org_id,
+            activity_id=getattr(e, "activity_id", None),
             error=str(e)
         )
         raise
 
 
-async def sign_transaction(
+@traced("turnkey_service.sign_raw_payloads")
+async def sign_raw_payloads(
     sub_org_id: str,
     wallet_address: str,
-    unsigned_transaction: str,
-    transaction_type: str = "TRANSACTION_TYPE_ETHEREUM"
-) -> Dict[str, Any]:
-    """Sign an EVM transaction."""
+    payloads: List[str],
+    encoding: str = "PAYLOAD_ENCODING_HEXADECIMAL",
+    hash_function: str = "HASH_FUNCTION_KECCAK256"
+) -> List[Dict[str, Any]]:
+    """
+    Sign many raw payloads with the user's wallet in ONE activity
+    (ACTIVITY_TYPE_SIGN_RAW_PAYLOADS). All payloads share encoding and hash function.
+    
+    Returns: one {r, s, v, signature} per payload, in input order
+    """
     structured_log(
-        "sign_transaction_start",
+        "sign_raw_payloads_start",
         sub_org_id=sub_org_id,
         wallet_address=wallet_address,
-        activity_type="ACTIVITY_TYPE_SIGN_TRANSACTION_V2"
+        payload_count=len(payloads),
+        activity_type="ACTIVITY_TYPE_SIGN_RAW_PAYLOADS"
     )
     
     try:
         client = get_turnkey_client(sub_org_id)
         
         body = {
-            "type": "ACTIVITY_TYPE_SIGN_TRANSACTION_V2",
+            "type": "ACTIVITY_TYPE_SIGN_RAW_PAYLOADS",
             "timestampMs": get_timestamp_ms(),
             "organizationId": sub_org_id,
             "parameters": {
                 "signWith": wallet_address,
-                "unsignedTransaction": unsigned_transaction,
-                "type": transaction_type
+                "payloads": payloads,
+                "encoding": encoding,
+                "hashFunction": hash_function
             }
         }
+        activity = await submit_activity(client, client.sign_raw_payloads, body)
         
-        result = client.sign_transaction(body)
+        activity_result = activity.get("result", {})
+        signatures = activity_result.get("signRawPayloadsResult", {}).get("signatures", [])
+        
+        if len(signatures) != len(payloads):
+            raise Exception(f"Expected {len(payloads)} signatures, got {len(signatures)}")
+        
+        structured_log(
+            "sign_raw_payloads_success",
+            sub_org_id=sub_org_id,
+            activity_id=activity.get("id", ""),
+            payload_count=len(payloads)
+        )
+        
+        return [
+            {
+                "r": sig.get("r", ""),
+                "s": sig.get("s", ""),
+                "v": sig.get("v", ""),
+                "signature": f"0x{sig.get('r', '')}{sig.get('s', '')}{sig.get('v', '')}"
+            }
+            for sig in signatures
+        ]
+        
+    except Exception as e:
+        structured_log(
+            "sign_raw_payloads_error",
+            sub_org_id=sub_org_id,
+            activity_id=getattr(e, "activity_id", None),
+            error=str(e)
+        )
+        raise
+
+
+@traced("turnkey_service.sign_transaction")
+async def sign_transaction(
+    sub_org_id: str,
+    wallet_address: str,
+    unsigned_transaction: str,
+    transaction_type: str = "TRANSACTION_TYPE_ETHEREUM",
+    activity_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Sign an EVM transaction.
+    
+    Pass activity_id (from a previous ACTIVITY_PENDING error) to wait for that
+    activity instead of submitting a new one.
+    """
+    structured_log(
+        "sign_transaction_start",
+        sub_org_id=sub_org_id,
+        wallet_address=wallet_address,
+        activity_type="ACTIVITY_TYPE_SIGN_TRANSACTION_V2",
+        resume_activity_id=activity_id
+    )
+    
+    try:
+        client = get_turnkey_client(sub_org_id)
+        
+        if activity_id:
+            activity = await resume_activity(client, sub_org_id, activity_id)
+        else:
+            body = {
+                "type": "ACTIVITY_TYPE_SIGN_TRANSACTION_V2",
+                "timestampMs": get_timestamp_ms(),
+                "organizationId": sub_org_id,
+                "parameters": {
+                    "signWith": wallet_address,
+                    "unsignedTransaction": unsigned_transaction,
+                    "type": transaction_type
+                }
+            }
+            activity = await submit_activity(client, client.sign_transaction, body)
         
-        activity = result.get("activity", {})
         activity_result = activity.get("result", {})
         sign_result = activity_result.get("signTransactionResult", {})
         
@@ -841,16 +965,20 @@ async def sign_transaction(
         structured_log(
             "sign_transaction_error",
             sub_org_id=sub_org_id,
+            activity_id=getattr(e, "activity_id", None),
             error=str(e)
         )
         raise
 
 
 
+@traced("turnkey_service.ensure_user_sub_org_for_otp")
 async def ensure_user_sub_org_for_otp(
     supabase_user_id: str,
     user_email: str,
-    user_name: str
+    user_name: str,
+    activity_id: Optional[str] = None,
+    on_submitted: Optional[Callable[[str], None]] = None
 ) -> Optional[str]:
     """
     Ensure user has a sub-org for OTP. Create WITHOUT wallet if needed.
@@ -861,7 +989,13 @@ async def ensure_user_sub_org_for_otp(
     - Wallet is created ONLY after OTP verification
     - Parent API key has full control of sub-org
     
+    Pass activity_id (a CREATE_SUB_ORGANIZATION submitted earlier for this
+    user) to wait for that activity instead of claiming or creating another
+    sub-org; on_submitted receives the id of a newly submitted one.
+    
     Returns: sub_org_id or None if failed
+    Raises: SubOrgAttachPending if a pooled sub-org was claimed but attaching
+    the user failed (the next call resumes it - never create another)
     """
     structured_log(
         "ensure_sub_org_for_otp_start",
@@ -870,7 +1004,7 @@ async def ensure_user_sub_org_for_otp(
     )
     
     # Check if user already has a sub-org in DB (check user_wallets table)
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with shared_supabase_client() as client:
         # Check user_wallets table for existing sub-org
         wallet_response = await client.get(
             f"{SUPABASE_URL}/rest/v1/user_wallets",
@@ -896,7 +1030,21 @@ async def ensure_user_sub_org_for_otp(
                     )
                     return existing_sub_org
         
-        # No existing sub-org - create one WITHOUT wallet
+        # No existing sub-org - claim a pre-created one from the warm pool
+        # (unless one is already being created for this user)
+        sub_org_id = None
+        if not activity_id:
+            with span("sub_org_pool.claim"):
+                sub_org_id = await sub_org_pool.claim(supabase_user_id, user_email, user_name)
+        if sub_org_id:
+            structured_log(
+                "ensure_sub_org_for_otp_claimed_from_pool",
+                supabase_user_id=supabase_user_id,
+                sub_org_id=sub_org_id
+            )
+            return sub_org_id
+        
+        # Pool empty/disabled - create one WITHOUT wallet
         structured_log(
             "ensure_sub_org_for_otp_creating_new",
             supabase_user_id=supabase_user_id,
@@ -906,7 +1054,9 @@ async def ensure_user_sub_org_for_otp(
         sub_org_id = await create_sub_org_without_wallet(
             supabase_user_id=supabase_user_id,
             user_email=user_email,
-            user_name=user_name
+            user_name=user_name,
+            activity_id=activity_id,
+            on_submitted=on_submitted
         )
         
         if not sub_org_id:
@@ -930,10 +1080,54 @@ async def ensure_user_sub_org_for_otp(
         return sub_org_id
 
 
+def _sub_org_id_from_activity(supabase_user_id: str, activity: Dict[str, Any]) -> Optional[str]:
+    """Sub-org id from a completed CREATE_SUB_ORGANIZATION activity."""
+    activity_result = activity.get("result", {})
+    
+    sub_org_result = (
+        activity_result.get("createSubOrganizationResultV7") or
+        activity_result.get("createSubOrganizationResult") or
+        {}
+    )
+    
+    sub_org_id = sub_org_result.get("subOrganizationId", "")
+    root_user_ids = sub_org_result.get("rootUserIds", [])
+    
+    if not sub_org_id:
+        structured_log(
+            "create_sub_org_without_wallet_no_result",
+            supabase_user_id=supabase_user_id,
+            activity_result=str(activity_result)
+        )
+        return None
+    
+    structured_log(
+        "create_sub_org_without_wallet_created",
+        supabase_user_id=supabase_user_id,
+        sub_org_id=sub_org_id,
+        root_user_ids=root_user_ids
+    )
+    
+    # NOTE: OTP is ENABLED by default in sub-orgs, no explicit policy needed
+    # See: https://docs.turnkey.com/authentication/email#for-sub-organizations
+    
+    structured_log(
+        "create_sub_org_without_wallet_complete",
+        supabase_user_id=supabase_user_id,
+        sub_org_id=sub_org_id,
+        note="OTP enabled by default in sub-orgs"
+    )
+    
+    return sub_org_id
+
+
+@traced("turnkey_service.create_sub_org_without_wallet")
 async def create_sub_org_without_wallet(
     supabase_user_id: str,
     user_email: str,
-    user_name: str
+    user_name: str,
+    activity_id: Optional[str] = None,
+    on_submitted: Optional[Callable[[str], None]] = None
 ) -> Optional[str]:
     """
     Create a Turnkey sub-organization WITHOUT a wallet.
@@ -945,17 +1139,27 @@ async def create_sub_org_without_wallet(
     - NO wallet created here (wallet comes after OTP verification)
     - OTP policy NOT needed because sub-orgs have OTP enabled by default
     
-    Returns: sub_org_id or None if failed
+    Pass activity_id (from a previous ACTIVITY_PENDING) to wait for that
+    activity instead of submitting a new one. on_submitted receives the id
+    of a newly submitted activity.
+    
+    Returns: sub_org_id or None if failed. Raises TurnkeyActivityError when
+    the activity failed or was rejected.
     """
     structured_log(
         "create_sub_org_without_wallet_start",
         supabase_user_id=supabase_user_id,
-        user_email=user_email
+        user_email=user_email,
+        resume_activity_id=activity_id
     )
     
     try:
         turnkey_client = get_turnkey_client()
         
+        if activity_id:
+            activity = await resume_activity(turnkey_client, TURNKEY_ORGANIZATION_ID, activity_id)
+            return _sub_org_id_from_activity(supabase_user_id, activity)
+        
         # Create sub-org WITHOUT wallet
         # Per Turnkey delegated-access-backend docs:
         # - Delegated Account: API key for backend control
@@ -1004,79 +1208,280 @@ async def create_sub_org_without_wallet(
             note="Creating sub-org WITHOUT wallet with Delegated Account + End User"
         )
         
-        result = turnkey_client.create_sub_organization(body)
+        activity = await submit_activity(
+            turnkey_client,
+            turnkey_client.create_sub_organization,
+            body,
+            on_submitted=on_submitted
+        )
+        return _sub_org_id_from_activity(supabase_user_id, activity)
         
-        activity = result.get("activity", {})
-        activity_result = activity.get("result", {})
+    except TurnkeyActivityPendingError as e:
+        # Surface the activity id - the sub-org may still be created
+        structured_log(
+            "create_sub_org_without_wallet_pending",
+            supabase_user_id=supabase_user_id,
+            activity_id=e.activity_id
+        )
+        raise
+    except (UpstreamUnavailableError, DeadlineExceeded):
+        raise
+    except TurnkeyActivityError as e:
+        # Failed or rejected for good - no sub-org will come of it
+        structured_log(
+            "create_sub_org_without_wallet_failed",
+            supabase_user_id=supabase_user_id,
+            activity_id=e.activity_id,
+            status=e.status
+        )
+        raise
+    except Exception as e:
+        structured_log(
+            "create_sub_org_without_wallet_error",
+            supabase_user_id=supabase_user_id,
+            activity_id=getattr(e, "activity_id", None),
+            error=str(e)
+        )
+        logger.error(f"[TURNKEY] Traceback: {traceback.format_exc()}")
+        return None
+
+
+@traced("turnkey_service.create_pool_sub_org")
+async def create_pool_sub_org() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Create an UNASSIGNED sub-organization for the warm pool.
+    
+    Only the Delegated Account is a root user; the end user's email identity
+    is attached when the sub-org is claimed (attach_end_user_to_sub_org).
+    
+    Returns: (sub_org_id, delegated_user_id) or (None, None) if failed
+    """
+    structured_log("create_pool_sub_org_start")
+    
+    try:
+        turnkey_client = get_turnkey_client()
         
+        body = {
+            "type": "ACTIVITY_TYPE_CREATE_SUB_ORGANIZATION_V7",
+            "timestampMs": get_timestamp_ms(),
+            "organizationId": TURNKEY_ORGANIZATION_ID,
+            "parameters": {
+                "subOrganizationName": f"ST Wallet: pool-{get_timestamp_ms()}",
+                "rootUsers": [
+                    # Delegated Account only - end user attached at claim time
+                    {
+                        "userName": "Delegated Account",
+                        "apiKeys": [
+                            {
+                                "apiKeyName": "Delegated API Key",
+                                "publicKey": TURNKEY_API_PUBLIC_KEY,
+                                "curveType": "API_KEY_CURVE_P256"
+                            }
+                        ],
+                        "authenticators": [],
+                        "oauthProviders": []
+                    }
+                ],
+                "rootQuorumThreshold": 1
+            }
+        }
+        
+        activity = await submit_activity(turnkey_client, turnkey_client.create_sub_organization, body)
+        activity_result = activity.get("result", {})
         sub_org_result = (
             activity_result.get("createSubOrganizationResultV7") or
             activity_result.get("createSubOrganizationResult") or
             {}
         )
-        
         sub_org_id = sub_org_result.get("subOrganizationId", "")
         root_user_ids = sub_org_result.get("rootUserIds", [])
         
         if not sub_org_id:
-            structured_log(
-                "create_sub_org_without_wallet_no_result",
-                supabase_user_id=supabase_user_id,
-                activity_result=str(activity_result)
-            )
-            return None
+            structured_log("create_pool_sub_org_no_result", activity_result=str(activity_result))
+            return None, None
+        
+        structured_log("create_pool_sub_org_created", sub_org_id=sub_org_id, root_user_ids=root_user_ids)
+        return sub_org_id, root_user_ids[0] if root_user_ids else None
         
+    except Exception as e:
+        structured_log("create_pool_sub_org_error", error=str(e))
+        return None, None
+
+
+async def _create_end_user(
+    turnkey_client: TurnkeyClient,
+    sub_org_id: str,
+    supabase_user_id: str,
+    user_email: str,
+    user_name: str
+) -> List[str]:
+    """CREATE_USERS_V3 for the end user's email identity; returns the new user ids."""
+    create_body = {
+        "type": "ACTIVITY_TYPE_CREATE_USERS_V3",
+        "timestampMs": get_timestamp_ms(),
+        "organizationId": sub_org_id,
+        "parameters": {
+            "users": [{
+                "userName": user_name or user_email.split('@')[0],
+                "userEmail": user_email,  # CRITICAL: Email for OTP
+                "apiKeys": [],
+                "authenticators": [],
+                "oauthProviders": [],
+                "userTags": []
+            }]
+        }
+    }
+    activity = await submit_activity(turnkey_client, turnkey_client.create_users, create_body)
+    activity_result = activity.get("result", {})
+    user_ids = (
+        activity_result.get("createUsersResult") or {}
+    ).get("userIds", [])
+    if not user_ids:
         structured_log(
-            "create_sub_org_without_wallet_created",
+            "attach_end_user_no_result",
             supabase_user_id=supabase_user_id,
             sub_org_id=sub_org_id,
-            root_user_ids=root_user_ids
+            activity_result=str(activity_result)
         )
+    return user_ids
+
+
+@traced("turnkey_service.attach_end_user_to_sub_org")
+async def attach_end_user_to_sub_org(
+    sub_org_id: str,
+    delegated_user_id: Optional[str],
+    supabase_user_id: str,
+    user_email: str,
+    user_name: str
+) -> bool:
+    """
+    Attach the end user (email identity for OTP) to a pooled sub-org as a
+    root user, giving it the same shape as create_sub_org_without_wallet.
+    
+    Safe to retry: an end user created by an earlier, failed attempt is
+    reused instead of being created again.
+    
+    Returns: True on success
+    """
+    structured_log(
+        "attach_end_user_start",
+        supabase_user_id=supabase_user_id,
+        sub_org_id=sub_org_id
+    )
+    
+    try:
+        turnkey_client = get_turnkey_client()
         
-        # NOTE: OTP is ENABLED by default in sub-orgs, no explicit policy needed
-        # See: https://docs.turnkey.com/authentication/email#for-sub-organizations
+        existing = await asyncio.to_thread(turnkey_client.list_users, {"organizationId": sub_org_id})
+        user_ids = [
+            user.get("userId") for user in existing.get("users", [])
+            if user.get("userEmail") == user_email and user.get("userId")
+        ]
+        if not user_ids:
+            user_ids = await _create_end_user(turnkey_client, sub_org_id, supabase_user_id, user_email, user_name)
+        if not user_ids:
+            return False
+        
+        # Make the end user a root user alongside the Delegated Account
+        quorum_body = {
+            "type": "ACTIVITY_TYPE_UPDATE_ROOT_QUORUM",
+            "timestampMs": get_timestamp_ms(),
+            "organizationId": sub_org_id,
+            "parameters": {
+                "threshold": 1,
+                "userIds": [uid for uid in [delegated_user_id, user_ids[0]] if uid]
+            }
+        }
+        await submit_activity(turnkey_client, turnkey_client.update_root_quorum, quorum_body)
         
         structured_log(
-            "create_sub_org_without_wallet_complete",
+            "attach_end_user_complete",
             supabase_user_id=supabase_user_id,
             sub_org_id=sub_org_id,
-            note="OTP enabled by default in sub-orgs"
+            end_user_id=user_ids[0]
         )
-        
-        return sub_org_id
+        return True
         
     except Exception as e:
         structured_log(
-            "create_sub_org_without_wallet_error",
+            "attach_end_user_error",
             supabase_user_id=supabase_user_id,
+            sub_org_id=sub_org_id,
             error=str(e)
         )
-        import traceback
-        logger.error(f"[TURNKEY] Traceback: {traceback.format_exc()}")
-        return None
+        return False
+
+
+sub_org_pool = SubOrgPool(
+    db_path=SUB_ORG_POOL_DB_PATH,
+    target_size=SUB_ORG_POOL_SIZE if TURNKEY_ORGANIZATION_ID else 0,
+    low_water_mark=SUB_ORG_POOL_LOW_WATER,
+    create_fn=create_pool_sub_org,
+    attach_fn=attach_end_user_to_sub_org
+)
 
 
+def _wallet_from_activity(sub_org_id: str, activity: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """(wallet_id, eth_address) from a completed CREATE_WALLET activity."""
+    activity_result = activity.get("result", {})
+    wallet_result = activity_result.get("createWalletResult", {})
+    
+    wallet_id = wallet_result.get("walletId", "")
+    addresses = wallet_result.get("addresses", [])
+    eth_address = addresses[0] if addresses else ""
+    
+    if not wallet_id or not eth_address:
+        structured_log(
+            "create_wallet_in_sub_org_no_result",
+            sub_org_id=sub_org_id,
+            activity_result=str(activity_result)
+        )
+        return None, None
+    
+    structured_log(
+        "create_wallet_in_sub_org_success",
+        sub_org_id=sub_org_id,
+        wallet_id=wallet_id,
+        eth_address=eth_address
+    )
+    
+    return wallet_id, eth_address
+
+
+@traced("turnkey_service.create_wallet_in_sub_org")
 async def create_wallet_in_sub_org(
     sub_org_id: str,
-    user_email: str
+    user_email: str,
+    activity_id: Optional[str] = None,
+    on_submitted: Optional[Callable[[str], None]] = None
 ) -> Tuple[Optional[str], Optional[str]]:
     """
     Create a wallet in an existing sub-organization.
     
     Called ONLY after OTP verification is complete.
     
-    Returns: (wallet_id, eth_address) or (None, None) if failed
+    Pass activity_id (from a previous ACTIVITY_PENDING) to wait for that
+    activity instead of submitting a new one. on_submitted receives the id
+    of a newly submitted activity.
+    
+    Returns: (wallet_id, eth_address) or (None, None) if failed. Raises
+    TurnkeyActivityError when the activity failed or was rejected.
     """
     structured_log(
         "create_wallet_in_sub_org_start",
         sub_org_id=sub_org_id,
-        user_email=user_email
+        user_email=user_email,
+        resume_activity_id=activity_id
     )
     
     try:
         # Use parent org client to create wallet in sub-org
         turnkey_client = get_turnkey_client()
         
+        if activity_id:
+            activity = await resume_activity(turnkey_client, sub_org_id, activity_id)
+            return _wallet_from_activity(sub_org_id, activity)
+        
         body = {
             "type": "ACTIVITY_TYPE_CREATE_WALLET",
             "timestampMs": get_timestamp_ms(),
@@ -1097,39 +1502,39 @@ async def create_wallet_in_sub_org(
             sub_org_id=sub_org_id
         )
         
-        result = turnkey_client.create_wallet(body)
-        
-        activity = result.get("activity", {})
-        activity_result = activity.get("result", {})
-        wallet_result = activity_result.get("createWalletResult", {})
-        
-        wallet_id = wallet_result.get("walletId", "")
-        addresses = wallet_result.get("addresses", [])
-        eth_address = addresses[0] if addresses else ""
-        
-        if not wallet_id or not eth_address:
-            structured_log(
-                "create_wallet_in_sub_org_no_result",
-                sub_org_id=sub_org_id,
-                activity_result=str(activity_result)
-            )
-            return None, None
+        activity = await submit_activity(
+            turnkey_client,
+            turnkey_client.create_wallet,
+            body,
+            on_submitted=on_submitted
+        )
+        return _wallet_from_activity(sub_org_id, activity)
         
+    except TurnkeyActivityPendingError as e:
+        # Surface the activity id - the wallet may still be created
         structured_log(
-            "create_wallet_in_sub_org_success",
+            "create_wallet_in_sub_org_pending",
             sub_org_id=sub_org_id,
-            wallet_id=wallet_id,
-            eth_address=eth_address
+            activity_id=e.activity_id
         )
-        
-        return wallet_id, eth_address
-        
+        raise
+    except (UpstreamUnavailableError, DeadlineExceeded):
+        raise
+    except TurnkeyActivityError as e:
+        # Failed or rejected for good - no wallet will come of it
+        structured_log(
+            "create_wallet_in_sub_org_failed",
+            sub_org_id=sub_org_id,
+            activity_id=e.activity_id,
+            status=e.status
+        )
+        raise
     except Exception as e:
         structured_log(
             "create_wallet_in_sub_org_error",
             sub_org_id=sub_org_id,
+            activity_id=getattr(e, "activity_id", None),
             error=str(e)
         )
-        import traceback
         logger.error(f"[TURNKEY] Traceback: {traceback.format_exc()}")
         return None, None
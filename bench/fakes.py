@@ -0,0 +1,294 @@
+"""
+Local Upstream Fakes
+====================
+
+One ASGI app standing in for every upstream server.py talks to, so the API can
+be load-tested offline:
+
+- Supabase Auth:  GET /auth/v1/user, GET /auth/v1/health
+- PostgREST:      /rest/v1/profiles, /rest/v1/user_wallets (GET/POST/PATCH, in memory)
+- Turnkey:        POST /public/v1/submit/*, /public/v1/query/{whoami,get_activity,list_users}
+- CoinGecko:      GET /api/v3/coins/markets (synthetic, with 7d sparklines)
+
+Bearer tokens are ``bench-<user_id>``; any such token is a valid user, and
+users named ``seeded-*`` already have a wallet (for signing flows).
+
+Latency and errors are injected per upstream (``Fault``): every response is
+delayed by ``latency_ms`` +/- ``jitter_ms`` and fails with ``error_status``
+with probability ``error_rate``.
+
+Run standalone (bench/load.py does this in a subprocess, so the fakes don't
+compete with the server for the GIL):
+    python3 bench/fakes.py --port 8900 --fault turnkey=latency_ms=80,jitter_ms=30
+Request counts per upstream: GET /__bench/stats
+"""
+
+import json
+import random
+import argparse
+import asyncio
+import hashlib
+import itertools
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+UPSTREAMS = ("supabase", "turnkey", "coingecko")
+TOKEN_PREFIX = "bench-"
+SEEDED_PREFIX = "seeded-"
+ORGANIZATION_ID = "bench-parent-org"
+
+
+@dataclass
+class Fault:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    @classmethod
+    def parse(cls, spec: str) -> "Fault":
+        """'latency_ms=40,jitter_ms=10,error_rate=0.01' -> Fault"""
+        fault = cls()
+        for item in filter(None, spec.split(",")):
+            name, _, value = item.partition("=")
+            current = getattr(fault, name.strip())
+            setattr(fault, name.strip(), type(current)(value))
+        return fault
+
+
+def synthetic_markets(count: int = 250, seed: int = 7, points: int = 168) -> List[Dict[str, Any]]:
+    """
+    CoinGecko /coins/markets-shaped rows: a few stablecoins, prices and
+    volumes spread over several orders of magnitude, hourly 7d sparklines.
+    """
+    rng = random.Random(seed)
+    stable = {3: "usdt", 6: "usdc", 11: "dai"}
+    rows = []
+    for i in range(count):
+        symbol = stable.get(i, f"c{i:03d}")
+        price = 1.0 if symbol in stable.values() else round(60000 / (1 + i) ** 1.6 * rng.uniform(0.8, 1.2), 6)
+        sparkline = [price]
+        for _ in range(points - 1):
+            sparkline.append(sparkline[-1] * (1 + rng.gauss(0, 0.004 if symbol in stable.values() else 0.012)))
+        sparkline.reverse()
+        rows.append({
+            "id": f"coin-{symbol}",
+            "symbol": symbol,
+            "name": symbol.upper(),
+            "image": "",
+            "current_price": price,
+            "market_cap": int(1e12 / (1 + i) ** 1.3),
+            "market_cap_rank": i + 1,
+            "total_volume": int(rng.lognormvariate(18, 1.5)),
+            "price_change_percentage_1h_in_currency": rng.gauss(0, 0.5),
+            "price_change_percentage_24h": rng.gauss(0, 4),
+            "price_change_percentage_24h_in_currency": rng.gauss(0, 4),
+            "price_change_percentage_7d_in_currency": rng.gauss(0, 9),
+            "price_change_percentage_30d_in_currency": rng.gauss(0, 18),
+            "sparkline_in_7d": {"price": sparkline},
+        })
+    return rows
+
+
+class UpstreamFakes:
+    """State + fault settings behind the fake app."""
+
+    def __init__(self, markets: Optional[List[Dict[str, Any]]] = None):
+        self.faults: Dict[str, Fault] = {name: Fault() for name in UPSTREAMS}
+        self.markets = markets if markets is not None else synthetic_markets()
+        # Serialised once - the fake shouldn't spend the CPU the server is measured on
+        self._markets_body = json.dumps(self.markets).encode()
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        self.wallets: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, int] = {name: 0 for name in UPSTREAMS}
+        self._ids = itertools.count(1)
+        self.app = self._build_app()
+
+    def seed_wallet(self, user_id: str) -> Dict[str, Any]:
+        """Give ``user_id`` a complete wallet row (for signing scenarios)."""
+        digest = hashlib.sha256(user_id.encode()).hexdigest()
+        row = {
+            "user_id": user_id,
+            "wallet_address": "0x" + digest[:40],
+            "turnkey_sub_org_id": f"sub-org-{digest[:12]}",
+            "turnkey_wallet_id": f"wallet-{digest[:12]}",
+            "provider": "turnkey",
+            "network": "polygon",
+        }
+        self.wallets[user_id] = row
+        return row
+
+    async def _inject(self, upstream: str) -> Optional[JSONResponse]:
+        self.requests[upstream] += 1
+        fault = self.faults[upstream]
+        delay = fault.latency_ms + (random.uniform(-fault.jitter_ms, fault.jitter_ms) if fault.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if fault.error_rate and random.random() < fault.error_rate:
+            return JSONResponse(status_code=fault.error_status, content={"message": "injected fault"})
+        return None
+
+    # ------------------------------------------------------------------ turnkey
+
+    def _activity(self, activity_type: str, result: Dict[str, Any], organization_id: str) -> Dict[str, Any]:
+        return {
+            "activity": {
+                "id": f"act-{next(self._ids)}",
+                "organizationId": organization_id,
+                "status": "ACTIVITY_STATUS_COMPLETED",
+                "type": activity_type,
+                "result": result,
+            }
+        }
+
+    def _turnkey_result(self, operation: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        params = body.get("parameters", {})
+        n = next(self._ids)
+        if operation == "create_sub_organization":
+            return {"createSubOrganizationResultV7": {"subOrganizationId": f"sub-org-{n}", "rootUserIds": [f"user-{n}"]}}
+        if operation == "create_wallet":
+            return {"createWalletResult": {"walletId": f"wallet-{n}", "addresses": ["0x" + f"{n:040x}"]}}
+        if operation == "init_otp_auth":
+            return {"initOtpAuthResultV2": {"otpId": f"otp-{n}"}}
+        if operation == "verify_otp":
+            return {"verifyOtpResult": {"verificationToken": f"token-{n}"}}
+        if operation == "sign_raw_payload":
+            return {"signRawPayloadResult": _signature(params.get("payload", ""))}
+        if operation == "sign_raw_payloads":
+            return {"signRawPayloadsResult": {"signatures": [_signature(p) for p in params.get("payloads", [])]}}
+        if operation == "sign_transaction":
+            return {"signTransactionResult": {"signedTransaction": params.get("unsignedTransaction", "") + "c0"}}
+        if operation == "create_policy":
+            return {"createPolicyResult": {"policyId": f"policy-{n}"}}
+        if operation == "create_users":
+            return {"createUsersResult": {"userIds": [f"user-{n}"]}}
+        return {}
+
+    # ------------------------------------------------------------------ app
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+
+        @app.get("/auth/v1/health")
+        async def auth_health():
+            return (await self._inject("supabase")) or {"name": "GoTrue"}
+
+        @app.get("/auth/v1/user")
+        async def auth_user(request: Request):
+            injected = await self._inject("supabase")
+            if injected:
+                return injected
+            token = request.headers.get("authorization", "").replace("Bearer ", "")
+            if not token.startswith(TOKEN_PREFIX):
+                return JSONResponse(status_code=401, content={"message": "invalid JWT"})
+            user_id = token[len(TOKEN_PREFIX):]
+            return {"id": user_id, "email": f"{user_id}@bench.local", "user_metadata": {}}
+
+        @app.get("/rest/v1/{table}")
+        async def rest_select(table: str, request: Request):
+            injected = await self._inject("supabase")
+            if injected:
+                return injected
+            user_id = request.query_params.get("user_id", "").replace("eq.", "", 1)
+            if table == "user_wallets" and user_id.startswith(SEEDED_PREFIX) and user_id not in self.wallets:
+                self.seed_wallet(user_id)
+            store = self.profiles if table == "profiles" else self.wallets
+            row = store.get(user_id)
+            return [row] if row else []
+
+        @app.post("/rest/v1/{table}")
+        async def rest_insert(table: str, request: Request):
+            injected = await self._inject("supabase")
+            if injected:
+                return injected
+            row = await request.json()
+            prefer = request.headers.get("prefer", "")
+            store = self.profiles if table == "profiles" else self.wallets
+            existing = store.get(row["user_id"])
+            if existing is not None and "ignore-duplicates" in prefer:
+                return JSONResponse(status_code=201, content=[])
+            store[row["user_id"]] = {**(existing or {}), **row}
+            return JSONResponse(status_code=201, content=[store[row["user_id"]]])
+
+        @app.patch("/rest/v1/{table}")
+        async def rest_update(table: str, request: Request):
+            injected = await self._inject("supabase")
+            if injected:
+                return injected
+            user_id = request.query_params.get("user_id", "").replace("eq.", "", 1)
+            store = self.profiles if table == "profiles" else self.wallets
+            row = store.get(user_id)
+            # Only the "<column>=is.null" filters PostgREST callers here use
+            null_columns = [k for k, v in request.query_params.items() if v == "is.null"]
+            if row is None or any(row.get(column) is not None for column in null_columns):
+                return []
+            row.update(await request.json())
+            return [row]
+
+        @app.post("/public/v1/query/whoami")
+        async def whoami():
+            return (await self._inject("turnkey")) or {"organizationId": ORGANIZATION_ID, "userId": "bench"}
+
+        @app.post("/public/v1/query/get_activity")
+        async def get_activity(request: Request):
+            injected = await self._inject("turnkey")
+            if injected:
+                return injected
+            body = await request.json()
+            return {"activity": {"id": body.get("activityId"), "status": "ACTIVITY_STATUS_COMPLETED", "result": {}}}
+
+        @app.post("/public/v1/query/list_users")
+        async def list_users():
+            return (await self._inject("turnkey")) or {"users": []}
+
+        @app.post("/public/v1/submit/{operation}")
+        async def submit(operation: str, request: Request):
+            injected = await self._inject("turnkey")
+            if injected:
+                return injected
+            body = await request.json()
+            return self._activity(
+                body.get("type", ""),
+                self._turnkey_result(operation, body),
+                body.get("organizationId", ORGANIZATION_ID)
+            )
+
+        @app.get("/api/v3/coins/markets")
+        async def coins_markets():
+            return (await self._inject("coingecko")) or Response(self._markets_body, media_type="application/json")
+
+        @app.get("/__bench/stats")
+        async def stats():
+            return {"requests": self.requests, "profiles": len(self.profiles), "wallets": len(self.wallets)}
+
+        return app
+
+
+def _signature(payload: str) -> Dict[str, str]:
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    return {"r": digest, "s": digest[::-1], "v": "00"}
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--fault", action="append", default=[], metavar="UPSTREAM=SPEC",
+                        help="e.g. turnkey=latency_ms=250,error_rate=0.02 (repeatable)")
+    args = parser.parse_args()
+
+    fakes = UpstreamFakes()
+    for override in args.fault:
+        upstream, _, spec = override.partition("=")
+        if upstream not in UPSTREAMS:
+            parser.error(f"unknown upstream {upstream!r} (expected one of {', '.join(UPSTREAMS)})")
+        fakes.faults[upstream] = Fault.parse(spec)
+    uvicorn.run(fakes.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Offline Load Test
+=================
+
+Starts ``server:app`` in-process (uvicorn, own thread) against the local
+upstream fakes in bench/fakes.py (separate process), then drives a weighted
+mix of user flows at fixed concurrency and reports p50/p95/p99 latency,
+req/s and errors per endpoint.
+
+Flows:
+    login    POST /api/user/ensure-profile + GET /api/user/profile
+    otp      POST /api/turnkey/init-email-auth + verify-email-otp (fresh user)
+    wallet   otp, then POST /api/turnkey/create-wallet (fresh user)
+    sign     POST /api/turnkey/sign-message or sign-transaction (seeded wallet)
+    indices  POST /api/crypto-indices (random timeframe - mostly cache hits)
+
+Upstream latency/errors default to DEFAULT_FAULTS and can be overridden:
+    --fault turnkey=latency_ms=250,jitter_ms=50,error_rate=0.02
+
+Usage:
+    python3 bench/load.py [--concurrency 32] [--duration 20]
+                          [--mix login=3,otp=1,wallet=1,sign=4,indices=6]
+                          [--fault upstream=k=v,...] [--json report.json]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import subprocess
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Awaitable
+
+import httpx
+import uvicorn
+
+# Add backend directory to path for imports
+backend_dir = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import Fault, TOKEN_PREFIX, SEEDED_PREFIX, ORGANIZATION_ID, UPSTREAMS  # noqa: E402
+
+DEFAULT_MIX = "login=3,otp=1,wallet=1,sign=4,indices=6"
+DEFAULT_FAULTS = {
+    "supabase": "latency_ms=15,jitter_ms=5",
+    "turnkey": "latency_ms=80,jitter_ms=30",
+    "coingecko": "latency_ms=150,jitter_ms=50",
+}
+SEEDED_USERS = 200
+READY_TIMEOUT = 60.0
+
+
+# ============================================================================
+# In-process servers
+# ============================================================================
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread(threading.Thread):
+    """uvicorn serving ``app`` on 127.0.0.1:<port> in a daemon thread."""
+
+    def __init__(self, app: Any, port: int, name: str):
+        super().__init__(name=name, daemon=True)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", access_log=False, lifespan="on"
+        ))
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def run(self) -> None:
+        self.server.run()
+
+    def start_and_wait(self, timeout: float = 10.0) -> None:
+        self.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.is_alive():
+                raise RuntimeError(f"{self.name} did not start")
+            time.sleep(0.02)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+
+def start_fakes(port: int, faults: Dict[str, str], timeout: float = 15.0) -> subprocess.Popen:
+    """Run bench/fakes.py in its own interpreter and wait until it answers."""
+    command = [sys.executable, str(Path(__file__).parent / "fakes.py"), "--port", str(port)]
+    for upstream, spec in faults.items():
+        command += ["--fault", f"{upstream}={spec}"]
+    process = subprocess.Popen(command)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"upstream fakes exited with {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/__bench/stats", timeout=1.0)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("upstream fakes did not start")
+
+
+def generate_api_key() -> Dict[str, str]:
+    """Throwaway P-256 key pair in the hex format the stamper expects."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    public = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.CompressedPoint
+    )
+    return {"public": public.hex(), "private": f"{key.private_numbers().private_value:064x}"}
+
+
+def configure_server_env(fakes_url: str, state_dir: str) -> None:
+    """Point server.py at the fakes. Must run before ``import server``."""
+    api_key = generate_api_key()
+    os.environ.update({
+        "SUPABASE_URL": fakes_url,
+        "SUPABASE_SERVICE_ROLE_KEY": "bench-service-key",
+        "COINGECKO_API_URL": f"{fakes_url}/api/v3",
+        "COINGECKO_API_KEY": "",
+        "TURNKEY_API_BASE_URL": fakes_url,
+        "TURNKEY_ORGANIZATION_ID": ORGANIZATION_ID,
+        "TURNKEY_API_PUBLIC_KEY": api_key["public"],
+        "TURNKEY_API_PRIVATE_KEY": api_key["private"],
+        "EVM_RPC_URL": "",
+        "SUB_ORG_POOL_SIZE": "0",
+        "SUB_ORG_POOL_DB_PATH": str(Path(state_dir) / "sub_org_pool.db"),
+        "ADMIN_JOBS_DB_PATH": str(Path(state_dir) / "admin_jobs.db"),
+        "INDEX_HISTORY_DB_PATH": str(Path(state_dir) / "index_history.db"),
+        "CREATION_JOURNAL_DB_PATH": str(Path(state_dir) / "creation_journal.db"),
+        "STARTUP_IMPORT_REPORT": "false",
+    })
+
+
+# ============================================================================
+# Recording
+# ============================================================================
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    async def call(self, client: httpx.AsyncClient, method: str, path: str, **kwargs) -> httpx.Response:
+        name = f"{method} {path}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        by_status = self.statuses.setdefault(name, {})
+        by_status[response.status_code] = by_status.get(response.status_code, 0) + 1
+        if response.status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        rows = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(name, []))
+            count = len(values)
+            rows[name] = {
+                "requests": count,
+                "errors": self.errors.get(name, 0),
+                "rps": round(count / elapsed, 1) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+                "statuses": {str(k): v for k, v in sorted(self.statuses.get(name, {}).items())},
+            }
+        return rows
+
+
+def format_report(rows: Dict[str, Dict[str, Any]], elapsed: float, concurrency: int) -> str:
+    total = sum(r["requests"] for r in rows.values())
+    lines = [
+        f"{total} requests in {elapsed:.1f}s at concurrency {concurrency} ({total / elapsed:.1f} req/s)",
+        f"{'endpoint':<42} {'reqs':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}",
+    ]
+    for name, r in rows.items():
+        lines.append(
+            f"{name:<42} {r['requests']:>7} {r['rps']:>8.1f} {r['p50_ms']:>6.1f}ms "
+            f"{r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms {r['errors']:>7}"
+        )
+    return "\n".join(lines)
+
+
+# ============================================================================
+# Flows
+# ============================================================================
+
+class Flows:
+    def __init__(self, recorder: Recorder, seeded_users: List[str]):
+        self.recorder = recorder
+        self.seeded_users = seeded_users
+        self._fresh = 0
+
+    def _fresh_user(self) -> str:
+        self._fresh += 1
+        return f"fresh-{self._fresh}-{random.getrandbits(32):08x}"
+
+    @staticmethod
+    def _auth(user_id: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {TOKEN_PREFIX}{user_id}"}
+
+    async def login(self, client: httpx.AsyncClient) -> None:
+        headers = self._auth(random.choice(self.seeded_users))
+        await self.recorder.call(client, "POST", "/api/user/ensure-profile", json={}, headers=headers)
+        await self.recorder.call(client, "GET", "/api/user/profile", headers=headers)
+
+    async def otp(self, client: httpx.AsyncClient, user_id: str = "") -> bool:
+        user_id = user_id or self._fresh_user()
+        headers = self._auth(user_id)
+        response = await self.recorder.call(
+            client, "POST", "/api/turnkey/init-email-auth",
+            json={"email": f"{user_id}@bench.local"}, headers=headers
+        )
+        if response.status_code != 200:
+            return False
+        response = await self.recorder.call(
+            client, "POST", "/api/turnkey/verify-email-otp",
+            json={"email": f"{user_id}@bench.local", "code": "123456", "otpId": response.json().get("otpId")},
+            headers=headers
+        )
+        return response.status_code == 200
+
+    async def wallet(self, client: httpx.AsyncClient) -> None:
+        user_id = self._fresh_user()
+        if await self.otp(client, user_id):
+            await self.recorder.call(client, "POST", "/api/turnkey/create-wallet", json={}, headers=self._auth(user_id))
+
+    async def sign(self, client: httpx.AsyncClient) -> None:
+        headers = self._auth(random.choice(self.seeded_users))
+        if random.random() < 0.5:
+            await self.recorder.call(
+                client, "POST", "/api/turnkey/sign-message",
+                json={"message": f"bench {random.getrandbits(64):x}"}, headers=headers
+            )
+        else:
+            await self.recorder.call(
+                client, "POST", "/api/turnkey/sign-transaction",
+                json={
+                    "to": "0x" + "ab" * 20,
+                    "value": str(random.randint(1, 10 ** 18)),
+                    "nonce": random.randint(0, 10000),
+                    "maxFeePerGas": "50000000000",
+                    "maxPriorityFeePerGas": "30000000000"
+                },
+                headers=headers
+            )
+
+    async def indices(self, client: httpx.AsyncClient) -> None:
+        period = random.choice(("daily", "daily", "daily", "month", "year", "all"))
+        await self.recorder.call(client, "POST", "/api/crypto-indices", json={"timePeriod": period})
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in filter(None, spec.split(",")):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def run_load(
+    base_url: str,
+    flows: Flows,
+    mix: Dict[str, float],
+    concurrency: int,
+    duration: float
+) -> float:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    handlers: Dict[str, Callable[[httpx.AsyncClient], Awaitable[Any]]] = {
+        name: getattr(flows, name) for name in names
+    }
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker() -> None:
+            while time.monotonic() < deadline:
+                flow = random.choices(names, weights)[0]
+                try:
+                    await handlers[flow](client)
+                except httpx.HTTPError:
+                    pass  # counted by the recorder
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+
+async def wait_ready(base_url: str) -> None:
+    deadline = time.monotonic() + READY_TIMEOUT
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            response = await client.get("/api/ready")
+            if response.status_code == 200:
+                return
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"server not ready after {READY_TIMEOUT}s: {response.text}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unrecorded load first")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--fault", action="append", default=[], metavar="UPSTREAM=SPEC",
+                        help="e.g. turnkey=latency_ms=250,error_rate=0.02 (repeatable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING", help="server log level during the run")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+
+    faults = dict(DEFAULT_FAULTS)
+    for override in args.fault:
+        upstream, _, spec = override.partition("=")
+        if upstream not in UPSTREAMS:
+            parser.error(f"unknown upstream {upstream!r} (expected one of {', '.join(UPSTREAMS)})")
+        faults[upstream] = spec
+    faults_summary = {name: vars(Fault.parse(spec)) for name, spec in faults.items()}
+    seeded_users = [f"{SEEDED_PREFIX}{i}" for i in range(SEEDED_USERS)]
+
+    fakes_port = free_port()
+    fakes_url = f"http://127.0.0.1:{fakes_port}"
+    fakes_process = start_fakes(fakes_port, faults)
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as state_dir:
+        configure_server_env(fakes_url, state_dir)
+        import server  # noqa: E402 - reads its configuration at import
+
+        logging.getLogger().setLevel(args.log_level.upper())
+        server_thread = ServerThread(server.app, free_port(), "server")
+        server_thread.start_and_wait()
+        try:
+            asyncio.run(wait_ready(server_thread.url))
+            print(f"upstream faults: {faults_summary}")
+            print(f"mix: {mix}")
+
+            if args.warmup > 0:
+                asyncio.run(run_load(server_thread.url, Flows(Recorder(), seeded_users),
+                                     mix, args.concurrency, args.warmup))
+            recorder = Recorder()
+            elapsed = asyncio.run(run_load(server_thread.url, Flows(recorder, seeded_users),
+                                           mix, args.concurrency, args.duration))
+            upstream_calls = httpx.get(f"{fakes_url}/__bench/stats").json()["requests"]
+        finally:
+            server_thread.stop()
+            fakes_process.terminate()
+            fakes_process.wait(timeout=10)
+
+    rows = recorder.report(elapsed)
+    print(format_report(rows, elapsed, args.concurrency))
+    print(f"upstream calls (including warm-up): {upstream_calls}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 2),
+            "mix": mix,
+            "faults": faults_summary,
+            "endpoints": rows,
+            "upstream_calls": upstream_calls,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
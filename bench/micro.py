@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+CPU Hot-Path Microbenchmarks
+============================
+
+Times the pure-CPU code that runs per request or per market refresh and
+compares it with a stored baseline:
+
+    calculate_index_scores, generate_gbm_candles,
+    calculate_sophisticated_indices, index_series (7-day sparkline matrix),
+    IndexHistory.candles (rolling candles),
+    fmt_constituents,
+    _sign_with_api_key, ApiKeyStamper.stamp, hash_otp,
+    personal_sign_hash (keccak prefix hashing in sign-message),
+    build_transaction + encode (RLP building in sign-transaction)
+
+Each case is calibrated to run for at least --min-time seconds per repeat, with
+the garbage collector paused; the best of --repeats is reported (least
+disturbed by other processes).
+
+Baselines are per machine/interpreter. Record one with --save (stores the
+median of 1 + --confirm measurements per case), then plain runs
+compare against it and exit 1 if any case is slower than baseline by more than
+--threshold (default 25%). A case over the threshold is re-measured up to
+--confirm more times (best kept) before it counts, so one noisy run on a shared
+machine doesn't fail the check.
+
+Usage:
+    python3 bench/micro.py [--save] [--threshold 0.25] [--filter stamp]
+                           [--baseline bench/baselines/micro.json]
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Tuple
+
+# Add backend directory to path for imports
+backend_dir = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Charts read the (empty) recorded history; keep the bench from writing a file
+os.environ.setdefault("INDEX_HISTORY_DB_PATH", ":memory:")
+
+import server  # noqa: E402
+from turnkey_client import _sign_with_api_key, ApiKeyStamper, ApiKeyStamperConfig  # noqa: E402
+from tx_builder import build_transaction, TX_TYPE_DYNAMIC_FEE  # noqa: E402
+from index_history import IndexHistory  # noqa: E402
+from sparkline_series import index_series  # noqa: E402
+from fakes import synthetic_markets  # noqa: E402
+from load import generate_api_key  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "micro.json"
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_TIME = 0.3
+DEFAULT_REPEATS = 7
+DEFAULT_CONFIRM = 2
+
+
+def build_cases() -> List[Tuple[str, Callable[[], Any]]]:
+    markets = synthetic_markets()
+    scores = server.calculate_index_scores(markets)
+    api_key = generate_api_key()
+    stamper = ApiKeyStamper(ApiKeyStamperConfig(api_public_key=api_key["public"], api_private_key=api_key["private"]))
+    body = json.dumps({
+        "type": "ACTIVITY_TYPE_SIGN_RAW_PAYLOAD_V2",
+        "timestampMs": "1700000000000",
+        "organizationId": "sub-org-0000",
+        "parameters": {"signWith": "0x" + "ab" * 20, "payload": "cd" * 32,
+                       "encoding": "PAYLOAD_ENCODING_HEXADECIMAL", "hashFunction": "HASH_FUNCTION_NO_OP"}
+    })
+    message = "Sign in to Sequence Theory\nNonce: 8f14e45fceea167a5a36dedd4bea2543"
+    server.get_cached_scores(markets)  # calculate_sophisticated_indices reads cached scores
+
+    # Two years of hourly samples behind the rolling candles
+    history = IndexHistory(":memory:", [(c["interval"], c["periods"]) for c in server.PERIOD_CONFIG.values()])
+    now = time.time()
+    for hour in range(2 * 365 * 24, 0, -1):
+        history.append(now - hour * 3600, {"anchor5": (95000.0 + hour % 500, 5e10)})
+
+    loop = asyncio.new_event_loop()
+
+    def rlp_build() -> str:
+        tx = loop.run_until_complete(build_transaction(
+            sender="0x" + "ab" * 20, to="0x" + "cd" * 20, value="1000000000000000000",
+            data="0xa9059cbb" + "00" * 64, chain_id=137, gas_limit="65000", nonce=42,
+            tx_type=TX_TYPE_DYNAMIC_FEE, max_fee_per_gas="50000000000",
+            max_priority_fee_per_gas="30000000000"
+        ))
+        return tx.to_hex()
+
+    return [
+        ("calculate_index_scores", lambda: server.calculate_index_scores(markets)),
+        ("generate_gbm_candles.daily", lambda: server.generate_gbm_candles(95000.0, 1.5, "low", 24, 3600, seed=1)),
+        ("generate_gbm_candles.all", lambda: server.generate_gbm_candles(4e6, -2.0, "high", 104, 604800, seed=1)),
+        ("calculate_sophisticated_indices.daily", lambda: server.calculate_sophisticated_indices(markets, "daily")),
+        ("calculate_sophisticated_indices.all", lambda: server.calculate_sophisticated_indices(markets, "all")),
+        ("index_series.sparklines", lambda: index_series(scores, now)),
+        ("index_history.candles.daily", lambda: history.candles("anchor5", 24, 3600)),
+        ("index_history.candles.all", lambda: history.candles("anchor5", 104, 604800)),
+        ("fmt_constituents.wave100", lambda: server.fmt_constituents(scores["wave100"]["coins"], 1.0)),
+        ("sign_with_api_key", lambda: _sign_with_api_key(api_key["public"], api_key["private"], body)),
+        ("api_key_stamper.stamp", lambda: stamper.stamp(body)),
+        ("hash_otp", lambda: server.hash_otp("482913")),
+        ("personal_sign_hash", lambda: server.personal_sign_hash(message)),
+        ("build_transaction.eip1559", rlp_build),
+    ]
+
+
+def measure(func: Callable[[], Any], min_time: float, repeats: int) -> float:
+    """Best seconds per call over ``repeats`` runs of at least ``min_time`` (GC paused)."""
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(func, min_time, repeats)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _measure(func: Callable[[], Any], min_time: float, repeats: int) -> float:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed * 1.2))
+
+    best = elapsed / loops
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - started) / loops)
+    return best
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--confirm", type=int, default=DEFAULT_CONFIRM,
+                        help="re-measurements before a slowdown counts as a regression")
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    baseline: Dict[str, Any] = {}
+    if args.baseline.exists() and not args.save:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("environment") != environment():
+            print(f"note: baseline recorded on {baseline.get('environment')}, running on {environment()}")
+
+    results: Dict[str, float] = {}
+    regressions = []
+    print(f"{'case':<40} {'per call':>12} {'baseline':>12} {'change':>9}")
+    for name, func in build_cases():
+        if args.filter not in name:
+            continue
+        if args.save:
+            # Median of several best-of runs, so one lucky run doesn't set the bar
+            seconds = statistics.median(measure(func, args.min_time, args.repeats) for _ in range(1 + args.confirm))
+        else:
+            seconds = measure(func, args.min_time, args.repeats)
+        reference = baseline.get("cases", {}).get(name, {}).get("seconds")
+        for _ in range(args.confirm if reference else 0):
+            if seconds / reference - 1 <= args.threshold:
+                break
+            seconds = min(seconds, measure(func, args.min_time, args.repeats))
+        results[name] = seconds
+        if reference:
+            change = seconds / reference - 1
+            flag = "  REGRESSION" if change > args.threshold else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:<40} {seconds * 1e6:>10.2f}us {reference * 1e6:>10.2f}us {change:>+8.1%}{flag}")
+        else:
+            print(f"{name:<40} {seconds * 1e6:>10.2f}us {'-':>12} {'-':>9}")
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        existing = json.loads(args.baseline.read_text()).get("cases", {}) if args.baseline.exists() else {}
+        existing.update({name: {"seconds": seconds} for name, seconds in results.items()})
+        args.baseline.write_text(json.dumps({
+            "environment": environment(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "cases": dict(sorted(existing.items()))
+        }, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Transaction Encode Throughput Benchmark
+=======================================
+
+Measures how many unsigned transactions per second backend/tx_builder.py can
+parse + encode, per envelope type, and compares the native RLP encoder with
+the ``rlp`` package when that is installed.
+
+No network: fees and nonces are passed explicitly, so only field parsing and
+encoding are timed.
+
+Usage: python3 bench/tx_encode.py [--iterations 20000]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add backend directory to path for imports
+backend_dir = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+
+from tx_builder import (  # noqa: E402
+    build_transaction,
+    rlp_encode,
+    TX_TYPE_LEGACY,
+    TX_TYPE_ACCESS_LIST,
+    TX_TYPE_DYNAMIC_FEE,
+)
+
+TO = "0x" + "ab" * 20
+# ERC-20 transfer(address,uint256) calldata
+DATA = "0xa9059cbb" + "00" * 12 + "cd" * 20 + "00" * 31 + "01"
+ACCESS_LIST = [{"address": TO, "storageKeys": ["0x" + "00" * 31 + "01"]}]
+
+CASES = {
+    "eip1559": dict(tx_type=TX_TYPE_DYNAMIC_FEE, max_fee_per_gas="50000000000",
+                    max_priority_fee_per_gas="0x6fc23ac00"),
+    "eip2930": dict(tx_type=TX_TYPE_ACCESS_LIST, gas_price="0xba43b7400", access_list=ACCESS_LIST),
+    "legacy": dict(tx_type=TX_TYPE_LEGACY, gas_price="50000000000"),
+}
+
+
+async def build(case: dict, nonce: int) -> str:
+    tx = await build_transaction(
+        sender=TO, to=TO, value="0xde0b6b3a7640000", data=DATA,
+        chain_id=137, gas_limit="65000", nonce=nonce, **case
+    )
+    return tx.to_hex()
+
+
+async def bench_build(iterations: int) -> None:
+    print(f"build_transaction + encode ({iterations} iterations)")
+    for name, case in CASES.items():
+        started = time.perf_counter()
+        for nonce in range(iterations):
+            await build(case, nonce)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<10} {iterations / elapsed:>12,.0f} tx/s  {elapsed / iterations * 1e6:8.2f} us/tx")
+
+
+def bench_rlp(iterations: int) -> None:
+    fields = [137, 7, 30_000_000_000, 50_000_000_000, 65000,
+              bytes.fromhex("ab" * 20), 10 ** 18, bytes.fromhex(DATA[2:]), []]
+    encoders = {"native": rlp_encode}
+    try:
+        import rlp
+        encoders["rlp pkg"] = rlp.encode
+    except ImportError:
+        print("  (rlp package not installed - skipping comparison)")
+
+    print(f"RLP encode of EIP-1559 fields ({iterations} iterations)")
+    for name, encode in encoders.items():
+        started = time.perf_counter()
+        for _ in range(iterations):
+            encode(fields)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<10} {iterations / elapsed:>12,.0f} ops/s  {elapsed / iterations * 1e6:8.2f} us/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    bench_rlp(args.iterations)
+    asyncio.run(bench_build(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
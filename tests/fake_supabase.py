@@ -0,0 +1,55 @@
+"""In-memory Supabase (auth admin + profiles / user_wallets) behind an httpx.MockTransport."""
+
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from resilience import UpstreamUnavailableError, REASON_BULKHEAD_FULL
+
+
+class FakeSupabase:
+    def __init__(self, auth_users: List[str], profiles: Set[str], wallets: Optional[Set[str]] = None):
+        self.auth_users = list(auth_users)  # in listing order
+        self.profiles = set(profiles)
+        self.wallets = set(wallets or ())
+        self.requests: List[httpx.Request] = []
+        self.refuse_auth_deletes: Set[str] = set()  # raise bulkhead-full for these
+        self.fail_auth_deletes: Set[str] = set()    # answer 500 for these
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self._handle))
+
+    def calls(self, method: str, path_prefix: str) -> List[httpx.Request]:
+        return [r for r in self.requests if r.method == method and r.url.path.startswith(path_prefix)]
+
+    @staticmethod
+    def _ids(request: httpx.Request) -> List[str]:
+        value = request.url.params.get("user_id", "")
+        if value.startswith("in.("):
+            return value[4:-1].split(",")
+        return [value[3:]] if value.startswith("eq.") else []
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if path == "/auth/v1/admin/users" and request.method == "GET":
+            page = int(request.url.params["page"])
+            per_page = int(request.url.params["per_page"])
+            users = self.auth_users[(page - 1) * per_page:page * per_page]
+            return httpx.Response(200, json={"users": [{"id": uid} for uid in users]})
+        if path.startswith("/auth/v1/admin/users/") and request.method == "DELETE":
+            user_id = path.rsplit("/", 1)[1]
+            if user_id in self.refuse_auth_deletes:
+                raise UpstreamUnavailableError("supabase", REASON_BULKHEAD_FULL, 1)
+            if user_id in self.fail_auth_deletes or user_id not in self.auth_users:
+                return httpx.Response(500 if user_id in self.fail_auth_deletes else 404, json={})
+            self.auth_users.remove(user_id)
+            return httpx.Response(200, json={})
+        table = path.rsplit("/", 1)[1]
+        rows: Dict[str, Set[str]] = {"profiles": self.profiles, "user_wallets": self.wallets}
+        if table in rows and request.method == "GET":
+            return httpx.Response(200, json=[{"user_id": uid} for uid in self._ids(request) if uid in rows[table]])
+        if table in rows and request.method == "DELETE":
+            rows[table].difference_update(self._ids(request))
+            return httpx.Response(204)
+        return httpx.Response(404, json={})
@@ -0,0 +1,77 @@
+"""require_admin: admin secret, service role key or an admin user; nothing else."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+class FakeAuth:
+    """/auth/v1/user answering from a token -> user table."""
+
+    def __init__(self, users):
+        self.users = users
+        self.calls = 0
+
+    async def get(self, url, headers=None, **kwargs):
+        self.calls += 1
+        user = self.users.get(headers["Authorization"])
+        return FakeResponse(200, user) if user else FakeResponse(401, {})
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def auth(monkeypatch):
+    fake = FakeAuth({
+        "Bearer admin-user": {"id": "a", "app_metadata": {"role": "admin"}},
+        "Bearer plain-user": {"id": "p", "app_metadata": {}},
+        # user_metadata is writable by the user - never trusted
+        "Bearer self-promoted": {"id": "s", "user_metadata": {"role": "admin"}},
+    })
+    monkeypatch.setattr(server, "get_supabase_client", lambda: fake)
+    monkeypatch.setattr(server, "ADMIN_API_KEY", "admin-secret")
+    monkeypatch.setattr(server, "SUPABASE_SERVICE_KEY", "service-key")
+    return fake
+
+
+def check(authorization):
+    return asyncio.run(server.require_admin(authorization))
+
+
+@pytest.mark.parametrize("authorization", ["Bearer admin-secret", "Bearer service-key"])
+def test_shared_secrets_pass_without_a_lookup(auth, authorization):
+    check(authorization)
+    assert auth.calls == 0
+
+
+def test_admin_user_passes(auth):
+    check("Bearer admin-user")
+
+
+@pytest.mark.parametrize("authorization,status", [
+    (None, 401),
+    ("admin-secret", 401),
+    ("Bearer x", 401),
+    ("Bearer plain-user", 403),
+    ("Bearer self-promoted", 403),
+])
+def test_everything_else_is_refused(auth, authorization, status):
+    with pytest.raises(HTTPException) as refused:
+        check(authorization)
+    assert refused.value.status_code == status
+
+
+def test_empty_admin_secret_is_not_a_password(auth, monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_API_KEY", "")
+    with pytest.raises(HTTPException):
+        check("Bearer ")
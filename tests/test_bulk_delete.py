@@ -0,0 +1,96 @@
+"""bulk_delete_users and the bulk-delete endpoint: chunked deletes, retryable refusals."""
+
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import admin_service
+import server
+from admin_service import bulk_delete_users, IN_FILTER_CHUNK_SIZE
+from tests.fake_supabase import FakeSupabase
+
+
+@pytest.fixture(autouse=True)
+def fake_supabase_url(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(admin_service.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(admin_service, "SUPABASE_URL", "http://supabase.test")
+
+
+def delete(supabase, user_ids, concurrency=8):
+    async def scenario():
+        async with supabase.client() as client:
+            return await bulk_delete_users(client, user_ids, concurrency=concurrency)
+    return asyncio.run(scenario())
+
+
+def test_deletes_from_all_stores_with_chunked_table_deletes():
+    user_ids = [f"u{n:03d}" for n in range(250)]
+    supabase = FakeSupabase(user_ids, set(user_ids), set(user_ids))
+
+    results = delete(supabase, user_ids)
+
+    assert list(results) == user_ids
+    assert all(r == {"deleted_from": ["user_wallets", "profiles", "auth.users"], "retryable": False}
+               for r in results.values())
+    assert supabase.auth_users == [] and supabase.profiles == set() and supabase.wallets == set()
+    chunks = -(-len(user_ids) // IN_FILTER_CHUNK_SIZE)
+    assert len(supabase.calls("DELETE", "/rest/v1/profiles")) == chunks
+    assert len(supabase.calls("DELETE", "/rest/v1/user_wallets")) == chunks
+
+
+def test_refused_and_failed_auth_deletes_are_told_apart():
+    user_ids = ["ok", "refused", "broken"]
+    supabase = FakeSupabase(user_ids, set(user_ids))
+    supabase.refuse_auth_deletes = {"refused"}
+    supabase.fail_auth_deletes = {"broken"}
+
+    results = delete(supabase, user_ids)
+
+    assert "auth.users" in results["ok"]["deleted_from"]
+    assert results["refused"]["retryable"] and "auth.users" not in results["refused"]["deleted_from"]
+    assert not results["broken"]["retryable"] and "auth.users" not in results["broken"]["deleted_from"]
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    calls = []
+
+    async def allow(authorization):
+        return None
+
+    async def fake_bulk_delete(client, user_ids, concurrency):
+        calls.append((user_ids, concurrency))
+        return {uid: {"deleted_from": ["auth.users"], "retryable": False} for uid in user_ids}
+
+    monkeypatch.setattr(server, "require_admin", allow)
+    monkeypatch.setattr(server, "bulk_delete_users", fake_bulk_delete)
+    return TestClient(server.app), calls
+
+
+def test_endpoint_validates_dedupes_and_caps_concurrency(endpoint):
+    client, calls = endpoint
+    uid = str(uuid.uuid4())
+    response = client.post(
+        "/api/admin/users/bulk-delete",
+        json={"user_ids": [uid, uid], "concurrency": 10_000},
+        headers={"Authorization": "Bearer admin"}
+    )
+    assert response.status_code == 200
+    assert response.json()["deleted_count"] == 1
+    assert calls == [([uid], admin_service.ADMIN_MAX_CONCURRENCY)]
+
+
+def test_endpoint_rejects_ids_that_are_not_uuids(endpoint):
+    client, calls = endpoint
+    response = client.post(
+        "/api/admin/users/bulk-delete",
+        json={"user_ids": ["x),user_id.neq.(y"]},
+        headers={"Authorization": "Bearer admin"}
+    )
+    assert response.status_code == 422
+    assert calls == []
@@ -0,0 +1,136 @@
+"""CreationJournal and resuming a pending wallet creation instead of submitting again."""
+
+import time
+import asyncio
+import threading
+
+import pytest
+
+import deadlines
+import turnkey_activity
+import turnkey_service
+from creation_journal import CreationJournal, KIND_SUB_ORG, KIND_WALLET
+from turnkey_activity import TurnkeyActivityPendingError, submit_activity
+
+
+USER = "6f1c0a52-1d5e-4f8e-9a57-3c2b1d0e4f6a"
+WALLET_RESULT = {"createWalletResult": {"walletId": "w-1", "addresses": ["0x" + "cd" * 20]}}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return CreationJournal(str(tmp_path / "journal.db"))
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(turnkey_activity, "ACTIVITY_POLL_INITIAL_DELAY", 0.01)
+
+
+class FakeTurnkey:
+    """create_wallet that stays pending until ``complete`` is set."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.complete = False
+        self.release_submit = threading.Event()
+        self.release_submit.set()
+
+    def _activity(self):
+        if self.complete:
+            return {"activity": {"id": "act-1", "status": "ACTIVITY_STATUS_COMPLETED", "result": WALLET_RESULT}}
+        return {"activity": {"id": "act-1", "status": "ACTIVITY_STATUS_PENDING"}}
+
+    def create_wallet(self, body):
+        self.release_submit.wait(5)
+        self.submitted += 1
+        return self._activity()
+
+    def get_activity(self, body):
+        assert body["activityId"] == "act-1"
+        return self._activity()
+
+
+def test_journal_round_trip(journal):
+    assert journal.get(USER, KIND_WALLET) is None
+
+    journal.record_submitted(USER, KIND_WALLET, "act-1")
+    assert journal.get(USER, KIND_WALLET) == {"activity_id": "act-1", "result": None}
+
+    journal.record_result(USER, KIND_WALLET, {"walletId": "w-1"})
+    assert journal.get(USER, KIND_WALLET) == {"activity_id": "act-1", "result": {"walletId": "w-1"}}
+    assert journal.get(USER, KIND_SUB_ORG) is None
+    assert journal.stats() == {"pending": 0, "unpersisted": 1}
+
+    journal.clear(USER, KIND_WALLET)
+    assert journal.get(USER, KIND_WALLET) is None
+
+
+def test_journal_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "journal.db")
+    CreationJournal(path).record_submitted(USER, KIND_SUB_ORG, "act-9")
+    assert CreationJournal(path).get(USER, KIND_SUB_ORG)["activity_id"] == "act-9"
+
+
+def test_stale_pending_entry_is_ignored(tmp_path):
+    journal = CreationJournal(str(tmp_path / "journal.db"), pending_ttl=0)
+    journal.record_submitted(USER, KIND_WALLET, "act-1")
+    assert journal.get(USER, KIND_WALLET) is None
+
+    # A recorded result never goes stale
+    journal.record_result(USER, KIND_WALLET, {"walletId": "w-1"})
+    assert journal.get(USER, KIND_WALLET)["result"] == {"walletId": "w-1"}
+
+
+def test_submitted_id_is_recorded_when_the_request_is_cancelled(journal):
+    client = FakeTurnkey()
+    client.release_submit.clear()
+
+    async def scenario():
+        task = asyncio.create_task(submit_activity(
+            client,
+            client.create_wallet,
+            {"type": "ACTIVITY_TYPE_CREATE_WALLET", "organizationId": "sub-org"},
+            on_submitted=lambda activity_id: journal.record_submitted(USER, KIND_WALLET, activity_id)
+        ))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Turnkey answers after the request gave up
+        client.release_submit.set()
+        for _ in range(100):
+            if journal.get(USER, KIND_WALLET):
+                return
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert journal.get(USER, KIND_WALLET)["activity_id"] == "act-1"
+
+
+def test_pending_wallet_creation_is_resumed_not_resubmitted(journal, monkeypatch):
+    client = FakeTurnkey()
+    monkeypatch.setattr(turnkey_service, "get_turnkey_client", lambda *args: client)
+
+    async def first_attempt():
+        # Request budget that leaves 0.1s of polling after the answer margin
+        deadlines._current_deadline.set(deadlines._Deadline(
+            time.monotonic() + turnkey_activity.ACTIVITY_DEADLINE_MARGIN + 0.1
+        ))
+        await turnkey_service.create_wallet_in_sub_org(
+            "sub-org",
+            "user@example.com",
+            on_submitted=lambda activity_id: journal.record_submitted(USER, KIND_WALLET, activity_id)
+        )
+
+    with pytest.raises(TurnkeyActivityPendingError) as pending:
+        asyncio.run(first_attempt())
+    assert pending.value.activity_id == "act-1"
+    assert journal.get(USER, KIND_WALLET)["activity_id"] == "act-1"
+
+    client.complete = True
+    wallet = asyncio.run(turnkey_service.create_wallet_in_sub_org(
+        "sub-org", "user@example.com", activity_id=journal.get(USER, KIND_WALLET)["activity_id"]
+    ))
+    assert wallet == ("w-1", "0x" + "cd" * 20)
+    assert client.submitted == 1
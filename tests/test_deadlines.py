@@ -0,0 +1,61 @@
+"""DeadlineMiddleware: hard cancel, and the cancel grace of creation routes."""
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import deadlines
+from deadlines import DeadlineMiddleware, check_deadline, submit_timeout, budget_timeout
+
+
+def make_client(observed):
+    app = FastAPI()
+
+    async def slow():
+        await asyncio.sleep(0.3)
+        observed["budget_timeout"] = budget_timeout(30)
+        observed["submit_timeout"] = submit_timeout(30)
+        try:
+            check_deadline("next call")
+        except deadlines.DeadlineExceeded:
+            return {"answer": "pending"}
+        return {"answer": "done"}
+
+    app.add_api_route("/api/turnkey/create-wallet", slow, methods=["POST"])
+    app.add_api_route("/api/turnkey/sign-message", slow, methods=["POST"])
+    app.add_middleware(DeadlineMiddleware)
+    return TestClient(app)
+
+
+def test_plain_route_is_cancelled_with_504():
+    client = make_client({})
+    response = client.post("/api/turnkey/sign-message", headers={"X-Request-Timeout": "0.1"})
+    assert response.status_code == 504
+    assert response.json() == {"detail": "DEADLINE_EXCEEDED"}
+
+
+def test_creation_route_finishes_its_call_then_refuses_new_ones(monkeypatch):
+    monkeypatch.setitem(deadlines.ROUTE_CANCEL_GRACE, "/api/turnkey/create-wallet", 5.0)
+    observed = {}
+    client = make_client(observed)
+
+    response = client.post("/api/turnkey/create-wallet", headers={"X-Request-Timeout": "0.1"})
+
+    assert response.status_code == 200
+    assert response.json() == {"answer": "pending"}
+    # Past the deadline: ordinary calls get the minimum, submits the rest of the grace
+    assert observed["budget_timeout"] == 0.001
+    assert 4.0 < observed["submit_timeout"] < 5.0
+
+
+def test_creation_route_is_cancelled_after_the_grace(monkeypatch):
+    monkeypatch.setitem(deadlines.ROUTE_CANCEL_GRACE, "/api/turnkey/create-wallet", 0.05)
+    client = make_client({})
+    response = client.post("/api/turnkey/create-wallet", headers={"X-Request-Timeout": "0.1"})
+    assert response.status_code == 504
+
+
+def test_no_deadline_outside_a_request():
+    assert submit_timeout(30) == 30
+    assert budget_timeout(None) is None
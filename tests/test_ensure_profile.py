@@ -0,0 +1,98 @@
+"""ensure_profile_exists: one upsert, default name only for new rows, cached."""
+
+import json
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+import server
+
+
+class FakeProfiles:
+    """PostgREST profiles with merge-duplicates upserts, filtered PATCH and GET."""
+
+    def __init__(self, rows=None, fail=False):
+        self.rows = dict(rows or {})
+        self.fail = fail
+        self.requests = []
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0)  # let concurrent callers interleave
+        self.requests.append(request.method)
+        if self.fail:
+            return httpx.Response(503, text="unavailable")
+        if request.method == "POST":
+            body = json.loads(request.content)
+            assert request.url.params["on_conflict"] == "user_id"
+            assert "name" not in body  # never overwrites a chosen name
+            row = self.rows.setdefault(body["user_id"], {"user_id": body["user_id"], "name": None})
+            row.update(body)
+            return httpx.Response(201, json=[dict(row)])
+        if request.method == "PATCH":
+            user_id = request.url.params["user_id"].replace("eq.", "", 1)
+            row = self.rows.get(user_id)
+            if row is None or (request.url.params.get("name") == "is.null" and row["name"] is not None):
+                return httpx.Response(200, json=[])
+            row.update(json.loads(request.content))
+            return httpx.Response(200, json=[dict(row)])
+        if request.method == "GET":
+            row = self.rows.get(request.url.params["user_id"].replace("eq.", "", 1))
+            return httpx.Response(200, json=[dict(row)] if row else [])
+        return httpx.Response(405)
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    fake = FakeProfiles()
+
+    @asynccontextmanager
+    async def client():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(fake.handle)) as c:
+            yield c
+
+    monkeypatch.setattr(server, "shared_supabase_client", client)
+    monkeypatch.setattr(server, "SUPABASE_URL", "http://supabase.test")
+    monkeypatch.setattr(server, "profile_cache", {})
+    return fake
+
+
+def ensure(user_id="u-1", email="alice@example.com", name=None):
+    return asyncio.run(server.ensure_profile_exists(user_id, email, name))
+
+
+def test_new_user_gets_the_default_name(profiles):
+    profile = ensure()
+    assert profile["name"] == "alice"
+    assert profiles.requests == ["POST", "PATCH"]
+
+
+def test_existing_user_is_one_round_trip_and_keeps_their_name(profiles):
+    profiles.rows["u-1"] = {"user_id": "u-1", "email": "old@example.com", "name": "Ally"}
+    profile = ensure(name="ignored")
+    assert profile["name"] == "Ally"
+    assert profile["email"] == "alice@example.com"
+    assert profiles.requests == ["POST"]
+
+
+def test_repeat_call_is_served_from_cache(profiles):
+    ensure()
+    ensure()
+    assert profiles.requests == ["POST", "PATCH"]
+
+
+def test_concurrent_first_logins_create_one_row(profiles):
+    async def scenario():
+        return await asyncio.gather(*(server.ensure_profile_exists("u-1", "alice@example.com") for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(profiles.rows) == 1
+    assert {r["name"] for r in results} == {"alice"}
+
+
+def test_failed_upsert_returns_none_and_is_not_cached(profiles):
+    profiles.fail = True
+    assert ensure() is None
+    profiles.fail = False
+    assert ensure()["name"] == "alice"
@@ -0,0 +1,116 @@
+"""IdempotencyMiddleware: replay, body mismatch, 5xx not stored, per-user scoping."""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+PATH = "/api/turnkey/sign-message"
+TOKENS = {"Bearer alice-1": "alice", "Bearer alice-2": "alice", "Bearer bob-1": "bob"}
+
+
+@pytest.fixture
+def app_state():
+    state = {"calls": 0, "status": 200, "resolved": 0}
+    app = FastAPI()
+
+    async def handler(request: Request):
+        state["calls"] += 1
+        body = await request.json()
+        return JSONResponse(status_code=state["status"], content={"call": state["calls"], "echo": body})
+
+    async def resolve_user(authorization):
+        state["resolved"] += 1
+        return TOKENS.get(authorization)
+
+    app.add_api_route(PATH, handler, methods=["POST"])
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(), resolve_user=resolve_user)
+    state["client"] = TestClient(app)
+    return state
+
+
+def post(state, token="Bearer alice-1", key="k-1", body=None):
+    return state["client"].post(
+        PATH,
+        json=body or {"message": "hi"},
+        headers={"Authorization": token, "Idempotency-Key": key}
+    )
+
+
+def test_duplicate_is_replayed_without_running_again(app_state):
+    first = post(app_state)
+    second = post(app_state)
+    assert first.json() == second.json() == {"call": 1, "echo": {"message": "hi"}}
+    assert second.headers["idempotent-replayed"] == "true"
+    assert app_state["calls"] == 1
+    # The token's user id was resolved once and reused
+    assert app_state["resolved"] == 1
+
+
+def test_key_reused_with_different_body_is_422(app_state):
+    post(app_state)
+    response = post(app_state, body={"message": "other"})
+    assert response.status_code == 422
+    assert response.json() == {"detail": "IDEMPOTENCY_KEY_REUSED"}
+    assert app_state["calls"] == 1
+
+
+def test_5xx_is_not_stored(app_state):
+    app_state["status"] = 503
+    assert post(app_state).status_code == 503
+    app_state["status"] = 200
+    response = post(app_state)
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+    assert app_state["calls"] == 2
+
+
+def test_refreshed_token_of_same_user_replays(app_state):
+    post(app_state, token="Bearer alice-1")
+    response = post(app_state, token="Bearer alice-2")
+    assert response.headers["idempotent-replayed"] == "true"
+    assert app_state["calls"] == 1
+
+
+def test_other_user_with_same_key_runs_separately(app_state):
+    post(app_state, token="Bearer alice-1")
+    response = post(app_state, token="Bearer bob-1")
+    assert "idempotent-replayed" not in response.headers
+    assert app_state["calls"] == 2
+
+
+def test_unresolved_token_bypasses_the_store(app_state):
+    post(app_state, token="Bearer expired")
+    post(app_state, token="Bearer expired")
+    assert app_state["calls"] == 2
+
+
+def test_request_without_key_always_runs(app_state):
+    client = app_state["client"]
+    client.post(PATH, json={"message": "hi"}, headers={"Authorization": "Bearer alice-1"})
+    client.post(PATH, json={"message": "hi"}, headers={"Authorization": "Bearer alice-1"})
+    assert app_state["calls"] == 2
+    assert app_state["resolved"] == 0
+
+
+def test_temporary_4xx_is_not_stored(app_state):
+    app_state["status"] = 409  # e.g. OPERATION_IN_PROGRESS with Retry-After
+    assert post(app_state).status_code == 409
+    app_state["status"] = 200
+    response = post(app_state)
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+    assert app_state["calls"] == 2
+
+
+def test_deterministic_4xx_is_replayed(app_state):
+    app_state["status"] = 400
+    post(app_state)
+    app_state["status"] = 200
+    response = post(app_state)
+    assert response.status_code == 400
+    assert response.headers["idempotent-replayed"] == "true"
+    assert app_state["calls"] == 1
@@ -0,0 +1,96 @@
+"""RollingCandles must serve the same candles as downsample() over the same samples."""
+
+import time
+import random
+
+import pytest
+
+from index_history import IndexHistory, RollingCandles, bucket_starts, downsample
+
+
+INTERVAL = 60
+
+
+def random_samples(rng, start, count, max_gap):
+    """Time-ordered samples with gaps of up to ``max_gap`` seconds (several empty buckets)."""
+    samples = []
+    ts = float(start)
+    value = 100.0
+    for _ in range(count):
+        ts += rng.uniform(0.5, max_gap)
+        value = max(1.0, value + rng.gauss(0, 2))
+        samples.append((ts, value, rng.uniform(1e5, 1e7)))
+    return samples
+
+
+def expected(samples, periods, now):
+    starts = bucket_starts(periods, INTERVAL, now)
+    return downsample(samples, starts, INTERVAL)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_rolling_matches_downsample_after_every_sample(seed):
+    rng = random.Random(seed)
+    capacity = rng.randint(3, 30)
+    rolling = RollingCandles(INTERVAL, capacity)
+    samples = random_samples(rng, 1_000_000, 150, max_gap=rng.choice([10, 90, 400]))
+
+    for i, sample in enumerate(samples):
+        assert rolling.add(*sample)
+        periods = rng.randint(1, capacity)
+        # "now" at the sample, or later (buckets with no samples yet)
+        now = sample[0] + rng.choice([0, 0, rng.uniform(0, 5 * INTERVAL)])
+        assert rolling.window(periods, now) == expected(samples[:i + 1], periods, now)
+
+
+def test_window_before_any_sample_is_empty():
+    rolling = RollingCandles(INTERVAL, 5)
+    assert rolling.window(3, 1_000_000) == [None, None, None]
+
+
+def test_gap_longer_than_capacity_is_flat():
+    rolling = RollingCandles(INTERVAL, 4)
+    samples = [(1_000_010.0, 10.0, 1.0), (1_000_020.0, 12.0, 1.0), (1_100_005.0, 11.0, 1.0)]
+    for sample in samples:
+        rolling.add(*sample)
+    assert rolling.window(4, 1_100_005) == expected(samples, 4, 1_100_005)
+
+
+def test_out_of_order_sample_is_ignored():
+    rolling = RollingCandles(INTERVAL, 4)
+    rolling.add(1_000_010.0, 10.0, 1.0)
+    assert not rolling.add(1_000_005.0, 99.0, 1.0)
+    assert rolling.window(1, 1_000_010) == expected([(1_000_010.0, 10.0, 1.0)], 1, 1_000_010)
+
+
+def test_window_read_does_not_change_later_candles():
+    rolling = RollingCandles(INTERVAL, 6)
+    samples = [(1_000_010.0, 10.0, 1.0)]
+    rolling.add(*samples[0])
+    # Reading far ahead must not store flat buckets a later sample should land in
+    rolling.window(6, 1_000_300)
+    samples.append((1_000_130.0, 14.0, 2.0))
+    rolling.add(*samples[1])
+    assert rolling.window(6, 1_000_300) == expected(samples, 6, 1_000_300)
+
+
+def test_seeded_history_matches_downsample(tmp_path):
+    rng = random.Random(7)
+    now = time.time()
+    samples = random_samples(rng, now - 40 * INTERVAL, 120, max_gap=45)
+    samples = [s for s in samples if s[0] < now]
+    path = str(tmp_path / "history.db")
+
+    writer = IndexHistory(path)
+    for ts, value, volume in samples:
+        writer.append(ts, {"anchor5": (value, volume)})
+
+    # A fresh instance seeds its rolling windows from the database, then keeps appending
+    history = IndexHistory(path, timeframes=[(INTERVAL, 24)])
+    assert history.candles("anchor5", 24, INTERVAL, now) == expected(samples, 24, now)
+    later = (now + 1, 123.45, 5e6)
+    history.append(later[0], {"anchor5": later[1:]})
+    samples.append(later)
+    assert history.candles("anchor5", 24, INTERVAL, now + 1) == expected(samples, 24, now + 1)
+    # Longer than any rolling window: downsampled from the database
+    assert history.candles("anchor5", 60, INTERVAL, now + 1) == expected(samples, 60, now + 1)
@@ -0,0 +1,85 @@
+"""IndexHistory store: append-only samples, persistence, downsampled candles, chart backfill."""
+
+import time
+
+import pytest
+
+import server
+from index_history import IndexHistory, bucket_starts, downsample, SECONDS_PER_DAY
+
+INTERVAL = 3600
+T0 = 400_000 * INTERVAL  # bucket-aligned, in the past
+
+
+def test_append_ignores_duplicates_and_non_finite_values(tmp_path):
+    history = IndexHistory(str(tmp_path / "history.db"))
+    assert history.append(T0, {"anchor5": (100.0, 1e6), "vibe20": (float("nan"), 1e6), "wave100": (None, 0)}) == 1
+    # Same (index, timestamp): rows are never updated
+    assert history.append(T0, {"anchor5": (999.0, 1e6)}) == 0
+    assert history.samples("anchor5", T0 - 1) == [(T0, 100.0, 1e6)]
+    assert history.samples("vibe20", 0) == []
+
+
+def test_samples_include_the_opening_level(tmp_path):
+    history = IndexHistory(str(tmp_path / "history.db"))
+    for offset, value in ((0, 1.0), (10, 2.0), (20, 3.0), (30, 4.0)):
+        history.append(T0 + offset, {"anchor5": (value, 0.0)})
+    assert [s[1] for s in history.samples("anchor5", T0 + 15, T0 + 30)] == [2.0, 3.0]
+
+
+def test_samples_persist_across_instances(tmp_path):
+    path = str(tmp_path / "history.db")
+    IndexHistory(path).append(T0, {"anchor5": (100.0, 1e6)})
+    reopened = IndexHistory(path)
+    assert reopened.samples("anchor5", T0) == [(T0, 100.0, 1e6)]
+    assert reopened.stats()["samples"] == 1
+
+
+def test_downsample_ohlc_gaps_and_volume():
+    samples = [
+        (T0 + INTERVAL + 10, 100.0, 2.4e6),
+        (T0 + INTERVAL + 20, 104.0, 2.4e6),
+        (T0 + INTERVAL + 30, 98.0, 2.4e6),
+        (T0 + 3 * INTERVAL + 5, 101.0, 4.8e6),
+    ]
+    starts = bucket_starts(4, INTERVAL, T0 + 3 * INTERVAL + 100)
+    assert starts == [T0 + n * INTERVAL for n in range(4)]
+
+    before, first, gap, last = downsample(samples, starts, INTERVAL)
+    assert before is None
+    assert first == {"time": starts[1], "open": 100.0, "high": 104.0, "low": 98.0, "close": 98.0,
+                     "volumeUsd": round(2.4e6 * INTERVAL / SECONDS_PER_DAY)}
+    # No samples: flat at the previous close, no volume
+    assert gap == {"time": starts[2], "open": 98.0, "high": 98.0, "low": 98.0, "close": 98.0, "volumeUsd": 0}
+    # Opens where the previous bucket closed
+    assert (last["open"], last["low"], last["high"], last["close"]) == (98.0, 98.0, 101.0, 101.0)
+
+
+@pytest.fixture
+def recorded(monkeypatch, tmp_path):
+    history = IndexHistory(str(tmp_path / "history.db"))
+    monkeypatch.setattr(server, "index_history", history)
+    return history
+
+
+SCORE = {"value": 100.0, "change_24h": 1.0, "volatility_class": "low"}
+
+
+def test_index_candles_without_history_is_gbm(recorded):
+    candles = server.index_candles("anchor5", SCORE, 24, INTERVAL, seed=1)
+    assert candles == server.generate_gbm_candles(100.0, 1.0, "low", 24, INTERVAL, seed=1)
+
+
+def test_index_candles_backfill_ends_at_first_recorded_level(recorded):
+    now = time.time()
+    starts = bucket_starts(24, INTERVAL, now)
+    for ts, value in ((starts[20] + 1, 110.0), (starts[22] + 1, 120.0)):
+        recorded.append(ts, {"anchor5": (value, 1e6)})
+
+    candles = server.index_candles("anchor5", SCORE, 24, INTERVAL, seed=1)
+
+    assert [c["time"] for c in candles] == starts
+    real = recorded.candles("anchor5", 24, INTERVAL, now)
+    assert candles[20:] == real[20:]
+    assert candles[0]["open"] != candles[20]["open"]
+    assert all(c is not None for c in candles)
@@ -0,0 +1,180 @@
+"""JobRunner/JobStore: persisted progress, resume after restart, cleanup job accounting."""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from job_runner import JobRunner, JobStore, JOB_STATUS_SUCCEEDED, JOB_STATUS_RUNNING
+
+
+async def wait_for_status(runner, job_id, status, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        job = await runner.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} stuck in {(await runner.get(job_id))['status']}")
+
+
+def test_store_round_trip(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.insert("kind", {"a": 1})
+    store.update(job["id"], progress={"page": 3})
+    assert store.get(job["id"])["progress"] == {"page": 3}
+    assert [j["id"] for j in store.unfinished()] == [job["id"]]
+
+
+def test_interrupted_job_resumes_from_its_last_progress(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    seen_progress = []
+
+    async def first_process():
+        reported = asyncio.Event()
+        runner = JobRunner(db_path)
+
+        async def handler(params, progress, report):
+            seen_progress.append(progress)
+            report({"done": 1})
+            reported.set()
+            await asyncio.sleep(60)
+
+        runner.register("count", handler)
+        await runner.start()
+        job = await runner.enqueue("count", {})
+        await reported.wait()
+        await runner.stop()
+        return job["id"]
+
+    job_id = asyncio.run(first_process())
+    assert JobStore(db_path).get(job_id)["status"] == JOB_STATUS_RUNNING
+    assert JobStore(db_path).get(job_id)["progress"] == {"done": 1}
+
+    async def second_process():
+        runner = JobRunner(db_path)
+
+        async def handler(params, progress, report):
+            seen_progress.append(progress)
+            report({"done": progress["done"] + 1})
+            return {"total": progress["done"] + 1}
+
+        runner.register("count", handler)
+        await runner.start()
+        job = await wait_for_status(runner, job_id, JOB_STATUS_SUCCEEDED)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(second_process())
+    assert seen_progress == [{}, {"done": 1}]
+    assert job["result"] == {"total": 2}
+    assert job["progress"] == {"done": 2}
+    assert job["attempts"] == 2
+
+
+@pytest.fixture
+def cleanup_job(monkeypatch):
+    """run_sync_cleanup_job with sync_cleanup_orphans replaced by a recorder."""
+    import server
+
+    calls = []
+
+    async def fake_cleanup(client, start_page, per_page, concurrency, max_pages, dry_run, on_progress):
+        calls.append({"start_page": start_page, "max_pages": max_pages})
+        result = {
+            "start_page": start_page, "next_page": start_page + 1, "pages_fetched": 1, "scanned": 10,
+            "with_profile": 8, "orphans_found": 2, "deleted_auth_users": 1, "failed": 1,
+            "complete": False, "error": None
+        }
+        on_progress(dict(result))
+        return result
+
+    @asynccontextmanager
+    async def no_client():
+        yield None
+
+    monkeypatch.setattr(server, "sync_cleanup_orphans", fake_cleanup)
+    monkeypatch.setattr(server, "shared_supabase_client", no_client)
+    return server.run_sync_cleanup_job, calls
+
+
+def test_cleanup_resume_accumulates_counters_and_page_budget(cleanup_job):
+    run_job, calls = cleanup_job
+    reports = []
+    previous = {
+        "next_page": 4, "pages_fetched": 3, "scanned": 30, "with_profile": 24,
+        "orphans_found": 6, "deleted_auth_users": 4, "failed": 2
+    }
+
+    result = asyncio.run(run_job({"max_pages": 5}, previous, reports.append))
+
+    # Resumes at next_page with what is left of the page budget
+    assert calls == [{"start_page": 4, "max_pages": 2}]
+    assert result["pages_fetched"] == 4
+    assert result["scanned"] == 40
+    assert result["failed"] == 3
+    assert reports[-1]["failed"] == 3
+
+
+def test_cleanup_resume_with_spent_page_budget_fetches_nothing(cleanup_job):
+    run_job, calls = cleanup_job
+    asyncio.run(run_job({"max_pages": 3}, {"next_page": 4, "pages_fetched": 3}, lambda progress: None))
+    assert calls == [{"start_page": 4, "max_pages": 0}]
+
+
+@pytest.fixture
+def delete_job(monkeypatch):
+    """run_delete_user_job with delete_user_everywhere answering from a script."""
+    import server
+    from resilience import UpstreamUnavailableError, REASON_CIRCUIT_OPEN
+
+    outcomes = []
+    sleeps = []
+
+    async def fake_delete(client, user_id):
+        outcome = outcomes.pop(0)
+        if outcome == "refused":
+            raise UpstreamUnavailableError("supabase", REASON_CIRCUIT_OPEN, 3)
+        return outcome
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    @asynccontextmanager
+    async def no_client():
+        yield None
+
+    monkeypatch.setattr(server, "delete_user_everywhere", fake_delete)
+    monkeypatch.setattr(server, "shared_supabase_client", no_client)
+    monkeypatch.setattr(server.asyncio, "sleep", fake_sleep)
+
+    def run_job(*scripted):
+        outcomes.extend(scripted)
+        return asyncio.run(server.run_delete_user_job({"user_id": "u-1"}, {}, lambda progress: None))
+
+    return run_job, sleeps
+
+
+def test_delete_job_retries_refused_calls(delete_job):
+    run_job, sleeps = delete_job
+    result = run_job("refused", ["user_wallets", "profiles", "auth.users"])
+    assert result["deleted_from"] == ["user_wallets", "profiles", "auth.users"]
+    assert sleeps == [3]
+
+
+def test_delete_job_fails_unless_auth_user_is_deleted(delete_job):
+    run_job, _ = delete_job
+    with pytest.raises(Exception, match="auth.users"):
+        run_job(["user_wallets", "profiles"])
+
+
+def test_delete_job_endpoint_rejects_non_uuid_ids(monkeypatch):
+    import server
+    from fastapi.testclient import TestClient
+
+    async def allow(authorization):
+        return None
+
+    monkeypatch.setattr(server, "require_admin", allow)
+    client = TestClient(server.app)
+    response = client.post("/api/admin/jobs/delete-user/not-a-uuid", headers={"Authorization": "Bearer x"})
+    assert response.status_code == 422
@@ -0,0 +1,110 @@
+"""KeyedLock: per-key serialisation, timeouts, and leases abandoned mid-acquire."""
+
+import time
+import asyncio
+
+import pytest
+
+from keyed_locks import KeyedLock, LockTimeout, SqliteLeaseStore
+
+
+class SlowLeaseStore(SqliteLeaseStore):
+    """try_acquire that is still in its thread when the waiter gives up."""
+
+    def __init__(self, db_path, delay):
+        super().__init__(db_path)
+        self.delay = delay
+
+    def try_acquire(self, key, owner):
+        time.sleep(self.delay)
+        return super().try_acquire(key, owner)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_same_key_is_serialised_other_keys_are_not():
+    locks = KeyedLock("user")
+    events = []
+
+    async def worker(key, name):
+        async with locks.hold(key):
+            events.append(f"{name}+")
+            await asyncio.sleep(0.02)
+            events.append(f"{name}-")
+
+    async def scenario():
+        await asyncio.gather(worker("a", "a1"), worker("a", "a2"), worker("b", "b1"))
+
+    run(scenario())
+    a_events = [e for e in events if e.startswith("a")]
+    assert a_events == ["a1+", "a1-", "a2+", "a2-"]
+    assert events.index("b1+") < events.index("a1-")
+    assert locks.stats()["acquired"] == 3
+    assert locks.stats()["contended"] == 1
+
+
+def test_wait_timeout_raises_lock_timeout():
+    locks = KeyedLock("user", wait_timeout=0.05)
+
+    async def scenario():
+        async with locks.hold("a"):
+            with pytest.raises(LockTimeout) as timeout:
+                async with locks.hold("a"):
+                    pass
+            return timeout.value
+
+    error = run(scenario())
+    assert error.status_code == 409
+    assert error.detail == "OPERATION_IN_PROGRESS"
+    assert locks.stats()["timeouts"] == 1
+    assert locks.stats()["waiting"] == 0
+
+
+def test_cancelled_waiter_leaves_the_lock_usable():
+    locks = KeyedLock("user")
+
+    async def scenario():
+        async with locks.hold("a"):
+            waiter = asyncio.create_task(locks.hold("a").__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        async with locks.hold("a"):
+            return True
+
+    assert run(scenario())
+
+
+def test_leases_serialise_separate_instances(tmp_path):
+    path = str(tmp_path / "leases.db")
+    first = KeyedLock("user", store=SqliteLeaseStore(path))
+    second = KeyedLock("user", store=SqliteLeaseStore(path), wait_timeout=0.1)
+
+    async def scenario():
+        async with first.hold("a"):
+            with pytest.raises(LockTimeout):
+                async with second.hold("a"):
+                    pass
+        async with second.hold("a"):
+            return True
+
+    assert run(scenario())
+
+
+def test_lease_taken_after_timeout_is_released(tmp_path):
+    path = str(tmp_path / "leases.db")
+    locks = KeyedLock("user", store=SlowLeaseStore(path, delay=0.2), wait_timeout=0.05)
+    other = SqliteLeaseStore(path)
+
+    async def scenario():
+        with pytest.raises(LockTimeout):
+            async with locks.hold("a"):
+                pass
+        # The abandoned attempt finishes, takes the lease and hands it back
+        await asyncio.sleep(0.4)
+
+    run(scenario())
+    assert other.try_acquire("a", "other-worker")
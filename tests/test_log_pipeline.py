@@ -0,0 +1,55 @@
+"""log_pipeline: deferred JSON encoding, non-blocking enqueue, per-event sampling."""
+
+import queue
+import logging
+
+import pytest
+
+import log_pipeline
+
+
+@pytest.fixture
+def sampling():
+    saved = dict(log_pipeline._sample_rates)
+    yield log_pipeline.configure_sampling
+    log_pipeline.configure_sampling(saved)
+
+
+def test_fast_json_is_compact_and_falls_back_to_str():
+    class Opaque:
+        def __str__(self):
+            return "opaque"
+
+    assert log_pipeline.fast_json({"a": 1, "b": [1, 2], "c": Opaque()}) == '{"a":1,"b":[1,2],"c":"opaque"}'
+
+
+def test_json_message_is_encoded_only_when_formatted():
+    payload = {"event": "x"}
+    message = log_pipeline.JsonMessage(payload)
+    payload["late"] = True  # still visible: nothing was encoded yet
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, "%s", (message,), None)
+    assert record.getMessage() == '{"event":"x","late":true}'
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    handler = log_pipeline.DroppingQueueHandler(queue.Queue(maxsize=2))
+    before = log_pipeline.log_pipeline_stats()["dropped"]
+    for n in range(5):
+        handler.emit(logging.LogRecord("t", logging.INFO, __file__, 1, "msg %d", (n,), None))
+    assert handler.queue.qsize() == 2
+    assert log_pipeline.log_pipeline_stats()["dropped"] - before == 3
+    # Records travel unformatted; the listener formats them
+    assert handler.queue.get_nowait().args == (0,)
+
+
+def test_parse_sample_rates_clamps_and_skips_invalid():
+    assert log_pipeline.parse_sample_rates("a=0.1, b=2,c=x,d=-1,") == {"a": 0.1, "b": 1.0, "d": 0.0}
+
+
+def test_sampling_never_drops_errors(sampling):
+    sampling({"noisy": 0.0, "noisy_failed": 0.0})
+    before = log_pipeline.log_pipeline_stats()["sampled_out"]
+    assert not any(log_pipeline.should_log("noisy") for _ in range(10))
+    assert log_pipeline.log_pipeline_stats()["sampled_out"] - before == 10
+    assert log_pipeline.should_log("noisy_failed")
+    assert log_pipeline.should_log("unconfigured")
@@ -0,0 +1,63 @@
+"""metrics: histogram buckets, exposition format, labels and the HTTP middleware."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from metrics import Counter, Gauge, Histogram, Registry, http_request_seconds
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, op="x")
+
+    assert histogram.render()[2:] == [
+        't_seconds_bucket{op="x",le="0.1"} 1',
+        't_seconds_bucket{op="x",le="1"} 3',
+        't_seconds_bucket{op="x",le="+Inf"} 4',
+        't_seconds_count{op="x"} 4',
+        't_seconds_sum{op="x"} 6.05',
+    ]
+    assert histogram.snapshot(op="x") == {"count": 4, "sum": pytest.approx(6.05)}
+    assert histogram.snapshot(op="y") is None
+
+
+def test_labels_must_match_declaration():
+    counter = Counter("t_total", "test", ("upstream",))
+    with pytest.raises(ValueError):
+        counter.inc(upstream="a", extra="b")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_registry_renders_help_type_and_escaped_labels():
+    registry = Registry()
+    counter = registry.register(Counter("t_total", "Things", ("name",)))
+    gauge = registry.register(Gauge("t_depth", "Depth"))
+    counter.inc(2, name='say "hi"\n')
+    with gauge.track_inprogress():
+        assert gauge.value() == 1
+    assert registry.render() == (
+        "# HELP t_total Things\n"
+        "# TYPE t_total counter\n"
+        't_total{name="say \\"hi\\"\\n"} 2\n'
+        "# HELP t_depth Depth\n"
+        "# TYPE t_depth gauge\n"
+        "t_depth 0\n"
+    )
+    with pytest.raises(ValueError):
+        registry.register(Counter("t_total", "again"))
+
+
+def test_middleware_records_route_template_and_endpoint_exposes_it():
+    client = TestClient(server.app)
+    before = http_request_seconds.snapshot(method="GET", route="/api/health", status="200")
+    client.get("/api/health")
+    after = http_request_seconds.snapshot(method="GET", route="/api/health", status="200")
+    assert after["count"] == (before["count"] if before else 0) + 1
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_seconds_count{method="GET",route="/api/health",status="200"}' in response.text
@@ -0,0 +1,67 @@
+"""bench/micro.py: every case runs, the baseline covers them, regressions fail the run."""
+
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).resolve().parent.parent / "bench"
+sys.path.insert(0, str(BENCH_DIR))
+
+import micro  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def cases():
+    return micro.build_cases()
+
+
+def test_every_case_runs(cases):
+    for name, func in cases:
+        func()
+
+
+def test_stored_baseline_covers_every_case(cases):
+    baseline = json.loads(micro.DEFAULT_BASELINE.read_text())
+    assert {name for name, _ in cases} <= set(baseline["cases"])
+
+
+def test_measure_reports_seconds_per_call():
+    calls = []
+    seconds = micro.measure(lambda: calls.append(1), min_time=0.01, repeats=3)
+    assert 0 < seconds < 0.01
+    assert len(calls) > 3
+
+
+def run_main(monkeypatch, baseline, timings, *args):
+    """micro.main() over two fake cases whose measurements come from ``timings``."""
+    monkeypatch.setattr(micro, "build_cases", lambda: [("a", None), ("b", None)])
+    monkeypatch.setattr(micro, "measure", lambda func, min_time, repeats: timings.pop(0))
+    monkeypatch.setattr(sys, "argv", ["micro.py", "--baseline", str(baseline), *args])
+    return micro.main()
+
+
+def test_save_then_compare(monkeypatch, tmp_path, capsys):
+    baseline = tmp_path / "micro.json"
+    # --save keeps the median of 1 + --confirm runs per case
+    assert run_main(monkeypatch, baseline, [1.0, 3.0, 2.0, 1.0, 1.0, 1.0], "--save") == 0
+    saved = json.loads(baseline.read_text())
+    assert saved["cases"] == {"a": {"seconds": 2.0}, "b": {"seconds": 1.0}}
+    assert saved["environment"] == micro.environment()
+
+    assert run_main(monkeypatch, baseline, [2.2, 1.1]) == 0
+
+    # Slow on the first run, fine when re-measured: not a regression
+    assert run_main(monkeypatch, baseline, [3.0, 2.1, 1.0]) == 0
+
+    # Still slow after --confirm re-measurements
+    assert run_main(monkeypatch, baseline, [2.0, 2.0, 1.9, 1.8]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_threshold_is_configurable(monkeypatch, tmp_path):
+    baseline = tmp_path / "micro.json"
+    baseline.write_text(json.dumps({"environment": micro.environment(), "cases": {"a": {"seconds": 1.0}}}))
+    assert run_main(monkeypatch, baseline, [1.4, 1.0], "--threshold", "0.5") == 0
+    assert run_main(monkeypatch, baseline, [1.4, 1.4, 1.4, 1.0], "--threshold", "0.1") == 1
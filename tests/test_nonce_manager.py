@@ -0,0 +1,213 @@
+"""NonceManager allocation and build_transaction's nonce handling."""
+
+import asyncio
+
+import pytest
+
+import tx_builder
+from nonce_manager import NonceManager
+
+
+class FakeRpc:
+    """eth_getTransactionCount from a settable pending count."""
+
+    def __init__(self, pending: int = 0):
+        self.pending = pending
+        self.calls = 0
+
+    async def call(self, method, params=None):
+        assert method == "eth_getTransactionCount"
+        self.calls += 1
+        return hex(self.pending)
+
+
+ADDRESS = "0x" + "ab" * 20
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reserve_seeds_from_chain_and_counts_up():
+    rpc = FakeRpc(pending=7)
+    manager = NonceManager(rpc)
+
+    async def scenario():
+        first = await manager.reserve(ADDRESS)
+        batch = await manager.reserve(ADDRESS.upper().replace("0X", "0x"), 3)
+        return first, batch
+
+    assert run(scenario()) == ([7], [8, 9, 10])
+    assert rpc.calls == 1
+
+
+def test_concurrent_reservations_never_collide():
+    manager = NonceManager(FakeRpc())
+
+    async def scenario():
+        return await asyncio.gather(*(manager.reserve(ADDRESS, 2) for _ in range(20)))
+
+    nonces = [n for batch in run(scenario()) for n in batch]
+    assert sorted(nonces) == list(range(40))
+
+
+def test_release_fills_gap_before_advancing():
+    manager = NonceManager(FakeRpc())
+
+    async def scenario():
+        await manager.reserve(ADDRESS, 4)               # 0..3
+        released = await manager.release(ADDRESS, [1])
+        return released, await manager.reserve(ADDRESS, 2)
+
+    assert run(scenario()) == ([1], [1, 4])
+
+
+def test_release_of_newest_lowers_counter_and_ignores_unknown():
+    manager = NonceManager(FakeRpc())
+
+    async def scenario():
+        await manager.reserve(ADDRESS, 3)               # 0..2
+        released = await manager.release(ADDRESS, [2, 1, 9])
+        return released, manager.snapshot(ADDRESS)
+
+    released, snapshot = run(scenario())
+    assert released == [1, 2]
+    assert snapshot == {"next_nonce": 1, "released": []}
+
+
+def test_idle_resync_only_moves_forward():
+    rpc = FakeRpc(pending=0)
+    manager = NonceManager(rpc, resync_after=0)
+
+    async def scenario():
+        await manager.reserve(ADDRESS, 3)               # 0..2 signed, not broadcast yet
+        # Chain still reports 0 pending: those nonces must not be handed out again
+        behind = await manager.reserve(ADDRESS)
+        # Transactions sent from elsewhere: skip past them
+        rpc.pending = 10
+        ahead = await manager.reserve(ADDRESS)
+        return behind, ahead
+
+    assert run(scenario()) == ([3], [10])
+    assert manager.metrics()["resyncs"] == 2
+
+
+def test_resync_drops_released_nonces_the_chain_has_used():
+    rpc = FakeRpc(pending=0)
+    manager = NonceManager(rpc)
+
+    async def scenario():
+        await manager.reserve(ADDRESS, 5)               # 0..4
+        await manager.release(ADDRESS, [1, 3])
+        rpc.pending = 2                                 # nonce 1 was used elsewhere
+        await manager.resync(ADDRESS)
+        return manager.snapshot(ADDRESS)
+
+    assert run(scenario()) == {"next_nonce": 5, "released": [3]}
+
+
+def test_disabled_without_rpc():
+    assert not NonceManager(None).enabled
+
+
+@pytest.fixture
+def managed_nonces(monkeypatch):
+    manager = NonceManager(FakeRpc(pending=5))
+    monkeypatch.setattr(tx_builder, "nonce_manager", manager)
+    return manager
+
+
+@pytest.mark.parametrize("fields", [
+    {"to": "0x1234"},
+    {"to": "0x" + "cd" * 20, "data": "0xzz"},
+    {"to": "0x" + "cd" * 20, "value": "-1"},
+    {"to": "0x" + "cd" * 20, "tx_type": 7},
+    {"to": "0x" + "cd" * 20, "access_list": [{"address": "0x" + "cd" * 20, "storageKeys": ["0x01"]}]},
+])
+def test_invalid_fields_reserve_no_nonce(managed_nonces, fields):
+    with pytest.raises(ValueError):
+        run(tx_builder.build_transaction(sender=ADDRESS, **fields))
+    assert managed_nonces.snapshot(ADDRESS) is None
+    assert managed_nonces.metrics()["reserved"] == 0
+
+
+def test_valid_transaction_takes_next_nonce(managed_nonces):
+    tx = run(tx_builder.build_transaction(sender=ADDRESS, to="0x" + "cd" * 20, value="0x10"))
+    assert (tx.nonce, tx.value) == (5, 16)
+    assert managed_nonces.snapshot(ADDRESS) == {"next_nonce": 6, "released": []}
+
+
+def test_explicit_nonce_is_observed(managed_nonces):
+    async def scenario():
+        await managed_nonces.reserve(ADDRESS)           # seeds the address at 5
+        tx = await tx_builder.build_transaction(sender=ADDRESS, to="0x" + "cd" * 20, nonce=9)
+        return tx.nonce, managed_nonces.snapshot(ADDRESS)
+
+    assert run(scenario()) == (9, {"next_nonce": 10, "released": []})
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """sign_turnkey_batch against a fake wallet; each transaction's signing waits on its own event."""
+    import server
+
+    manager = NonceManager(FakeRpc(pending=5))
+    gates = {}
+    entered = []
+
+    async def user_and_wallet(authorization):
+        return {"id": "user-1"}, {"turnkey_sub_org_id": "sub-org-1", "wallet_address": ADDRESS}
+
+    async def unsigned(transaction, sender):
+        return f"0x{transaction.nonce:02x}", None
+
+    async def sign(sub_org_id, wallet_address, unsigned_transaction, transaction_type):
+        entered.append(unsigned_transaction)
+        await gates.setdefault(unsigned_transaction, asyncio.Event()).wait()
+        return {"signedTransaction": unsigned_transaction + "ff"}
+
+    monkeypatch.setattr(server, "get_user_and_wallet", user_and_wallet)
+    monkeypatch.setattr(server, "build_unsigned_transaction", unsigned)
+    monkeypatch.setattr(server, "sign_transaction", sign)
+    monkeypatch.setattr(server, "nonce_manager", manager)
+
+    def request(count):
+        item = server.SignBatchItem(transaction=server.SignTransactionRequest(to="0x" + "cd" * 20))
+        return server.SignBatchRequest(items=[item] * count)
+
+    return server, manager, gates, entered, request
+
+
+def test_batch_cancelled_mid_signing_releases_unsigned_nonces(batch):
+    server, manager, gates, entered, request = batch
+
+    async def scenario():
+        gates["0x05"] = asyncio.Event()
+        gates["0x05"].set()                             # first transaction signs
+        task = asyncio.create_task(server.sign_turnkey_batch(request(3), authorization="Bearer t"))
+        while len(entered) < 3:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        task.cancel()                                   # e.g. the request deadline
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return manager.snapshot(ADDRESS), await manager.reserve(ADDRESS)
+
+    snapshot, next_nonce = run(scenario())
+    # 5 was signed; 6 and 7 went back, so the wallet continues at 6
+    assert snapshot == {"next_nonce": 6, "released": []}
+    assert next_nonce == [6]
+
+
+def test_batch_error_before_signing_releases_all_nonces(batch, monkeypatch):
+    server, manager, gates, entered, request = batch
+
+    def broken_copy(self, *args, **kwargs):
+        raise RuntimeError("copy failed")
+
+    monkeypatch.setattr(server.SignTransactionRequest, "model_copy", broken_copy)
+    with pytest.raises(server.HTTPException) as failed:
+        run(server.sign_turnkey_batch(request(2), authorization="Bearer t"))
+    assert failed.value.status_code == 500
+    assert manager.snapshot(ADDRESS) == {"next_nonce": 5, "released": []}
+    assert entered == []
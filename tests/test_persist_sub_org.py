@@ -0,0 +1,77 @@
+"""persist_otp_sub_org: retries upstream refusals as well as transport errors."""
+
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from resilience import UpstreamUnavailableError, REASON_BULKHEAD_FULL
+
+
+class FakeSupabase:
+    """Answers each post with the next outcome: an exception to raise or a status code."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = 0
+
+    async def post(self, url, json=None, headers=None):
+        self.posts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, request=httpx.Request("POST", url))
+
+
+class FakeJournal:
+    def __init__(self):
+        self.cleared = []
+
+    def clear(self, user_id, kind):
+        self.cleared.append((user_id, kind))
+
+
+@pytest.fixture
+def persist(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    journal = FakeJournal()
+    monkeypatch.setattr(server.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(server, "creation_journal", journal)
+
+    def run(outcomes):
+        supabase = FakeSupabase(outcomes)
+        monkeypatch.setattr(server, "get_supabase_client", lambda: supabase)
+        persisted = asyncio.run(server.persist_otp_sub_org("user-1", "sub-org-1"))
+        return persisted, supabase.posts, sleeps, journal.cleared
+
+    return run
+
+
+def test_refused_call_is_retried_after_retry_after(persist):
+    refused = UpstreamUnavailableError("supabase", REASON_BULKHEAD_FULL, 5)
+    persisted, posts, sleeps, cleared = persist([refused, 201])
+    assert persisted
+    assert posts == 2
+    assert sleeps == [5]  # max(retry_after, 2 ** 0)
+    assert cleared == [("user-1", server.KIND_SUB_ORG)]
+
+
+def test_backoff_wins_over_a_short_retry_after(persist):
+    refused = UpstreamUnavailableError("supabase", REASON_BULKHEAD_FULL, 1)
+    persisted, posts, sleeps, _ = persist([httpx.ConnectError("down"), refused, 204])
+    assert persisted
+    assert sleeps == [1, 2]
+
+
+def test_gives_up_after_all_attempts(persist):
+    refused = UpstreamUnavailableError("supabase", REASON_BULKHEAD_FULL, 1)
+    persisted, posts, sleeps, cleared = persist([refused] * server.SUB_ORG_PERSIST_ATTEMPTS)
+    assert not persisted
+    assert posts == server.SUB_ORG_PERSIST_ATTEMPTS
+    assert len(sleeps) == server.SUB_ORG_PERSIST_ATTEMPTS - 1
+    assert cleared == []
@@ -0,0 +1,105 @@
+"""CircuitBreaker state transitions and the bulkhead's refusal."""
+
+import time
+
+import pytest
+
+from resilience import (
+    CircuitBreaker,
+    Bulkhead,
+    UpstreamUnavailableError,
+    REASON_CIRCUIT_OPEN,
+    STATE_CLOSED,
+    STATE_OPEN,
+    STATE_HALF_OPEN,
+)
+
+
+def make_breaker(**overrides):
+    options = dict(window_size=10, min_calls=4, failure_threshold=0.5, open_seconds=0.05)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+def trip(breaker):
+    for failed in (True, True, False, True):
+        breaker.before_call()
+        breaker.record(failed)
+
+
+def test_stays_closed_below_min_calls_and_threshold():
+    breaker = make_breaker()
+    for failed in (True, True, True):
+        breaker.record(failed)
+    assert breaker.state == STATE_CLOSED  # only 3 calls seen
+
+    breaker = make_breaker()
+    for failed in (True, False, False, False, True, False):
+        breaker.record(failed)
+    assert breaker.state == STATE_CLOSED  # 33% < 50%
+
+
+def test_opens_at_threshold_and_refuses_calls():
+    breaker = make_breaker(open_seconds=30)
+    trip(breaker)
+    assert breaker.state == STATE_OPEN
+
+    with pytest.raises(UpstreamUnavailableError) as refused:
+        breaker.before_call()
+    assert refused.value.status_code == 503
+    assert refused.value.reason == REASON_CIRCUIT_OPEN
+    assert 1 <= refused.value.retry_after <= 30
+    assert breaker.snapshot()["times_opened"] == 1
+
+
+def test_cancelled_calls_give_no_verdict():
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(None)
+    trip(breaker)
+    assert breaker.snapshot()["window_calls"] == 4
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.state == STATE_HALF_OPEN
+
+    assert breaker.before_call() is True       # the probe
+    with pytest.raises(UpstreamUnavailableError):
+        breaker.before_call()                  # everyone else waits for it
+    breaker.record(False, probe=True)
+
+    assert breaker.state == STATE_CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.record(True, probe=True)
+    assert breaker.state == STATE_OPEN
+    assert breaker.snapshot()["times_opened"] == 2
+
+
+def test_cancelled_probe_frees_the_probe_slot():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.before_call() is True
+    breaker.record(None, probe=True)
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.before_call() is True
+
+
+def test_bulkhead_refuses_once_full():
+    bulkhead = Bulkhead("test", max_concurrent=2, max_wait=0.01)
+    assert bulkhead.acquire() and bulkhead.acquire()
+    assert not bulkhead.acquire()
+    assert bulkhead.in_use == 2
+    bulkhead.release()
+    assert bulkhead.acquire()
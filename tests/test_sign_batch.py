@@ -0,0 +1,92 @@
+"""sign_turnkey_batch: chunked message activities, cache reuse, independent failures, order."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from nonce_manager import NonceManager
+
+WALLET = {"turnkey_sub_org_id": "sub-org-1", "wallet_address": "0x" + "ab" * 20}
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    state = {"payload_calls": [], "signed_txs": []}
+
+    async def user_and_wallet(authorization):
+        return {"id": "user-1"}, WALLET
+
+    async def fake_sign_raw_payloads(sub_org_id, wallet_address, payloads, encoding, hash_function):
+        state["payload_calls"].append(list(payloads))
+        return [{"r": p[:8], "s": "s", "v": "00"} for p in payloads]
+
+    async def fake_unsigned(transaction, sender):
+        return transaction.unsigned_transaction, None
+
+    async def fake_sign_transaction(sub_org_id, wallet_address, unsigned_transaction, transaction_type):
+        if unsigned_transaction == "0xbad":
+            raise RuntimeError("rejected")
+        state["signed_txs"].append(unsigned_transaction)
+        return {"signedTransaction": unsigned_transaction + "ff"}
+
+    monkeypatch.setattr(server, "get_user_and_wallet", user_and_wallet)
+    monkeypatch.setattr(server, "sign_raw_payloads", fake_sign_raw_payloads)
+    monkeypatch.setattr(server, "build_unsigned_transaction", fake_unsigned)
+    monkeypatch.setattr(server, "sign_transaction", fake_sign_transaction)
+    monkeypatch.setattr(server, "nonce_manager", NonceManager(None))
+    monkeypatch.setattr(server, "signature_cache", {})
+    monkeypatch.setattr(server, "SIGNATURE_CACHE_TTL", 60)
+    return state
+
+
+def run_batch(items, **options):
+    request = server.SignBatchRequest(items=[server.SignBatchItem(**item) for item in items], **options)
+    return asyncio.run(server.sign_turnkey_batch(request, authorization="Bearer t"))
+
+
+def tx(unsigned):
+    return {"transaction": {"unsigned_transaction": unsigned}}
+
+
+def test_messages_are_signed_in_chunked_activities(batch, monkeypatch):
+    monkeypatch.setattr(server, "SIGN_BATCH_PAYLOADS_PER_ACTIVITY", 3)
+    response = run_batch([{"message": f"m{n}"} for n in range(7)])
+    assert response["succeeded"] == 7
+    assert [len(call) for call in batch["payload_calls"]] == [3, 3, 1]
+    hashes = [server.personal_sign_hash(f"m{n}") for n in range(7)]
+    assert [r["r"] for r in response["results"]] == [h[:8] for h in hashes]
+
+
+def test_cached_signatures_are_reused(batch):
+    run_batch([{"message": "hello"}])
+    response = run_batch([{"message": "hello"}, {"message": "world"}])
+    assert response["succeeded"] == 2
+    assert batch["payload_calls"][1] == [server.personal_sign_hash("world")]
+
+
+def test_items_fail_independently_and_keep_their_order(batch):
+    response = run_batch([tx("0x01"), {"message": "hi"}, tx("0xbad"), tx("0x02")])
+    assert [r["index"] for r in response["results"]] == [0, 1, 2, 3]
+    assert [r["success"] for r in response["results"]] == [True, True, False, True]
+    assert response["results"][2]["error"] == "rejected"
+    assert response["failed"] == 1 and not response["success"]
+    assert sorted(batch["signed_txs"]) == ["0x01", "0x02"]
+
+
+@pytest.mark.parametrize("items", [
+    [],
+    [{"message": "a", "transaction": {"unsigned_transaction": "0x01"}}],
+    [{}],
+])
+def test_invalid_batches_are_rejected(batch, items):
+    with pytest.raises(HTTPException) as rejected:
+        run_batch(items)
+    assert rejected.value.status_code == 400
+
+
+def test_too_many_items_is_rejected(batch):
+    with pytest.raises(HTTPException) as rejected:
+        run_batch([{"message": "m"}] * (server.SIGN_BATCH_MAX_ITEMS + 1))
+    assert rejected.value.status_code == 400
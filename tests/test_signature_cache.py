@@ -0,0 +1,118 @@
+"""sign_message_hash: per-user signature cache and shared in-flight activities."""
+
+import asyncio
+
+import pytest
+
+import server
+
+SUB_ORG, WALLET, HASH = "sub-org-1", "0x" + "ab" * 20, "aa" * 32
+
+
+@pytest.fixture
+def signer(monkeypatch):
+    state = {"calls": [], "gate": None, "error": None}
+
+    async def fake_sign_raw_payload(sub_org_id, wallet_address, payload, encoding, hash_function, activity_id=None):
+        state["calls"].append((payload, activity_id))
+        if state["gate"] is not None:
+            await state["gate"].wait()
+        if state["error"] is not None:
+            raise state["error"]
+        return {"r": f"r-{len(state['calls'])}", "s": "s", "v": "00"}
+
+    monkeypatch.setattr(server, "sign_raw_payload", fake_sign_raw_payload)
+    monkeypatch.setattr(server, "signature_cache", {})
+    monkeypatch.setattr(server, "signature_inflight", {})
+    monkeypatch.setattr(server, "SIGNATURE_CACHE_TTL", 60)
+    return state
+
+
+def sign(user_id="alice", message_hash=HASH, activity_id=None):
+    return server.sign_message_hash(user_id, SUB_ORG, WALLET, message_hash, activity_id)
+
+
+def test_repeat_is_answered_from_cache(signer):
+    async def scenario():
+        return await sign(), await sign()
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert len(signer["calls"]) == 1
+
+
+def test_cache_is_per_user(signer):
+    async def scenario():
+        return await sign("alice"), await sign("bob")
+
+    alice, bob = asyncio.run(scenario())
+    assert alice != bob
+    assert len(signer["calls"]) == 2
+
+
+def test_concurrent_identical_requests_share_one_activity(signer):
+    async def scenario():
+        signer["gate"] = asyncio.Event()
+        tasks = [asyncio.create_task(sign()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        signer["gate"].set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+    assert len({r["r"] for r in results}) == 1
+    assert len(signer["calls"]) == 1
+
+
+def test_failure_reaches_waiters_and_is_not_cached(signer):
+    async def scenario():
+        signer["gate"] = asyncio.Event()
+        signer["error"] = RuntimeError("turnkey down")
+        tasks = [asyncio.create_task(sign()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        signer["gate"].set()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        signer["error"] = None
+        return outcomes, await sign()
+
+    outcomes, retry = asyncio.run(scenario())
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+    assert retry["r"] == "r-2"
+
+
+def test_cancelled_owner_lets_a_waiter_sign(signer):
+    async def scenario():
+        signer["gate"] = asyncio.Event()
+        owner = asyncio.create_task(sign())
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(sign())
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        await asyncio.sleep(0.01)
+        signer["gate"].set()
+        return await waiter
+
+    assert asyncio.run(scenario())["r"] == "r-2"
+
+
+def test_resumed_activity_bypasses_the_cache(signer):
+    async def scenario():
+        await sign()
+        resumed = await sign(activity_id="act-9")
+        return resumed, await sign()
+
+    resumed, cached = asyncio.run(scenario())
+    assert signer["calls"] == [(HASH, None), (HASH, "act-9")]
+    assert cached["r"] == "r-1"  # the resumed signature was not cached under this hash
+    assert resumed["r"] == "r-2"
+
+
+def test_expired_and_invalidated_entries_sign_again(signer, monkeypatch):
+    async def scenario():
+        await sign()
+        server.invalidate_signature_cache("alice")
+        await sign()
+        monkeypatch.setattr(server, "SIGNATURE_CACHE_TTL", 0)
+        await sign()
+
+    asyncio.run(scenario())
+    assert len(signer["calls"]) == 3
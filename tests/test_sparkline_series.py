@@ -0,0 +1,80 @@
+"""index_series must reproduce calculate_index_scores' weighting along the 7-day sparklines."""
+
+import random
+
+import pytest
+
+from server import calculate_index_scores
+from sparkline_series import (
+    INDEX_PRICE_MULTIPLIERS,
+    SPARKLINE_INTERVAL,
+    SPARKLINE_POINTS,
+    index_series,
+    sparkline_matrix,
+)
+
+
+def make_market(count=150, seed=3):
+    """Coins whose sparkline ends at their current price."""
+    rng = random.Random(seed)
+    coins = []
+    for n in range(count):
+        price = rng.uniform(0.01, 5000)
+        path = [price * (1 + rng.uniform(-0.2, 0.2)) for _ in range(SPARKLINE_POINTS - 1)] + [price]
+        coins.append({
+            "id": f"coin-{n}",
+            "symbol": f"c{n}",
+            "current_price": price,
+            "market_cap": rng.uniform(1e6, 1e12),
+            "total_volume": rng.uniform(1e4, 1e10),
+            "price_change_percentage_24h": rng.uniform(-20, 20),
+            "sparkline_in_7d": {"price": path},
+        })
+    coins.append({**coins[0], "id": "tether", "symbol": "usdt", "market_cap": 1e13})
+    return coins
+
+
+@pytest.fixture(scope="module")
+def scores():
+    return calculate_index_scores(make_market())
+
+
+def test_newest_point_is_the_index_score(scores):
+    series = index_series(scores, end_ts=1_000_000)
+    for name in INDEX_PRICE_MULTIPLIERS:
+        assert series[name][-1][1] == pytest.approx(scores[name]["value"], abs=0.01)
+
+
+def test_every_point_uses_the_same_weights(scores):
+    series = index_series(scores, end_ts=1_000_000)
+    for name, multiplier in INDEX_PRICE_MULTIPLIERS.items():
+        coins = scores[name]["coins"]
+        assert len(series[name]) == SPARKLINE_POINTS
+        for row in (0, 50, SPARKLINE_POINTS - 2):
+            expected = multiplier * sum(c["sparkline_in_7d"]["price"][row] for c in coins)
+            assert series[name][row][1] == pytest.approx(expected)
+
+
+def test_timestamps_are_hourly_ending_now_and_volume_is_current(scores):
+    series = index_series(scores, end_ts=1_000_000)
+    samples = series["vibe20"]
+    assert samples[-1][0] == 1_000_000
+    assert samples[0][0] == 1_000_000 - (SPARKLINE_POINTS - 1) * SPARKLINE_INTERVAL
+    volume = sum(c["total_volume"] for c in scores["vibe20"]["coins"])
+    assert [s[2] for s in samples] == pytest.approx([volume] * SPARKLINE_POINTS)
+
+
+def test_missing_short_and_gappy_sparklines():
+    coins = [
+        {"id": "a", "current_price": 7.0},                                           # no sparkline: flat
+        {"id": "b", "current_price": 3.0, "sparkline_in_7d": {"price": [1.0, 2.0]}},  # short: padded
+        {"id": "c", "current_price": 5.0, "sparkline_in_7d": {"price": [4.0, None, float("nan"), 5.0]}},
+    ]
+    matrix = sparkline_matrix(coins, points=4)
+    assert matrix[:, 0].tolist() == [7.0] * 4
+    assert matrix[:, 1].tolist() == [1.0, 1.0, 1.0, 2.0]
+    assert matrix[:, 2].tolist() == [4.0, 4.0, 4.0, 5.0]
+
+
+def test_no_scores_no_series():
+    assert index_series({}, end_ts=0) == {}
@@ -0,0 +1,55 @@
+"""startup_report: -X importtime parsing and the summarised import report."""
+
+import ast
+from pathlib import Path
+
+import startup_report
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     _leaf
+import time:       200 |        300 |   mid
+import time:        50 |         50 |   other
+import time:       400 |        750 | server
+import time:        30 |         30 | unrelated
+"""
+
+
+def test_parse_importtime_assigns_depth_and_root():
+    modules = startup_report.parse_importtime(IMPORTTIME)
+    by_name = {m["module"]: m for m in modules}
+    assert [m["module"] for m in modules] == ["_leaf", "mid", "other", "server", "unrelated"]
+    assert by_name["_leaf"]["depth"] == 2
+    assert by_name["mid"]["depth"] == 1
+    assert by_name["server"]["depth"] == 0
+    assert {by_name[name]["root"] for name in ("_leaf", "mid", "other", "server")} == {"server"}
+    assert by_name["unrelated"]["root"] == "unrelated"
+    assert by_name["server"]["self_us"] == 400 and by_name["server"]["cumulative_us"] == 750
+
+
+def test_parse_importtime_ignores_unrelated_lines():
+    assert startup_report.parse_importtime("warning: something\nimport time: x | y | z\n") == []
+
+
+def test_collect_import_report_in_fresh_interpreter():
+    report = startup_report.collect_import_report("json", top=3)
+    assert report["target"] == "json"
+    assert report["module_count"] >= 1
+    assert report["import_total_ms"] > 0
+    assert len(report["top_self"]) <= 3
+    assert all(m["depth"] == 1 for m in report["top_cumulative"])
+    text = startup_report.format_report(report)
+    assert text.startswith("import json:")
+
+
+def test_handlers_do_not_import_at_request_time():
+    # Handler-local imports pay import latency (and the import lock) on the first request
+    source = Path(startup_report.ROOT_DIR / "server.py").read_text()
+    nested = [
+        node.lineno
+        for func in ast.walk(ast.parse(source))
+        if isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef))
+        for node in ast.walk(func)
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+    assert nested == []
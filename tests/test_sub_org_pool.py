@@ -0,0 +1,137 @@
+"""SubOrgPool.claim: empty pool, attach failures resumed, stale claims swept."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+import sub_org_pool
+from sub_org_pool import SubOrgPool, SubOrgAttachPending, ATTACH_MAX_ATTEMPTS
+
+
+class FakeTurnkey:
+    def __init__(self):
+        self.created = 0
+        self.attach_results = []  # popped per attach; True when empty
+        self.attached = []
+
+    async def create(self):
+        self.created += 1
+        return f"sub-org-{self.created}", f"delegated-{self.created}"
+
+    async def attach(self, sub_org_id, delegated_user_id, supabase_user_id, user_email, user_name):
+        self.attached.append((sub_org_id, supabase_user_id))
+        return self.attach_results.pop(0) if self.attach_results else True
+
+
+def make_pool(tmp_path, turnkey, size=2):
+    pool = SubOrgPool(str(tmp_path / "pool.db"), size, 0, turnkey.create, turnkey.attach)
+    for _ in range(size):
+        sub_org_id, delegated = asyncio.run(turnkey.create())
+        pool._add(sub_org_id, delegated)
+    return pool
+
+
+def claim(pool, user="user-1"):
+    return asyncio.run(pool.claim(user, f"{user}@example.com", user))
+
+
+def statuses(pool):
+    return dict(pool.conn.execute("SELECT sub_org_id, status FROM sub_org_pool"))
+
+
+def test_empty_pool_returns_none(tmp_path):
+    turnkey = FakeTurnkey()
+    pool = make_pool(tmp_path, turnkey, size=0)
+    pool.target_size = 1  # enabled, nothing in it
+    assert claim(pool) is None
+    assert pool.metrics()["misses"] == 1
+
+
+def test_claim_attaches_and_assigns(tmp_path):
+    turnkey = FakeTurnkey()
+    pool = make_pool(tmp_path, turnkey)
+    assert claim(pool) == "sub-org-1"
+    assert statuses(pool)["sub-org-1"] == "assigned"
+    # Asked again before the sub-org id was persisted: same sub-org, no attach
+    assert claim(pool) == "sub-org-1"
+    assert len(turnkey.attached) == 1
+
+
+def test_attach_failure_keeps_the_sub_org_for_the_next_attempt(tmp_path):
+    turnkey = FakeTurnkey()
+    pool = make_pool(tmp_path, turnkey)
+    turnkey.attach_results = [False]
+
+    with pytest.raises(SubOrgAttachPending) as pending:
+        claim(pool)
+    assert pending.value.sub_org_id == "sub-org-1"
+    assert statuses(pool)["sub-org-1"] == "claimed"
+
+    # The retry resumes the same sub-org instead of taking (or creating) another
+    assert claim(pool) == "sub-org-1"
+    assert turnkey.attached == [("sub-org-1", "user-1"), ("sub-org-1", "user-1")]
+    assert statuses(pool) == {"sub-org-1": "assigned", "sub-org-2": "available"}
+    # Another user is not handed the reserved sub-org
+    assert claim(pool, "user-2") == "sub-org-2"
+
+
+def test_attach_exception_counts_as_failure(tmp_path):
+    turnkey = FakeTurnkey()
+    pool = make_pool(tmp_path, turnkey)
+
+    async def broken_attach(*args):
+        raise RuntimeError("turnkey down")
+
+    pool.attach_fn = broken_attach
+    with pytest.raises(SubOrgAttachPending):
+        claim(pool)
+    assert pool.metrics()["attach_failures"] == 1
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    turnkey = FakeTurnkey()
+    pool = make_pool(tmp_path, turnkey)
+    turnkey.attach_results = [False] * ATTACH_MAX_ATTEMPTS
+
+    for _ in range(ATTACH_MAX_ATTEMPTS):
+        with pytest.raises(SubOrgAttachPending):
+            claim(pool)
+    assert statuses(pool)["sub-org-1"] == "failed"
+    assert pool.metrics()["abandoned"] == 1
+    # The next attempt moves on to another pooled sub-org
+    assert claim(pool) == "sub-org-2"
+
+
+def test_sweep_retries_stale_claims(tmp_path, monkeypatch):
+    turnkey = FakeTurnkey()
+    pool = make_pool(tmp_path, turnkey)
+    # A claim whose process died mid-attach
+    pool._take("user-1", "user-1@example.com", "user-1")
+
+    asyncio.run(pool._sweep())
+    assert turnkey.attached == []  # not stale yet
+
+    monkeypatch.setattr(sub_org_pool, "STALE_CLAIM_SECONDS", -1)
+    asyncio.run(pool._sweep())
+    assert turnkey.attached == [("sub-org-1", "user-1")]
+    assert statuses(pool)["sub-org-1"] == "assigned"
+    assert claim(pool) == "sub-org-1"
+
+
+def test_old_schema_is_migrated(tmp_path):
+    path = str(tmp_path / "pool.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE sub_org_pool (sub_org_id TEXT PRIMARY KEY, delegated_user_id TEXT, status TEXT NOT NULL, "
+        "created_at REAL NOT NULL, claimed_by TEXT, claimed_at REAL)"
+    )
+    conn.execute("INSERT INTO sub_org_pool VALUES ('old', 'd', 'claimed', 1, 'user-1', 2)")
+    conn.commit()
+    conn.close()
+
+    turnkey = FakeTurnkey()
+    pool = SubOrgPool(path, 1, 0, turnkey.create, turnkey.attach)
+    # Old claims were attached ones
+    assert claim(pool) == "old"
+    assert turnkey.attached == []
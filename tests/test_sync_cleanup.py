@@ -0,0 +1,93 @@
+"""sync_cleanup_orphans: every page scanned, orphans batch-deleted, resumable checkpoints."""
+
+import asyncio
+
+import pytest
+
+import admin_service
+from admin_service import sync_cleanup_orphans
+from tests.fake_supabase import FakeSupabase
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(admin_service.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(admin_service, "SUPABASE_URL", "http://supabase.test")
+
+
+def users(count):
+    return [f"u{n:03d}" for n in range(count)]
+
+
+def cleanup(supabase, **options):
+    async def scenario():
+        async with supabase.client() as client:
+            return await sync_cleanup_orphans(client, **options)
+    return asyncio.run(scenario())
+
+
+def test_deletes_orphans_on_every_page():
+    all_users = users(25)
+    profiles = set(all_users[::2])                      # odd ones are orphans
+    supabase = FakeSupabase(all_users, profiles, wallets=set(all_users))
+
+    progress = cleanup(supabase, per_page=10)
+
+    orphans = [uid for uid in all_users if uid not in profiles]
+    assert progress["complete"] and progress["error"] is None
+    assert progress["scanned"] == 25
+    assert progress["with_profile"] == len(profiles)
+    assert progress["orphans_found"] == progress["deleted_auth_users"] == len(orphans)
+    assert supabase.auth_users == sorted(profiles)
+    assert supabase.wallets == profiles
+    # Wallet deletes are batched per page, not one call per user
+    assert len(supabase.calls("DELETE", "/rest/v1/user_wallets")) < len(orphans)
+
+
+def test_dry_run_deletes_nothing():
+    all_users = users(12)
+    supabase = FakeSupabase(all_users, set(all_users[:4]))
+    progress = cleanup(supabase, per_page=5, dry_run=True)
+    assert progress["orphans_found"] == 8
+    assert progress["deleted_auth_users"] == 0
+    assert supabase.auth_users == all_users
+
+
+def test_failed_delete_is_skipped_not_retried_forever():
+    all_users = users(6)
+    supabase = FakeSupabase(all_users, set())
+    supabase.fail_auth_deletes = {"u001"}
+    progress = cleanup(supabase, per_page=3)
+    assert progress["complete"]
+    assert progress["failed"] == 1
+    assert supabase.auth_users == ["u001"]
+
+
+def test_max_pages_returns_a_checkpoint_to_resume_from():
+    all_users = users(30)
+    supabase = FakeSupabase(all_users, set(all_users))  # nothing to delete
+    first = cleanup(supabase, per_page=10, max_pages=2)
+    assert not first["complete"]
+    assert first["next_page"] == 3
+    rest = cleanup(supabase, per_page=10, start_page=first["next_page"])
+    assert rest["complete"]
+    assert first["scanned"] + rest["scanned"] == 30
+
+
+def test_refused_deletes_stop_the_run_without_counting_failures():
+    all_users = users(4)
+    supabase = FakeSupabase(all_users, set())
+    supabase.refuse_auth_deletes = {"u002"}
+    progress = cleanup(supabase, per_page=10)
+    assert "refused" in progress["error"]
+    assert progress["failed"] == 0
+    assert progress["next_page"] == 1                   # resuming re-reads the page
+    assert supabase.auth_users == ["u002"]
+
+
+def test_concurrency_is_capped():
+    assert admin_service.clamp_concurrency(10_000) == admin_service.ADMIN_MAX_CONCURRENCY
+    assert admin_service.clamp_concurrency(0) == 1
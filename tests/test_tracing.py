@@ -0,0 +1,98 @@
+"""tracing: span nesting across awaits and threads, traceparent, Server-Timing, OTLP export."""
+
+import json
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tracing
+from tracing import span, traced, current_span, TracingMiddleware
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_child_spans_follow_awaits_and_worker_threads():
+    @traced("turnkey.http")
+    def blocking_call():
+        return current_span()
+
+    async def handler():
+        with span("request") as root:
+            inner = await asyncio.to_thread(blocking_call)
+            return root, inner
+
+    root, inner = asyncio.run(handler())
+    assert inner.name == "turnkey.http"
+    assert inner.trace_id == root.trace_id
+    assert inner.parent_id == root.span_id
+    assert root.parent_id is None
+    assert root.trace.closed
+    assert {s.name for s in root.trace.spans} == {"request", "turnkey.http"}
+    assert current_span() is None
+
+
+def test_exception_marks_span_as_error():
+    with pytest.raises(ValueError):
+        with span("fails") as failing:
+            raise ValueError("boom")
+    assert failing.status == tracing.STATUS_ERROR
+    assert failing.status_message == "ValueError: boom"
+
+
+def test_server_timing_sums_per_name_slowest_first():
+    trace = tracing._Trace(TRACE_ID)
+    spans = []
+    for name, duration in (("supabase auth", 0.002), ("turnkey", 0.010), ("supabase auth", 0.003)):
+        s = tracing.Span(trace, name, None, tracing.SPAN_KIND_INTERNAL, {})
+        s.duration = duration
+        spans.append(s)
+    assert tracing.server_timing(spans) == 'turnkey;dur=10.0, supabase.auth;dur=5.0;desc="x2"'
+
+
+@pytest.fixture
+def traced_app():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        with span("lookup"):
+            await asyncio.sleep(0)
+        return {"trace_id": tracing.current_trace_id()}
+
+    app.add_middleware(TracingMiddleware)
+    return TestClient(app)
+
+
+def test_middleware_adds_headers_and_honours_traceparent(traced_app):
+    response = traced_app.get("/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.headers["x-trace-id"] == TRACE_ID
+    assert response.json()["trace_id"] == TRACE_ID
+    timing = response.headers["server-timing"]
+    assert timing.startswith("total;dur=")
+    assert "lookup;dur=" in timing
+
+    fresh = traced_app.get("/items/2", headers={"traceparent": "garbage"})
+    assert fresh.headers["x-trace-id"] != TRACE_ID
+    assert len(fresh.headers["x-trace-id"]) == 32
+
+
+def test_file_exporter_writes_otlp_json(traced_app, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    assert tracing.start_file_exporter(str(path))
+    try:
+        traced_app.get("/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    finally:
+        tracing.stop_file_exporter()
+
+    [line] = path.read_text().splitlines()
+    spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["GET /items/{item_id}"]
+    assert root["traceId"] == TRACE_ID
+    assert root["parentSpanId"] == PARENT_ID
+    assert root["kind"] == tracing.SPAN_KIND_SERVER
+    assert by_name["lookup"]["parentSpanId"] == root["spanId"]
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in root["attributes"]
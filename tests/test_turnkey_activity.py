@@ -0,0 +1,99 @@
+"""submit_activity / resume_activity: polling to completion, failures, deadlines."""
+
+import asyncio
+
+import pytest
+
+import turnkey_activity
+from resilience import UpstreamUnavailableError, REASON_CIRCUIT_OPEN
+from turnkey_activity import (
+    TurnkeyActivityError,
+    TurnkeyActivityPendingError,
+    submit_activity,
+    resume_activity,
+)
+
+
+BODY = {"type": "ACTIVITY_TYPE_SIGN_RAW_PAYLOAD_V2", "organizationId": "org-1"}
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(turnkey_activity, "ACTIVITY_POLL_INITIAL_DELAY", 0.01)
+    monkeypatch.setattr(turnkey_activity, "ACTIVITY_POLL_MAX_DELAY", 0.02)
+
+
+class ScriptedTurnkey:
+    """Submit answers the first status; each poll answers the next one."""
+
+    def __init__(self, *statuses, poll_error=None):
+        self.statuses = list(statuses)
+        self.polls = 0
+        self.poll_error = poll_error
+
+    def _activity(self):
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        activity = {"id": "act-1", "status": status}
+        if status == "ACTIVITY_STATUS_COMPLETED":
+            activity["result"] = {"signRawPayloadResult": {"r": "1"}}
+        return {"activity": activity}
+
+    def submit(self, body):
+        return self._activity()
+
+    def get_activity(self, body):
+        assert body == {"organizationId": "org-1", "activityId": "act-1"}
+        self.polls += 1
+        if self.poll_error is not None:
+            raise self.poll_error
+        return self._activity()
+
+
+def submit(turnkey, **kwargs):
+    return asyncio.run(submit_activity(turnkey, turnkey.submit, BODY, **kwargs))
+
+
+def test_completed_on_submit_is_not_polled():
+    turnkey = ScriptedTurnkey("ACTIVITY_STATUS_COMPLETED")
+    assert submit(turnkey)["result"] == {"signRawPayloadResult": {"r": "1"}}
+    assert turnkey.polls == 0
+
+
+def test_pending_activity_is_polled_to_completion():
+    turnkey = ScriptedTurnkey("ACTIVITY_STATUS_CREATED", "ACTIVITY_STATUS_PENDING", "ACTIVITY_STATUS_COMPLETED")
+    seen = []
+    activity = submit(turnkey, on_submitted=seen.append)
+    assert activity["status"] == "ACTIVITY_STATUS_COMPLETED"
+    assert turnkey.polls == 2
+    assert seen == ["act-1"]
+
+
+def test_failed_activity_raises():
+    turnkey = ScriptedTurnkey("ACTIVITY_STATUS_PENDING", "ACTIVITY_STATUS_REJECTED")
+    with pytest.raises(TurnkeyActivityError) as failed:
+        submit(turnkey)
+    assert not isinstance(failed.value, TurnkeyActivityPendingError)
+    assert failed.value.status == "ACTIVITY_STATUS_REJECTED"
+
+
+def test_still_pending_at_deadline_carries_the_activity_id():
+    turnkey = ScriptedTurnkey("ACTIVITY_STATUS_PENDING")
+    with pytest.raises(TurnkeyActivityPendingError) as pending:
+        submit(turnkey, deadline_seconds=0.05)
+    assert pending.value.activity_id == "act-1"
+    assert turnkey.polls >= 1
+
+
+def test_refused_poll_is_pending_not_failed():
+    refused = UpstreamUnavailableError("turnkey", REASON_CIRCUIT_OPEN, 5)
+    turnkey = ScriptedTurnkey("ACTIVITY_STATUS_PENDING", poll_error=refused)
+    with pytest.raises(TurnkeyActivityPendingError) as pending:
+        submit(turnkey)
+    assert pending.value.activity_id == "act-1"
+
+
+def test_resume_polls_the_same_activity():
+    turnkey = ScriptedTurnkey("ACTIVITY_STATUS_PENDING", "ACTIVITY_STATUS_COMPLETED")
+    activity = asyncio.run(resume_activity(turnkey, "org-1", "act-1"))
+    assert activity["status"] == "ACTIVITY_STATUS_COMPLETED"
+    assert turnkey.polls == 2
@@ -0,0 +1,70 @@
+"""Startup warm-up: every stage is recorded, a failing stage still ends ready, /api/ready flips."""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture
+def warmup_state(monkeypatch):
+    state = {"ready": False, "started_at": None, "finished_at": None, "stages": {}}
+    monkeypatch.setattr(server, "warmup_state", state)
+    return state
+
+
+def test_ready_is_503_until_warm_up_has_finished(warmup_state, monkeypatch):
+    async def ok():
+        return True
+
+    for name in ("preconnect_supabase", "verify_turnkey_config", "prime_crypto_indices"):
+        monkeypatch.setattr(server, name, ok)
+    client = TestClient(server.app)
+
+    cold = client.get("/api/ready")
+    assert cold.status_code == 503
+    assert cold.json()["ready"] is False
+
+    asyncio.run(server.warm_up())
+    warm = client.get("/api/ready")
+    assert warm.status_code == 200
+    assert set(warm.json()["stages"]) == {"supabase_pool", "turnkey", "crypto_indices"}
+    assert client.get("/api/health").status_code == 200
+
+
+def test_failed_and_slow_stages_are_recorded_but_do_not_block_readiness(warmup_state, monkeypatch):
+    async def ok():
+        return True
+
+    async def broken():
+        raise RuntimeError("coingecko down")
+
+    async def hangs():
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(server, "WARMUP_STAGE_TIMEOUT", 0.05)
+    monkeypatch.setattr(server, "preconnect_supabase", ok)
+    monkeypatch.setattr(server, "verify_turnkey_config", hangs)
+    monkeypatch.setattr(server, "prime_crypto_indices", broken)
+
+    asyncio.run(server.warm_up())
+
+    stages = warmup_state["stages"]
+    assert warmup_state["ready"] is True
+    assert stages["supabase_pool"]["ok"] is True
+    assert stages["turnkey"] == {"ok": False, "ms": stages["turnkey"]["ms"], "error": "TimeoutError"}
+    assert stages["crypto_indices"]["ok"] is False
+    assert stages["crypto_indices"]["error"] == "coingecko down"
+
+
+def test_build_index_payloads_fills_every_time_period(monkeypatch):
+    cache = {}
+    monkeypatch.setattr(server, "crypto_cache", cache)
+    monkeypatch.setattr(server, "calculate_sophisticated_indices", lambda data, period: {"period": period})
+
+    server.build_index_payloads([{"id": "bitcoin"}])
+
+    assert set(cache) == {f"indices_{period}" for period in server.CACHE_TTL}
+    assert all(entry["data"]["period"] == key[len("indices_"):] for key, entry in cache.items())